@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Benchmark the memory per person and the match time of the columnar roster against the list of dicts.
+
+Usage: python benchmarks/bench_columnar.py [ROWS]
+"""
+
+import datetime
+import gc
+import logging
+import os
+import sys
+import tempfile
+import timeit
+import tracemalloc
+from typing import Any, Callable, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "zivijo"))
+
+from columnar import optional_numpy  # noqa: E402
+from index import filter_celebrants  # noqa: E402
+from roster import generate_roster, parse_size  # noqa: E402
+from webhook import read_and_parse_csv, read_roster  # noqa: E402
+
+
+def measure(load: Callable[[], Any]) -> Tuple[Any, int]:
+    """Load the roster and return it with the bytes it keeps allocated."""
+    gc.collect()
+    tracemalloc.start()
+    roster = load()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return roster, size
+
+
+def main() -> None:
+    count = parse_size(sys.argv[1]) if (len(sys.argv) > 1) else 1_000_000
+    today = datetime.date.today()
+
+    logging.disable(logging.CRITICAL)
+
+    descriptor, csv_path = tempfile.mkstemp(suffix=".csv")
+    os.close(descriptor)
+    generate_roster(csv_path, count, today=today)
+
+    try:
+        rows, rows_size = measure(lambda: read_and_parse_csv(csv_path))
+        roster, roster_size = measure(lambda: read_roster(csv_path))
+    finally:
+        os.unlink(csv_path)
+
+    print(f"{'list of dicts':<24} {rows_size / len(rows):10.1f} bytes/person")
+    print(f"{'columnar':<24} {roster_size / len(roster):10.1f} bytes/person")
+
+    matchers = [
+        ("filter_celebrants", lambda: filter_celebrants(rows, today)),
+        ("columnar (compress)", lambda: roster.match(today, use_numpy=False)),
+    ]
+    if (optional_numpy() is not None):
+        matchers.append(("columnar (numpy)", lambda: roster.match(today, use_numpy=True)))
+
+    for name, match in matchers:
+        elapsed = min(timeit.repeat(match, number=1, repeat=5))
+        print(f"{name:<24} {elapsed * 1000:10.2f} ms {len(rows) / elapsed:14,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
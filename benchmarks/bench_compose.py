@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""Benchmark composing the messages for a popular date with many celebrants.
+
+Usage: python benchmarks/bench_compose.py [IDS]
+"""
+
+import logging
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "zivijo"))
+
+from webhook import compose_messages  # noqa: E402
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if (len(sys.argv) > 1) else 10_000
+    people_ids = [f"@colleague.number_{i}" for i in range(count)]
+
+    logging.disable(logging.CRITICAL)
+
+    single = min(timeit.repeat(lambda: ", ".join(people_ids) + ", ".join(people_ids), number=10, repeat=3)) / 10
+    single_size = len((", ".join(people_ids) * 2).encode())
+    messages = compose_messages(people_ids, people_ids)
+    chunked = min(timeit.repeat(lambda: compose_messages(people_ids, people_ids), number=10, repeat=3)) / 10
+
+    print(f"ids (birthdays + namedays):  {count} + {count}")
+    print(f"single join (old):           {single * 1000:10.3f} ms, one post of over {single_size} bytes")
+    print(f"compose_messages (chunked):  {chunked * 1000:10.3f} ms, {len(messages)} posts, "
+          f"largest {max(len(m.encode()) for m in messages)} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Benchmark the parsing of a compressed roster (gzip, bz2, xz) against the plain one.
+
+For every format the size on disk, the time to read the file, to decompress it and to parse it (wall clock and
+CPU) are printed. The volume throughput below which the compressed file is parsed sooner than the plain one tells
+whether compressing pays off on a slow volume.
+
+Usage: python benchmarks/bench_compression.py [ROWS]
+"""
+
+import bz2
+import datetime
+import gzip
+import logging
+import lzma
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "zivijo"))
+
+from compression import decompressing  # noqa: E402
+from index import filter_celebrants  # noqa: E402
+from roster import generate_roster, parse_size  # noqa: E402
+from webhook import iter_parsed_csv  # noqa: E402
+
+# suffix and the compressing file opener of each format
+FORMATS: Dict[str, Tuple[str, Callable]] = {
+    "plain": ("", open),
+    "gzip": (".gz", gzip.open),
+    "bz2": (".bz2", bz2.open),
+    "xz": (".xz", lzma.open),
+}
+
+BLOCK_SIZE = 1 << 20
+
+
+def timed(function: Callable[[], object]) -> Tuple[float, float]:
+    """Wall clock and CPU seconds of one call."""
+    wall, cpu = time.perf_counter(), time.process_time()
+    function()
+    return time.perf_counter() - wall, time.process_time() - cpu
+
+
+def read_all(path: str, decompress: bool) -> None:
+    """Read the file to the end, decompressed or as stored."""
+    with open(path, "rb") as binary:
+        source = decompressing(binary, path) if (decompress) else binary
+        while (source.read(BLOCK_SIZE)):
+            pass
+
+
+def main() -> None:
+    count = parse_size(sys.argv[1]) if (len(sys.argv) > 1) else 1_000_000
+    today = datetime.date.today()
+
+    logging.disable(logging.CRITICAL)
+
+    directory = tempfile.mkdtemp()
+    plain_path = os.path.join(directory, "roster.csv")
+    generate_roster(plain_path, count, today=today)
+
+    try:
+        print(f"{'format':<8} {'size':>14} {'read':>9} {'decompress':>11} {'parse wall':>11} {'parse cpu':>10} "
+              f"{'break-even':>14}")
+
+        plain_size = os.path.getsize(plain_path)
+        plain_parse = 0.0
+
+        for name, (suffix, compressed_open) in FORMATS.items():
+            path = plain_path + suffix
+            if (suffix):
+                with open(plain_path, "rb") as source, compressed_open(path, "wb") as target:
+                    shutil.copyfileobj(source, target, BLOCK_SIZE)
+
+            size = os.path.getsize(path)
+            read, _ = timed(lambda: read_all(path, decompress=False))
+            decompress, _ = timed(lambda: read_all(path, decompress=True))
+            parse_wall, parse_cpu = timed(lambda: filter_celebrants(iter_parsed_csv(path), today))
+
+            if (not suffix):
+                plain_parse = parse_wall
+                break_even = "-"
+            elif (parse_wall > plain_parse):
+                # below this throughput the bytes saved take longer to read than the decompression takes
+                break_even = f"{(plain_size - size) / (parse_wall - plain_parse) / 1e6:,.1f} MB/s"
+            else:
+                break_even = "always"
+
+            print(f"{name:<8} {size:14,} {read:8.3f}s {decompress:10.3f}s {parse_wall:10.3f}s {parse_cpu:9.3f}s "
+                  f"{break_even:>14}")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Benchmark the ISO date parsing of read_and_parse_csv: datetime.strptime versus the fast path.
+
+Usage: python benchmarks/bench_dates.py [ROWS]
+"""
+
+import datetime
+import logging
+import os
+import random
+import sys
+import tempfile
+import timeit
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "zivijo"))
+
+from dates import parse_iso_date  # noqa: E402
+from roster import generate_roster  # noqa: E402
+from webhook import read_and_parse_csv  # noqa: E402
+
+
+def strptime_date(value: str) -> datetime.date:
+    """The original per-row parsing."""
+    return datetime.datetime.strptime(value, "%Y-%m-%d")
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if (len(sys.argv) > 1) else 100_000
+    rng = random.Random(42)  # nosec B311
+    start = datetime.date(1970, 1, 1)
+    values = [(start + datetime.timedelta(days=rng.randrange(365 * 40))).isoformat() for _ in range(count)]
+
+    logging.disable(logging.CRITICAL)
+
+    for name, parse in (("strptime", strptime_date), ("parse_iso_date", parse_iso_date)):
+        elapsed = min(timeit.repeat(lambda: [parse(v) for v in values], number=1, repeat=3))
+        print(f"{name:<32} {count / elapsed:14,.0f} dates/s")
+
+    descriptor, csv_path = tempfile.mkstemp(suffix=".csv")
+    os.close(descriptor)
+    generate_roster(csv_path, count)
+
+    try:
+        for name, parse in (("read_and_parse_csv (strptime)", strptime_date),
+                            ("read_and_parse_csv (fast)", parse_iso_date)):
+            with patch("webhook.parse_iso_date", parse):
+                elapsed = min(timeit.repeat(lambda: read_and_parse_csv(csv_path), number=1, repeat=3))
+            print(f"{name:<32} {count / elapsed:14,.0f} rows/s")
+    finally:
+        os.unlink(csv_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Benchmark the celebration index against the list comprehensions it replaced.
+
+Usage: python benchmarks/bench_index.py [ROWS]
+"""
+
+import datetime
+import os
+import random
+import sys
+import timeit
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "zivijo"))
+
+from index import CelebrationIndex  # noqa: E402
+
+
+def synthetic_rows(count: int) -> List[Dict]:
+    """Generate parsed rows with random birth and name dates."""
+    rng = random.Random(42)  # nosec B311
+    start = datetime.datetime(1970, 1, 1)
+    rows = []
+
+    for i in range(count):
+        rows.append({
+            "user_id": f"@user_{i}",
+            "birth_date": start + datetime.timedelta(days=rng.randrange(365 * 40)),
+            "name_date": start + datetime.timedelta(days=rng.randrange(365)),
+        })
+
+    return rows
+
+
+def comprehensions(rows: List[Dict], today: datetime.date) -> Tuple[List[str], List[str]]:
+    """The original filtering from run()."""
+    birthday_people_ids = [b["user_id"] for b in rows if b.get("birth_date") and b["birth_date"].month == today.month and b["birth_date"].day == today.day]  # noqa: E501
+    nameday_people_ids = [b["user_id"] for b in rows if b.get("name_date") and b["name_date"].month == today.month and b["name_date"].day == today.day]  # noqa: E501
+    return birthday_people_ids, nameday_people_ids
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if (len(sys.argv) > 1) else 100_000
+    rows = synthetic_rows(count)
+    today = datetime.date(2023, 6, 15)
+    index = CelebrationIndex.from_rows(rows)
+
+    assert sorted(comprehensions(rows, today)[0]) == sorted(index.lookup(today)[0])
+
+    repeat = 5
+    scan = min(timeit.repeat(lambda: comprehensions(rows, today), number=1, repeat=repeat))
+    build = min(timeit.repeat(lambda: CelebrationIndex.from_rows(rows), number=1, repeat=repeat))
+    lookup = min(timeit.repeat(lambda: index.lookup(today), number=1000, repeat=repeat)) / 1000
+
+    print(f"rows:                        {count}")
+    print(f"comprehensions (per date):   {scan * 1000:10.3f} ms")
+    print(f"index build (once):          {build * 1000:10.3f} ms")
+    print(f"index lookup (per date):     {lookup * 1000:10.3f} ms")
+    print(f"whole year, comprehensions:  {scan * 366:10.3f} s")
+    print(f"whole year, index:           {build + lookup * 366:10.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Benchmark the parsing and filtering of one roster, serially and split over 1..N worker processes.
+
+Usage: python benchmarks/bench_parallel.py [ROWS] [MAX_WORKERS]
+"""
+
+import datetime
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "zivijo"))
+
+from index import filter_celebrants  # noqa: E402
+from parallel import parallel_filter_celebrants  # noqa: E402
+from roster import generate_roster, parse_size  # noqa: E402
+from webhook import iter_parsed_csv  # noqa: E402
+
+
+def main() -> None:
+    count = parse_size(sys.argv[1]) if (len(sys.argv) > 1) else 1_000_000
+    max_workers = int(sys.argv[2]) if (len(sys.argv) > 2) else (os.cpu_count() or 1)
+    today = datetime.date.today()
+
+    logging.disable(logging.CRITICAL)
+
+    descriptor, csv_path = tempfile.mkstemp(suffix=".csv")
+    os.close(descriptor)
+    generate_roster(csv_path, count, today=today)
+
+    try:
+        start = time.perf_counter()
+        expected = filter_celebrants(iter_parsed_csv(csv_path), today)
+        serial = time.perf_counter() - start
+        print(f"{'serial':<12} {serial:8.3f}s {count / serial:14,.0f} rows/s")
+
+        for workers in range(1, max_workers + 1):
+            start = time.perf_counter()
+            celebrants = parallel_filter_celebrants(csv_path, today, workers)
+            elapsed = time.perf_counter() - start
+
+            assert celebrants == expected, f"{workers} workers disagree with the serial parsing"  # nosec B101
+            print(f"{f'{workers} workers':<12} {elapsed:8.3f}s {count / elapsed:14,.0f} rows/s "
+                  f"{serial / elapsed:6.2f}x")
+    finally:
+        os.unlink(csv_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Load test of the query service.
+
+A local instance is started on a generated roster (or the URL of a running one is given) and the clients query
+random dates, and every tenth time a week long range, each over its own keep-alive connection. The p50 and p99
+latency and the requests per second are printed.
+
+Usage: python benchmarks/bench_service.py [ROWS] [CLIENTS] [SECONDS] [URL]
+"""
+
+import datetime
+import http.client
+import logging
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from typing import List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "zivijo"))
+
+from roster import generate_roster, parse_size  # noqa: E402
+from service import start_service  # noqa: E402
+
+
+def client(host: str, port: int, until: float, seed: int) -> Tuple[List[float], int]:
+    """Query until the deadline, returns the latencies and the number of failed requests."""
+    randomizer = random.Random(seed)
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    latencies = []
+    failures = 0
+
+    try:
+        while (time.perf_counter() < until):
+            start = datetime.date(2030, 1, 1) + datetime.timedelta(days=randomizer.randrange(365))
+            if (randomizer.random() < 0.1):
+                path = f"/celebrants?start={start}&end={start + datetime.timedelta(days=6)}"
+            else:
+                path = f"/celebrants?date={start}"
+
+            sent = time.perf_counter()
+            connection.request("GET", path)
+            response = connection.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - sent)
+
+            failures += (response.status != 200)
+    finally:
+        connection.close()
+
+    return latencies, failures
+
+
+def main() -> None:
+    count = parse_size(sys.argv[1]) if (len(sys.argv) > 1) else 100_000
+    clients = int(sys.argv[2]) if (len(sys.argv) > 2) else 8
+    seconds = float(sys.argv[3]) if (len(sys.argv) > 3) else 5.0
+    url = sys.argv[4] if (len(sys.argv) > 4) else None
+
+    logging.disable(logging.CRITICAL)
+
+    directory = tempfile.mkdtemp()
+    server = None
+
+    try:
+        if (url):
+            address = urllib.parse.urlsplit(url)
+            host, port = address.hostname or "127.0.0.1", address.port or 80
+        else:
+            csv_path = os.path.join(directory, "roster.csv")
+            generate_roster(csv_path, count)
+
+            loading = time.perf_counter()
+            server = start_service(csv_path, listen="127.0.0.1:0")
+            print(f"loaded {count:,} rows in {time.perf_counter() - loading:.3f}s")
+
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            host, port = server.server_address[:2]
+
+        results: List[Tuple[List[float], int]] = [([], 0)] * clients
+        until = time.perf_counter() + seconds
+
+        def work(number: int) -> None:
+            results[number] = client(host, port, until, seed=number)
+
+        threads = [threading.Thread(target=work, args=(number,)) for number in range(clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for client_latencies, _ in results for latency in client_latencies)
+        failures = sum(client_failures for _, client_failures in results)
+        if (not latencies):
+            print("no requests were answered")
+            return
+
+        percentiles = statistics.quantiles(latencies, n=100) if (len(latencies) > 1) else latencies * 99
+        print(f"{'clients':>8} {'requests':>10} {'failed':>7} {'rps':>10} {'p50':>9} {'p99':>9}")
+        print(f"{clients:8} {len(latencies):10,} {failures:7,} {len(latencies) / elapsed:10,.0f} "
+              f"{percentiles[49] * 1000:7.2f}ms {percentiles[98] * 1000:7.2f}ms")
+    finally:
+        if (server is not None):
+            server.shutdown()
+            server.service.stopped.set()
+            server.server_close()
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
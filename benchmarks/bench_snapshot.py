@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""Benchmark today's lookup from the compiled snapshot against parsing the csv.
+
+Usage: python benchmarks/bench_snapshot.py [ROWS]
+"""
+
+import datetime
+import logging
+import os
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "zivijo"))
+
+from index import filter_celebrants  # noqa: E402
+from roster import generate_roster, parse_size  # noqa: E402
+from snapshot import compile_snapshot, lookup_snapshot  # noqa: E402
+from webhook import iter_parsed_csv  # noqa: E402
+
+
+def main() -> None:
+    count = parse_size(sys.argv[1]) if (len(sys.argv) > 1) else 1_000_000
+    today = datetime.date.today()
+
+    logging.disable(logging.CRITICAL)
+
+    directory = tempfile.mkdtemp()
+    csv_path = os.path.join(directory, "roster.csv")
+    snapshot_path = os.path.join(directory, "roster.snapshot")
+    generate_roster(csv_path, count, today=today)
+
+    try:
+        start = time.perf_counter()
+        compile_snapshot(csv_path, snapshot_path)
+        print(f"{'compile':<16} {time.perf_counter() - start:10.3f}s {os.path.getsize(snapshot_path):14,} bytes")
+
+        for name, lookup in (("parse csv", lambda: filter_celebrants(iter_parsed_csv(csv_path), today)),
+                             ("snapshot", lambda: lookup_snapshot(snapshot_path, csv_path, today))):
+            elapsed = min(timeit.repeat(lookup, number=1, repeat=3))
+            print(f"{name:<16} {elapsed * 1000:10.2f} ms")
+    finally:
+        for path in (csv_path, snapshot_path):
+            os.unlink(path)
+        os.rmdir(directory)
+
+
+if __name__ == "__main__":
+    main()
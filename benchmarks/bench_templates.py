@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Benchmark rendering the messages for large celebrant lists, per locale and against the per-call pools.
+
+Usage: python benchmarks/bench_templates.py [IDS]
+"""
+
+import os
+import random
+import sys
+import timeit
+from typing import Optional
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "zivijo"))
+
+from env import get_config, load_config  # noqa: E402
+from templates import DEFAULT_LOCALES  # noqa: E402
+from webhook import compose_messages  # noqa: E402
+
+
+def split_emoji(icon_emoji_csv: Optional[str] = None) -> str:
+    """The original emoji pick, splitting the list on every call."""
+    return random.choice((icon_emoji_csv or get_config().icon_emoji_csv).split(','))  # nosec B311
+
+
+def rebuilt_message() -> str:
+    """The original message pick, building the list on every call."""
+    messages = list(DEFAULT_LOCALES["en"]["messages"])
+    return random.choice(messages)  # nosec B311
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if (len(sys.argv) > 1) else 100_000
+    people_ids = [f"@user.{number}" for number in range(count)]
+
+    for locale in DEFAULT_LOCALES:
+        load_config({"ZIVIJO_LOCALE": locale})
+        elapsed = min(timeit.repeat(lambda: compose_messages(people_ids, people_ids), number=1, repeat=5))
+        print(f"{f'compose_messages ({locale})':<32} {elapsed * 1000:10.2f} ms {2 * count / elapsed:14,.0f} ids/s")
+
+    load_config({})
+    with patch("webhook.get_random_emoji", split_emoji), patch("webhook.get_random_positive_message", rebuilt_message):
+        elapsed = min(timeit.repeat(lambda: compose_messages(people_ids, people_ids), number=1, repeat=5))
+    print(f"{'compose_messages (per-call pools)':<32} {elapsed * 1000:10.2f} ms {2 * count / elapsed:14,.0f} ids/s")
+
+    # small posts, where picking the emojis and messages is most of the work
+    elapsed = min(timeit.repeat(lambda: compose_messages(["@jozko"], ["@ferko"]), number=10_000, repeat=3))
+    print(f"{'single post (pools)':<32} {elapsed / 10_000 * 1e6:10.2f} us")
+    with patch("webhook.get_random_emoji", split_emoji), patch("webhook.get_random_positive_message", rebuilt_message):
+        elapsed = min(timeit.repeat(lambda: compose_messages(["@jozko"], ["@ferko"]), number=10_000, repeat=3))
+    print(f"{'single post (per-call pools)':<32} {elapsed / 10_000 * 1e6:10.2f} us")
+
+
+if __name__ == "__main__":
+    main()
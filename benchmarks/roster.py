@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Synthetic roster generator for the benchmarks.
+
+Usage: python benchmarks/roster.py ROWS PATH [--seed SEED]
+"""
+
+import argparse
+import datetime
+import random
+from typing import Optional
+
+CSV_HEADER = "email,user_id,iso-birth-date,iso-name-date\n"
+
+# sizes the suite knows by name
+SIZES = {
+    "1k": 1_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000,
+}
+
+# share of the dirty rows in the generated roster
+MALFORMED_DATE_RATIO = 0.01
+MISSING_AT_RATIO = 0.05
+
+EPOCH = datetime.date(1960, 1, 1)
+
+
+def parse_size(value: str) -> int:
+    """Translate 1k, 100k, 1m, 10m or a plain number into a row count."""
+    return SIZES.get(value.lower()) or int(value)
+
+
+def generate_roster(path: str, rows: int, seed: int = 42,
+                    malformed_date_ratio: float = MALFORMED_DATE_RATIO,
+                    missing_at_ratio: float = MISSING_AT_RATIO,
+                    today: Optional[datetime.date] = None) -> None:
+    """Write a reproducible roster of the given size, mixing clean rows with malformed dates and ids without @."""
+    rng = random.Random(seed)  # nosec B311
+    today = today or datetime.date.today()
+    # 1992 is a leap year, so this works on Feb 29 too
+    celebrated_today = f"1992-{today:%m-%d}"
+
+    with open(path, "w") as csvfile:
+        csvfile.write(CSV_HEADER)
+
+        for i in range(rows):
+            birth_date = (EPOCH + datetime.timedelta(days=rng.randrange(365 * 45))).isoformat()
+            name_date = ""
+            if (rng.random() < 0.8):
+                name_date = (EPOCH + datetime.timedelta(days=rng.randrange(366))).isoformat()
+
+            if (i % 365 == 0):
+                # somebody celebrates today in every roster, so the filtering has something to find
+                birth_date = celebrated_today
+
+            if (rng.random() < malformed_date_ratio):
+                birth_date = rng.choice(["1990-02-30", "1990-13-01", "31.12.1990", "1990-1-1x"])
+
+            user_id = f"colleague.{i}" if (rng.random() < missing_at_ratio) else f"@colleague.{i}"
+
+            csvfile.write(f"colleague.{i}@example.com,{user_id},{birth_date},{name_date}\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic roster")
+    parser.add_argument("rows", type=parse_size, help="number of rows, or one of 1k, 100k, 1m, 10m")
+    parser.add_argument("path", help="where to write the csv")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    generate_roster(args.path, args.rows, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Local stand-in for the Mattermost incoming webhook and for a roster published over HTTP.
+
+Shared by the benchmarks and the tests (through tests/conftest.py).
+"""
+
+import gzip
+import http.server
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# status and headers of one scripted answer to a post
+StubResponse = Tuple[int, Dict[str, str]]
+
+ETAG = '"v1"'
+LAST_MODIFIED = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    """Accepts the posts with the scripted responses, then with 200, and serves the roster on GET."""
+
+    protocol_version = "HTTP/1.1"
+    server: "StubServer"
+
+    def do_POST(self) -> None:  # noqa: N802
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.received.append(json.loads(body))
+
+        status, headers = self.server.responses.pop(0) if self.server.responses else (200, {})
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def do_GET(self) -> None:  # noqa: N802
+        """The roster, answering the conditional requests like a static file server would."""
+        self.server.requests.append(dict(self.headers))
+
+        if ("If-None-Match" in self.headers):
+            not_modified = self.headers["If-None-Match"] == self.server.etag
+        else:
+            not_modified = self.headers.get("If-Modified-Since") == LAST_MODIFIED
+
+        if (not_modified):
+            self.server.statuses.append(304)
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        body = gzip.compress(self.server.roster) if (self.server.gzip) else self.server.roster
+        self.server.statuses.append(200)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", self.server.etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        if (self.server.gzip):
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+class StubServer(http.server.ThreadingHTTPServer):
+    """Stub webhook and roster server running in a background thread, use as a context manager."""
+
+    def __init__(self, responses: Optional[List[StubResponse]] = None, roster: bytes = b"") -> None:
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.thread = threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        # the posts
+        self.responses = list(responses or [])
+        self.received: List[Dict] = []
+        # the roster, compressed in transit with gzip set
+        self.roster = roster
+        self.etag = ETAG
+        self.gzip = False
+        self.requests: List[Dict[str, str]] = []
+        self.statuses: List[int] = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/hooks/test"
+
+    @property
+    def roster_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/birthdays.csv"
+
+    def __enter__(self) -> "StubServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.shutdown()
+        self.server_close()
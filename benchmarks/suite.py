@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Benchmark suite of the roster parsing, filtering and posting, with the results written as JSON.
+
+Usage: python benchmarks/suite.py [--sizes 1k,100k,1m,10m] [--output results.json]
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "zivijo"))
+
+from __version__ import __version__  # noqa: E402
+from env import load_config  # noqa: E402
+from index import filter_celebrants  # noqa: E402
+from roster import generate_roster, parse_size  # noqa: E402
+from stub_server import StubServer  # noqa: E402
+from webhook import iter_parsed_csv, post_message, read_and_parse_csv  # noqa: E402
+
+# read_and_parse_csv keeps every row in memory, larger rosters are only streamed
+MAX_LIST_ROWS = 1_000_000
+
+
+def measure(function: Callable[[], object], repeat: int) -> float:
+    """Best wall-clock time of the function in seconds."""
+    best = float("inf")
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def result(benchmark: str, rows: int, seconds: float, **extra: object) -> Dict:
+    """One entry of the report."""
+    entry = {"benchmark": benchmark, "rows": rows, "seconds": seconds, "rows_per_second": rows / seconds}
+    entry.update(extra)
+    print(f"{benchmark:<28} {rows:>12,} rows {seconds:10.4f} s {rows / seconds:14,.0f} rows/s", file=sys.stderr)
+    return entry
+
+
+def bench_roster(path: str, rows: int, repeat: int) -> List[Dict]:
+    """Parsing and filtering of one roster."""
+    today = datetime.date.today()
+    results = []
+
+    results.append(result("iter_parsed_csv", rows, measure(lambda: sum(1 for _ in iter_parsed_csv(path)), repeat)))
+    results.append(result(
+        "run_filter_streaming", rows, measure(lambda: filter_celebrants(iter_parsed_csv(path), today), repeat)
+    ))
+
+    if (rows <= MAX_LIST_ROWS):
+        parsed = read_and_parse_csv(path)
+        results.append(result("read_and_parse_csv", rows, measure(lambda: read_and_parse_csv(path), repeat)))
+        results.append(result("run_filter", rows, measure(lambda: filter_celebrants(parsed, today), repeat)))
+
+    return results
+
+
+def bench_post(repeat: int) -> List[Dict]:
+    """post_message against a local stub webhook, one post and a popular day split into many posts."""
+    results = []
+
+    with StubServer() as stub:
+        for people in (1, 10_000):
+            people_ids = [f"@colleague.{i}" for i in range(people)]
+            seconds = measure(lambda: post_message(people_ids, people_ids, webhook_url=stub.url), repeat)
+            results.append(result("post_message", people, seconds, celebrants=people * 2))
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the benchmark suite")
+    parser.add_argument("--sizes", default="1k,100k", help="comma separated roster sizes: 1k, 100k, 1m, 10m")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each benchmark, the best one counts")
+    parser.add_argument("--output", default="bench_output.json", help="where to write the JSON results")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    # the stub server does not rate limit, neither should the client
+    load_config({"ZIVIJO_RATE_LIMIT_PER_SECOND": "1000000", "ZIVIJO_RATE_LIMIT_BURST": "1000000"})
+
+    results: List[Dict] = []
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in args.sizes.split(","):
+            rows = parse_size(size)
+            path = os.path.join(tmp_dir, f"roster_{rows}.csv")
+            generate_roster(path, rows)
+            results.extend(bench_roster(path, rows, args.repeat))
+            os.remove(path)
+
+    results.extend(bench_post(args.repeat))
+
+    report = {
+        "version": __version__,
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
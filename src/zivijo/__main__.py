@@ -1,11 +1,148 @@
 # -*- coding: utf-8 -*-
 """Živijó mattermost webhook."""
 
-from webhook import run as zivijo_run
+import argparse
+import datetime
+import logging
+import sys
+from typing import List, Optional
 
+from delivery import get_deliverer
+from env import Config, load_config
+from metrics import export_metrics, get_metrics
+from templates import get_template_set
+from webhook import log_config, run as zivijo_run, validate_csv
 
-def run() -> bool:
-    return zivijo_run()
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="zivijo", description="Živijó mattermost webhook")
+    parser.add_argument("--profile", metavar="PATH", default=None,
+                        help="write the profile of each phase to the file (default: ZIVIJO_PROFILE_PATH)")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("run", help="check today's birthdays and namedays and post them (default)")
+    subparsers.add_parser("daemon", help="keep running and post every day at ZIVIJO_DAEMON_AT")
+
+    serve_parser = subparsers.add_parser("serve", help="answer who celebrates on a date or in a range over HTTP")
+    serve_parser.add_argument("--listen", default=None, help="HOST:PORT to listen on (default: ZIVIJO_SERVICE_LISTEN)")
+
+    compile_parser = subparsers.add_parser("compile", help="compile the csv into the snapshot read by the runs")
+    compile_parser.add_argument("--output", default=None, help="path of the snapshot (default: ZIVIJO_SNAPSHOT_PATH)")
+
+    import_parser = subparsers.add_parser("import", help="import the csv into the database ZIVIJO_DATABASE_PATH")
+    import_parser.add_argument("--csv", default=None, help="path of the csv (default: ZIVIJO_BIRTHDAYS_CSV_PATH)")
+
+    validate_parser = subparsers.add_parser("validate", help="report the problems of the csv, posting nothing")
+    validate_parser.add_argument("--csv", default=None, help="path of the csv (default: ZIVIJO_BIRTHDAYS_CSV_PATH)")
+    validate_parser.add_argument("--samples", type=int, default=None,
+                                 help="rows listed for each kind of problem (default: ZIVIJO_VALIDATION_SAMPLES)")
+
+    digest = subparsers.add_parser("digest", help="post the upcoming birthdays and namedays, grouped by day")
+    digest.add_argument("--start", type=datetime.date.fromisoformat, default=None,
+                        help="first day of the digest, YYYY-MM-DD (default: today)")
+    digest.add_argument("--days", type=int, default=None,
+                        help="length of the digest in days (default: ZIVIJO_DIGEST_DAYS)")
+
+    return parser.parse_args(argv)
+
+
+def run(argv: Optional[List[str]] = None) -> bool:
+    args = parse_args(argv)
+    config = load_config()
+
+    logging.basicConfig(level=config.loglevel)
+    log_config(config)
+
+    # fail at the start, not when there is something to post
+    get_template_set()
+
+    if (not (args.profile or config.profile_path)):
+        return run_command(args, config)
+
+    # lazy import, cProfile and tracemalloc are loaded only when profiling
+    from profiling import start_profiling, stop_profiling
+
+    start_profiling(args.profile)
+    try:
+        return run_command(args, config)
+    finally:
+        stop_profiling()
+
+
+def run_command(args: argparse.Namespace, config: Config) -> bool:
+    if (args.command == "daemon"):
+        # lazy import, the daemon is not needed for the one-shot runs
+        from daemon import run_daemon
+
+        run_daemon()
+        return True
+
+    if (args.command == "serve"):
+        # lazy import, the query service is not needed for the one-shot runs
+        from service import run_service
+
+        run_service(args.listen)
+        return True
+
+    if (args.command == "compile"):
+        # lazy import, the snapshot is compiled only when the roster changes
+        from snapshot import compile_snapshot
+
+        output = args.output or config.snapshot_path
+        if (not output):
+            logging.error("No snapshot path, set ZIVIJO_SNAPSHOT_PATH or use --output")
+            return False
+
+        compile_snapshot(config.birthdays_csv_path, output)
+        return True
+
+    if (args.command == "import"):
+        # lazy import, sqlite is needed only for the database backend
+        from database import import_csv
+
+        if (not config.database_path):
+            logging.error("No database path, set ZIVIJO_DATABASE_PATH")
+            return False
+
+        import_csv(args.csv)
+        return True
+
+    if (args.command == "validate"):
+        csv_path = args.csv or config.birthdays_csv_path
+        report = validate_csv(csv_path, args.samples)
+        print(report.format_report(csv_path))
+        if (not report.ok):
+            # the problems fail the job checking the csv
+            sys.exit(1)
+
+        return True
+
+    result = False
+    try:
+        # first deliver the posts the previous runs could not
+        get_deliverer().flush()
+
+        if (args.command == "digest"):
+            # lazy import, the digest is not needed for the daily runs
+            from digest import run_digest
+
+            result = run_digest(args.start, args.days)
+        elif (config.tenants_manifest_path):
+            # lazy import, the process pool is needed only for the multi-tenant runs
+            from tenants import run_manifest
+
+            result = run_manifest(config.tenants_manifest_path)
+        elif (config.state_path):
+            # lazy import, the days missed are caught up only when the last posted day is remembered
+            from catchup import run_catchup
+
+            result = run_catchup()
+        else:
+            result = zivijo_run()
+    finally:
+        get_metrics().set("run_success", int(result))
+        export_metrics(config)
+
+    return result
 
 
 if __name__ == "__main__":
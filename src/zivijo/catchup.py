@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""Catching up on the days missed while the webhook could not run or post."""
+
+import datetime
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+
+from digest import DayCelebrants, read_window
+from env import get_config
+from ledger import ledger_locked
+from metrics import get_metrics, write_atomically
+from templates import get_template_set
+from webhook import Celebrations, build_payloads, check_unrouted, compose_sections, get_random_emoji, \
+    pack_sections, post_message, post_once, run as zivijo_run
+
+# supported values of ZIVIJO_CATCHUP_POLICY
+CATCHUP_POLICIES = ("per-day", "combined")
+
+
+def read_last_posted(state_path: str) -> Optional[datetime.date]:
+    """The last day the greetings were posted for, None if not known yet."""
+    if (not os.path.exists(state_path)):
+        return None
+
+    with open(state_path) as state_file:
+        return datetime.date.fromisoformat(json.load(state_file)["last_posted"])
+
+
+def write_last_posted(state_path: str, date: datetime.date) -> None:
+    """Remember the day the greetings were posted for."""
+    write_atomically(state_path, json.dumps({"last_posted": date.isoformat()}))
+
+
+def missed_days(last_posted: Optional[datetime.date], today: datetime.date, max_days: int) -> List[datetime.date]:
+    """The days after last_posted and before today, at most max_days of the most recent ones."""
+    if (last_posted is None):
+        return []
+
+    first = max(last_posted + datetime.timedelta(days=1), today - datetime.timedelta(days=max_days))
+
+    if (first > last_posted + datetime.timedelta(days=1)):
+        logging.warning(f"Not catching up on the days from {last_posted + datetime.timedelta(days=1)} to "
+                        f"{first - datetime.timedelta(days=1)}, older than {max_days} days")
+
+    return [first + datetime.timedelta(days=offset) for offset in range((today - first).days)]
+
+
+def compose_belated_messages(date: datetime.date, celebrants: DayCelebrants,
+                             icon_emoji_csv: Optional[str] = None,
+                             max_bytes: Optional[int] = None) -> List[str]:
+    """Compose the belated wishes of one missed day."""
+    day = get_template_set().day(date)
+
+    sections = compose_sections("belated_birthday", celebrants.birthdays, icon_emoji_csv, max_bytes, day=day)
+    sections.extend(compose_sections("belated_nameday", celebrants.namedays, icon_emoji_csv, max_bytes, day=day))
+
+    return pack_sections(sections, max_bytes)
+
+
+def compose_combined_belated_messages(grouped: Dict[datetime.date, DayCelebrants],
+                                      icon_emoji_csv: Optional[str] = None,
+                                      max_bytes: Optional[int] = None) -> List[str]:
+    """Compose the belated wishes of all the missed days together, a line per day."""
+    templates = get_template_set()
+    sections = [templates["belated_header"].render(emoji=get_random_emoji(icon_emoji_csv))]
+
+    for date in sorted(grouped):
+        day = templates.day(date)
+        celebrants = grouped[date]
+        sections.extend(compose_sections("digest_birthday", celebrants.birthdays, icon_emoji_csv, max_bytes, day=day))
+        sections.extend(compose_sections("digest_nameday", celebrants.namedays, icon_emoji_csv, max_bytes, day=day))
+
+    return pack_sections(sections, max_bytes)
+
+
+def run_catchup(today: Optional[datetime.date] = None) -> bool:
+    """Post the belated wishes of the missed days and today's greetings, reading the roster once."""
+    config = get_config()
+    today = today or datetime.date.today()
+
+    if (config.catchup_policy not in CATCHUP_POLICIES):
+        supported = ", ".join(CATCHUP_POLICIES)
+        raise ValueError(f"Unsupported catch-up policy {config.catchup_policy}. Use one of {supported}.")
+
+    # the runs take turns, a rerun finds the days posted in the ledger
+    with ledger_locked():
+        missed = missed_days(read_last_posted(config.state_path), today, config.catchup_max_days)
+
+        if (len(missed) == 0):
+            result = zivijo_run()
+        else:
+            # the belated wishes all go to ZIVIJO_CHANNEL, a roster routing its rows elsewhere is refused
+            check_unrouted(config.birthdays_csv_path, "the catch-up")
+            result = post_with_missed_days(missed, today)
+
+        if (result):
+            write_last_posted(config.state_path, today)
+
+    return result
+
+
+def post_with_missed_days(missed: List[datetime.date], today: datetime.date) -> bool:
+    """Group the missed days and today in one read of the roster and post them, oldest first."""
+    config = get_config()
+    metrics = get_metrics()
+
+    logging.info(f"Catching up on {len(missed)} missed days from {missed[0]}")
+
+    # the missed days run up to today
+    grouped, rows = read_window(missed[0], len(missed) + 1)
+
+    if (rows == 0):
+        logging.info(f"No data read? {config.birthdays_csv_path} is empty?")
+        return False
+
+    todays = grouped.pop(today, DayCelebrants([], []))
+
+    for celebrants in grouped.values():
+        metrics.count("celebrants_belated", len(celebrants.birthdays), kind="birthday")
+        metrics.count("celebrants_belated", len(celebrants.namedays), kind="nameday")
+
+    def combined(celebrations: Celebrations) -> List[Dict]:
+        return build_payloads(compose_combined_belated_messages({date: grouped[date] for date in celebrations}))
+
+    def belated(celebrations: Celebrations) -> List[Dict]:
+        date, = celebrations
+        return build_payloads(compose_belated_messages(date, grouped[date]))
+
+    # the belated wishes of a day count as its greetings in the ledger, a day posted before is not repeated
+    if (len(grouped) == 0):
+        logging.info("Nobody celebrated on the missed days")
+    elif (config.catchup_policy == "combined"):
+        post_once(grouped, combined)
+        write_last_posted(config.state_path, max(grouped))
+    else:
+        for date in sorted(grouped):
+            post_once({date: grouped[date]}, belated)
+            # a failure later on does not repeat the days already posted
+            write_last_posted(config.state_path, date)
+
+    metrics.count("celebrants_matched", len(todays.birthdays), kind="birthday")
+    metrics.count("celebrants_matched", len(todays.namedays), kind="nameday")
+
+    if ((len(todays.birthdays) == 0) and (len(todays.namedays) == 0)):
+        logging.info("No birthdays or namedays today :(")
+        return True
+
+    logging.info(f"We have some birthdays and namedays today! {todays.birthdays} {todays.namedays}")
+    return post_message(todays.birthdays, todays.namedays, date=today)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""Compact column store of a roster: interned ids and packed month/day keys, matched in one vectorised pass."""
+
+import datetime
+import itertools
+import sys
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from env import get_config
+from index import Celebrants, month_day_keys, parse_feb29_fallback
+
+# key of a row without the date, no real month/day packs into it
+NO_DATE = 0
+
+# how a roster kept in memory is stored (ZIVIJO_ROSTER_FORMAT): the dict index or the column store
+ROSTER_FORMATS = ("index", "columnar")
+
+
+def is_columnar(roster_format: str) -> bool:
+    """Should the roster be kept in the column store? Raises ValueError on an unknown ZIVIJO_ROSTER_FORMAT."""
+    if (roster_format not in ROSTER_FORMATS):
+        raise ValueError(f"Invalid roster format {roster_format}. Expected one of {', '.join(ROSTER_FORMATS)}.")
+
+    return roster_format == "columnar"
+
+
+def pack_month_day(month: int, day: int) -> int:
+    """Pack a (month, day) pair into one small integer, month * 32 + day."""
+    return (month << 5) | day
+
+
+def optional_numpy() -> Any:
+    """The numpy module if it is installed, None otherwise."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+
+    return numpy
+
+
+class ColumnarRoster:
+    """The parsed roster as columns: a list of interned ids and two array('H') of packed birth and name days."""
+
+    def __init__(self) -> None:
+        self.ids: List[str] = []
+        self.birth_keys = array("H")
+        self.name_keys = array("H")
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict]) -> "ColumnarRoster":
+        """Build the columns from rows returned by iter_parsed_csv, keeping nothing else of them."""
+        roster = cls()
+
+        for row in rows:
+            roster.add(row)
+
+        return roster
+
+    def add(self, row: Dict) -> None:
+        """Append one parsed row."""
+        birth_date = row.get("birth_date")
+        name_date = row.get("name_date")
+
+        self.ids.append(sys.intern(row["user_id"]))
+        self.birth_keys.append(pack_month_day(birth_date.month, birth_date.day) if birth_date else NO_DATE)
+        self.name_keys.append(pack_month_day(name_date.month, name_date.day) if name_date else NO_DATE)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def size(self) -> int:
+        """Number of rows, like CelebrationIndex.size."""
+        return len(self.ids)
+
+    def nbytes(self) -> int:
+        """Memory held by the columns: the id list, the id strings and the key arrays."""
+        return sys.getsizeof(self.ids) + sum(map(sys.getsizeof, set(self.ids))) + \
+            sys.getsizeof(self.birth_keys) + sys.getsizeof(self.name_keys)
+
+    def match(self, date: datetime.date, feb29_fallback: Optional[str] = None,
+              use_numpy: Optional[bool] = None) -> Celebrants:
+        """Pick the people celebrating on the date, in roster order, like filter_celebrants does.
+
+        numpy is used when it is installed (unless use_numpy is False), otherwise the keys are compared in C
+        by map() and the ids picked by itertools.compress().
+        """
+        if (feb29_fallback is None):
+            feb29_fallback = get_config().feb29_fallback
+
+        month_days = month_day_keys(date, parse_feb29_fallback(feb29_fallback))
+        keys = [pack_month_day(month, day) for month, day in month_days]
+        numpy = optional_numpy() if (use_numpy is not False) else None
+
+        if (numpy is not None):
+            wanted = numpy.array(keys, dtype=numpy.uint16)
+            ids = self.ids
+
+            def select(column: array) -> List[str]:
+                positions = numpy.flatnonzero(numpy.isin(numpy.frombuffer(column, dtype=numpy.uint16), wanted))
+                return [ids[position] for position in positions.tolist()]
+        else:
+            wanted_keys = frozenset(keys)
+
+            def select(column: array) -> List[str]:
+                return list(itertools.compress(self.ids, map(wanted_keys.__contains__, column)))
+
+        return Celebrants(select(self.birth_keys), select(self.name_keys), len(self.ids))
+
+    def lookup(self, date: datetime.date) -> Tuple[List[str], List[str]]:
+        """Return the (birthday, nameday) people ids for the date, like CelebrationIndex.lookup."""
+        celebrants = self.match(date)
+        return celebrants.birthdays, celebrants.namedays
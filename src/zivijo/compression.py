@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Compressed rosters (gzip, bz2, xz), decompressed on the fly while they are parsed."""
+
+import importlib
+import io
+import os
+from typing import BinaryIO, Optional, TextIO
+
+# magic bytes of the compressed files and the modules reading them
+COMPRESSION_MAGIC = {
+    b"\x1f\x8b": "gzip",
+    b"BZh": "bz2",
+    b"\xfd7zXZ\x00": "lzma",
+}
+
+# the extensions are looked at only when the file is too short to start with the magic bytes
+COMPRESSION_EXTENSIONS = {
+    ".gz": "gzip",
+    ".bz2": "bz2",
+    ".xz": "lzma",
+}
+
+MAGIC_SIZE = max(len(magic) for magic in COMPRESSION_MAGIC)
+
+# size of the decompressed blocks handed to the parser, the decompressors read 8 KiB of the file at a time
+DECOMPRESSED_BUFFER_SIZE = 1 << 16
+
+
+def detect_compression(head: bytes, path: str = "") -> Optional[str]:
+    """The module (gzip, bz2 or lzma) reading the file starting with head, None if it is not compressed.
+
+    A head of MAGIC_SIZE bytes or more is trusted over the extension, a shorter one (a file still being written)
+    leaves it to the extension.
+    """
+    for magic, module in COMPRESSION_MAGIC.items():
+        if (head.startswith(magic)):
+            return module
+
+    if (len(head) >= MAGIC_SIZE):
+        return None
+
+    return COMPRESSION_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def file_compression(path: str) -> Optional[str]:
+    """The module reading the file at path, None if it is not compressed."""
+    with open(path, "rb") as binary:
+        return detect_compression(binary.read(MAGIC_SIZE), path)
+
+
+def decompressing(binary: io.BufferedReader, path: str = "") -> BinaryIO:
+    """The bytes of the file, decompressed on the fly if it is compressed. Nothing is written to disk."""
+    compression = detect_compression(binary.peek(MAGIC_SIZE)[:MAGIC_SIZE], path)
+
+    if (compression is None):
+        return binary
+
+    # lazy import, the decompressors are loaded only for the compressed files
+    decompressor = importlib.import_module(compression).open(binary, "rb")
+    return io.BufferedReader(decompressor, DECOMPRESSED_BUFFER_SIZE)
+
+
+def decompressed_text(text: TextIO, path: str = "") -> TextIO:
+    """The text of the opened file, decompressed on the fly if it is compressed."""
+    binary = getattr(text, "buffer", None)
+
+    # only a buffered file can be peeked at without consuming it
+    if (not isinstance(binary, io.BufferedReader)):
+        return text
+
+    decompressed = decompressing(binary, path)
+    if (decompressed is binary):
+        return text
+
+    return io.TextIOWrapper(decompressed, encoding=text.encoding, errors=text.errors)
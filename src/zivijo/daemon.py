@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""Long-running mode: post every day at a configured local time from a warm in-memory roster."""
+
+import datetime
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from columnar import ColumnarRoster, is_columnar
+from delivery import get_deliverer
+from env import get_config
+from index import CelebrationIndex
+from ledger import ledger_locked
+from metrics import export_metrics, get_metrics, get_profiler, reset_metrics
+from webhook import Celebrations, check_unrouted, compose_payloads, is_remote, iter_parsed_csv, post_once, read_roster
+
+# a roster kept in memory, in the format of ZIVIJO_ROSTER_FORMAT
+Roster = Union[CelebrationIndex, ColumnarRoster]
+
+# never sleep longer than this, so wall clock jumps (DST, NTP) are noticed in time
+MAX_SLEEP_SECONDS = 300
+
+
+class Greetings(NamedTuple):
+    """The greetings of a day rendered ahead of time, and who they are for."""
+
+    date: datetime.date
+    birthdays: List[str]
+    namedays: List[str]
+    payloads: List[Dict]
+
+
+def parse_time_of_day(value: str) -> datetime.time:
+    """Parse the HH:MM value of ZIVIJO_DAEMON_AT."""
+    try:
+        return datetime.datetime.strptime(value, "%H:%M").time()
+    except ValueError:
+        raise ValueError(f"Invalid time of day {value}. Expected HH:MM, i.e. 09:00.")
+
+
+def next_trigger(now: datetime.datetime, at: datetime.time) -> datetime.datetime:
+    """Return the next moment (strictly after now) the daemon should post at."""
+    trigger = datetime.datetime.combine(now.date(), at)
+
+    if (trigger <= now):
+        trigger += datetime.timedelta(days=1)
+
+    return trigger
+
+
+class RosterCache:
+    """The parsed roster kept in memory, re-parsed only when the csv's mtime or size changes.
+
+    A roster published over HTTP is revalidated with a conditional request instead.
+    """
+
+    def __init__(self, csv_path: str) -> None:
+        self.csv_path = csv_path
+        self.signature: Optional[Tuple[int, int]] = None
+        self.index: Optional[Roster] = None
+        self.remote: Any = None
+        self.columnar = is_columnar(get_config().roster_format)
+
+        if (is_remote(csv_path)):
+            # lazy import, requests is needed only for the rosters published over HTTP
+            from remote import RemoteRoster
+
+            self.remote = RemoteRoster(csv_path, get_config().remote_cache_path)
+
+    def stat_signature(self) -> Tuple[int, int]:
+        """Return the (mtime, size) pair identifying the current version of the csv."""
+        stat = os.stat(self.csv_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def is_stale(self) -> bool:
+        """Has the csv changed since it was parsed?"""
+        if (self.remote is not None):
+            return (self.index is None) or (self.remote.refresh() is not self.index)
+
+        return (self.index is None) or (self.stat_signature() != self.signature)
+
+    def get(self) -> Roster:
+        """Return the index of the roster, re-parsing the csv if it has changed."""
+        if (self.remote is not None):
+            # the same index is returned as long as the server answers not modified
+            self.index = self.remote.refresh()
+            return self.index
+
+        signature = self.stat_signature()
+
+        if ((self.index is None) or (signature != self.signature)):
+            if (self.columnar):
+                self.index = read_roster(self.csv_path)
+            else:
+                self.index = CelebrationIndex.from_rows(iter_parsed_csv(self.csv_path))
+            self.signature = signature
+            logging.info(f"Loaded {self.index.size} birthdays from {self.csv_path}")
+
+        return self.index
+
+
+class Daemon:
+    """Posts the greetings every day at the given local time."""
+
+    def __init__(self,
+                 csv_path: str,
+                 at: str,
+                 now: Callable[[], datetime.datetime] = datetime.datetime.now,
+                 sleep: Callable[[float], None] = time.sleep) -> None:
+        # every post goes to ZIVIJO_CHANNEL, a roster routing its rows elsewhere is refused at the start
+        check_unrouted(csv_path, "the daemon")
+        self.roster = RosterCache(csv_path)
+        self.at = parse_time_of_day(at)
+        self.now = now
+        self.sleep = sleep
+
+    def prepare(self, date: datetime.date) -> Greetings:
+        """Render the payloads for the date ahead of time. Empty if nobody celebrates."""
+        metrics = get_metrics()
+
+        with metrics.phase("parse"):
+            index = self.roster.get()
+
+        with metrics.phase("filter"):
+            birthday_people_ids, nameday_people_ids = index.lookup(date)
+
+        if ((len(birthday_people_ids) == 0) and (len(nameday_people_ids) == 0)):
+            logging.info(f"No birthdays or namedays on {date}")
+            return Greetings(date, [], [], [])
+
+        logging.info(f"Prepared greetings for {date}: birthdays {birthday_people_ids}, namedays {nameday_people_ids}")
+        with metrics.phase("compose"):
+            payloads = compose_payloads(birthday_people_ids, nameday_people_ids)
+
+        return Greetings(date, birthday_people_ids, nameday_people_ids, payloads)
+
+    def wait_until(self, moment: datetime.datetime) -> None:
+        """Sleep until the given local time."""
+        while True:
+            remaining = (moment - self.now()).total_seconds()
+
+            if (remaining <= 0):
+                return
+
+            self.sleep(min(remaining, MAX_SLEEP_SECONDS))
+
+    def run_once(self) -> bool:
+        """Wait for the next trigger and post the greetings prepared for it."""
+        trigger = next_trigger(self.now(), self.at)
+
+        try:
+            greetings = self.prepare(trigger.date())
+        except Exception:
+            # the roster stays stale, so it is tried once more at the trigger
+            logging.exception(f"Failed to prepare the greetings for {trigger.date()}")
+            greetings = Greetings(trigger.date(), [], [], [])
+
+        logging.info(f"Next post at {trigger}")
+        self.wait_until(trigger)
+
+        # the roster changed while waiting, the prepared payloads may be outdated
+        if (self.roster.is_stale()):
+            greetings = self.prepare(trigger.date())
+
+        # the posts left in the outbox go first, they are older
+        get_deliverer().flush()
+
+        if (not greetings.payloads):
+            return True
+
+        def prepared(celebrations: Celebrations) -> List[Dict]:
+            return greetings.payloads
+
+        # another run posting the same day, i.e. a cron job left in place, takes turns with the daemon
+        with ledger_locked():
+            return post_once({greetings.date: (greetings.birthdays, greetings.namedays)}, prepared)
+
+    def run_forever(self, max_runs: Optional[int] = None) -> None:
+        """Keep posting every day. A failed day is logged and the daemon carries on."""
+        runs = 0
+
+        # the posts the previous process could not send
+        get_deliverer().flush()
+
+        while ((max_runs is None) or (runs < max_runs)):
+            reset_metrics()
+            result = False
+
+            try:
+                result = self.run_once()
+            except Exception:
+                logging.exception("Failed to post the greetings")
+
+            get_metrics().set("run_success", int(result))
+            export_metrics()
+
+            # the profile of every day replaces the one of the day before
+            profiler = get_profiler()
+            if (profiler is not None):
+                profiler.write()
+
+            runs += 1
+
+
+def run_daemon() -> None:
+    """Start the daemon with the configuration from the environment."""
+    config = get_config()
+
+    logging.info(f"Starting Živijó daemon, posting every day at {config.daemon_at}")
+    Daemon(config.birthdays_csv_path, config.daemon_at).run_forever()
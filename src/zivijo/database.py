@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""SQLite backend: the roster imported into a local database, queried by indexed month and day columns."""
+
+import datetime
+import logging
+import sqlite3
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from env import get_config
+from index import Celebrants, month_day_keys, parse_feb29_fallback
+from webhook import iter_parsed_csv
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS people (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    birth_month INTEGER,
+    birth_day INTEGER,
+    name_month INTEGER,
+    name_day INTEGER
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# created after the bulk load, it is faster than keeping them up to date row by row
+INDEXES = """
+CREATE INDEX IF NOT EXISTS people_birth ON people (birth_month, birth_day);
+CREATE INDEX IF NOT EXISTS people_name ON people (name_month, name_day);
+"""
+
+INSERT = "INSERT INTO people (user_id, birth_month, birth_day, name_month, name_day) VALUES (?, ?, ?, ?, ?)"
+
+# column pairs of the two kinds of celebrations
+COLUMNS = {
+    "birthday": ("birth_month", "birth_day"),
+    "nameday": ("name_month", "name_day"),
+}
+
+
+def connect(database_path: str) -> sqlite3.Connection:
+    """Open the database, transactions are begun and committed explicitly."""
+    connection = sqlite3.connect(database_path, isolation_level=None)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def to_record(row: Dict) -> Tuple:
+    """The values of one parsed row, in the order of INSERT."""
+    birth_date = row.get("birth_date")
+    name_date = row.get("name_date")
+
+    return (
+        row["user_id"],
+        birth_date.month if birth_date else None,
+        birth_date.day if birth_date else None,
+        name_date.month if name_date else None,
+        name_date.day if name_date else None,
+    )
+
+
+def import_rows(connection: sqlite3.Connection, rows: Iterable[Dict], source: str = "") -> int:
+    """Replace the roster in the database with the rows, in one transaction. Returns the number of rows."""
+    count = 0
+
+    def counted(records: Iterator[Tuple]) -> Iterator[Tuple]:
+        nonlocal count
+        for record in records:
+            count += 1
+            yield record
+
+    connection.execute("BEGIN")
+    try:
+        connection.execute("DROP INDEX IF EXISTS people_birth")
+        connection.execute("DROP INDEX IF EXISTS people_name")
+        connection.execute("DELETE FROM people")
+        connection.executemany(INSERT, counted(map(to_record, rows)))
+        for statement in filter(None, (statement.strip() for statement in INDEXES.split(";"))):
+            connection.execute(statement)
+        connection.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+            ("rows", str(count)),
+            ("source", source),
+            ("imported", datetime.datetime.now(datetime.timezone.utc).isoformat()),
+        ])
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+
+    return count
+
+
+def import_csv(csv_path: Optional[str] = None, database_path: Optional[str] = None) -> int:
+    """Import the csv (ZIVIJO_BIRTHDAYS_CSV_PATH unless given) into the database, logging the rows per second."""
+    config = get_config()
+    csv_path = csv_path or config.birthdays_csv_path
+    database_path = database_path or config.database_path
+
+    start = time.monotonic()
+    connection = connect(database_path)
+    try:
+        count = import_rows(connection, iter_parsed_csv(csv_path), csv_path)
+    finally:
+        connection.close()
+    elapsed = time.monotonic() - start
+
+    logging.info(f"Imported {count} birthdays from {csv_path} into {database_path} in {elapsed:.2f}s "
+                 f"({count / elapsed if elapsed > 0 else 0:,.0f} rows/s)")
+
+    return count
+
+
+def select_celebrants(connection: sqlite3.Connection, kind: str, date: datetime.date,
+                      feb29_fallback: Optional[str] = None) -> List[str]:
+    """Ids of the people celebrating the kind (birthday or nameday) on the date, in roster order."""
+    if (feb29_fallback is None):
+        feb29_fallback = get_config().feb29_fallback
+
+    month_column, day_column = COLUMNS[kind]
+    keys = month_day_keys(date, parse_feb29_fallback(feb29_fallback))
+    condition = " OR ".join(f"({month_column} = ? AND {day_column} = ?)" for _ in keys)
+    parameters = [value for key in keys for value in key]
+
+    query = f"SELECT user_id FROM people WHERE {condition} ORDER BY id"  # nosec B608
+    return [user_id for user_id, in connection.execute(query, parameters)]
+
+
+def query_celebrants(database_path: str, date: datetime.date, feb29_fallback: Optional[str] = None) -> Celebrants:
+    """People celebrating on the date according to the database."""
+    connection = connect(database_path)
+
+    try:
+        birthday_people_ids = select_celebrants(connection, "birthday", date, feb29_fallback)
+        nameday_people_ids = select_celebrants(connection, "nameday", date, feb29_fallback)
+        rows = connection.execute("SELECT value FROM meta WHERE key = 'rows'").fetchone()
+    finally:
+        connection.close()
+
+    return Celebrants(birthday_people_ids, nameday_people_ids, int(rows[0]) if rows else 0)
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+"""Date parsing helpers."""
+
+import datetime
+
+ISO_DATE_FORMAT = "%Y-%m-%d"
+
+
+def parse_iso_date(value: str) -> datetime.date:
+    """Parse an ISO (YYYY-MM-DD) date. Raises ValueError for malformed dates, just like datetime.strptime."""
+
+    # fast path for the canonical zero padded form, fromisoformat validates the ranges (leap years included)
+    if ((len(value) == 10) and (value[4] == "-") and (value[7] == "-")):
+        return datetime.date.fromisoformat(value)
+
+    # anything unusual (i.e. 1990-1-1) goes through strptime so the accepted inputs stay the same
+    return datetime.datetime.strptime(value, ISO_DATE_FORMAT).date()
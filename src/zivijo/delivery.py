@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""Rate limit aware delivery of the payloads, with retries and a persistent outbox."""
+
+import datetime
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Mapping, Optional
+
+from env import Config, get_config
+from metrics import get_metrics
+
+if TYPE_CHECKING:
+    # requests is imported only once there is something to post
+    import requests
+
+# statuses worth trying again, everything else but 200 is a permanent failure
+RETRYABLE_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+# subdirectory of the outbox keeping the payloads Mattermost rejected, for a human to look at
+DEAD_LETTER_DIR = "dead-letter"
+
+# outcomes of Deliverer.deliver: sent now, or kept in the outbox and sent on the next start
+DELIVERED = "delivered"
+QUEUED = "queued"
+
+
+class DeliveryError(Exception):
+    """The payload could not be delivered to Mattermost."""
+
+
+class PermanentDeliveryError(DeliveryError):
+    """Mattermost rejected the payload (i.e. 400, 404, 413), sending it again would not help."""
+
+
+class TokenBucket:
+    """Token bucket limiting the request rate, adjusted by the X-Ratelimit-* and Retry-After headers."""
+
+    def __init__(self, rate: float, capacity: float,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self) -> None:
+        """Wait until a request may be made and take a token for it."""
+        while True:
+            with self.lock:
+                now = self.clock()
+                self._refill(now)
+
+                if ((now >= self.blocked_until) and (self.tokens >= 1)):
+                    self.tokens -= 1
+                    return
+
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+
+            self.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Do not let any request through for the given number of seconds."""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """Follow the server's view of the rate limit (X-Ratelimit-Limit, -Remaining and -Reset)."""
+        limit = parse_number(headers.get("X-Ratelimit-Limit"))
+        remaining = parse_number(headers.get("X-Ratelimit-Remaining"))
+        reset = parse_number(headers.get("X-Ratelimit-Reset"))
+
+        with self.lock:
+            if (limit is not None) and (limit > 0):
+                self.rate = limit
+                self.capacity = max(self.capacity, limit)
+
+            if (remaining is not None):
+                self.tokens = min(self.tokens, remaining)
+
+        if ((remaining is not None) and (remaining < 1) and (reset is not None)):
+            self.pause(reset)
+
+
+def parse_number(value: Optional[str]) -> Optional[float]:
+    """Parse a numeric header value, None if it is missing or garbage."""
+    if (not isinstance(value, str)):
+        return None
+
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def parse_retry_after(value: Optional[str], now: Optional[datetime.datetime] = None) -> Optional[float]:
+    """Parse the Retry-After header, either delay seconds or an HTTP date, into seconds to wait."""
+    if ((not value) or (not isinstance(value, str))):
+        return None
+
+    seconds = parse_number(value)
+    if (seconds is not None):
+        return max(seconds, 0.0)
+
+    import email.utils
+
+    try:
+        moment = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    return max((moment - now).total_seconds(), 0.0)
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter for the given (0 based) attempt."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))  # nosec B311
+
+
+class Outbox:
+    """Payloads waiting for delivery, one JSON file each, so they survive a crash."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def put(self, payload: Dict, webhook_url: str) -> str:
+        """Store the payload and return the path of its entry."""
+        import uuid
+
+        name = f"{time.time_ns():020d}-{uuid.uuid4().hex}.json"
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.tmp"
+
+        with open(tmp_path, "w") as entry:
+            json.dump({"webhook_url": webhook_url, "payload": payload}, entry)
+            entry.flush()
+            os.fsync(entry.fileno())
+
+        # atomic, the entry is either complete or not there at all
+        os.replace(tmp_path, path)
+
+        return path
+
+    def pending(self) -> List[str]:
+        """Paths of the entries not delivered yet, oldest first."""
+        return sorted(
+            os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".json")
+        )
+
+    def load(self, path: str) -> Dict:
+        """Read one entry."""
+        with open(path) as entry:
+            return json.load(entry)
+
+    def remove(self, path: str) -> None:
+        """Forget a delivered entry."""
+        os.remove(path)
+
+    def dead_letter(self, path: str) -> str:
+        """Move an entry Mattermost rejected to the dead-letter directory, out of the way of the others."""
+        dead_letter_dir = os.path.join(self.directory, DEAD_LETTER_DIR)
+        os.makedirs(dead_letter_dir, exist_ok=True)
+
+        dead_path = os.path.join(dead_letter_dir, os.path.basename(path))
+        os.replace(path, dead_path)
+
+        return dead_path
+
+
+class Deliverer:
+    """Sends payloads through the token bucket, retrying with backoff and keeping them in the outbox until sent."""
+
+    def __init__(self,
+                 bucket: TokenBucket,
+                 outbox: Optional[Outbox] = None,
+                 max_retries: int = Config.max_retries,
+                 backoff_base: float = Config.retry_backoff_seconds,
+                 backoff_cap: float = Config.retry_backoff_max_seconds,
+                 sleep: Callable[[float], None] = time.sleep) -> None:
+        self.bucket = bucket
+        self.outbox = outbox
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.sleep = sleep
+
+    def send(self, payload: Dict, webhook_url: str, session: Optional["requests.Session"] = None) -> bool:
+        """Send the payload, retrying rate limited and failed attempts. Raises DeliveryError when giving up."""
+        import requests
+
+        http = requests if (session is None) else session
+        headers = {"Content-Type": "application/json"}
+        metrics = get_metrics()
+        reason = ""
+
+        for attempt in range(self.max_retries + 1):
+            if (attempt > 0):
+                metrics.count("http_retries")
+
+            self.bucket.acquire()
+            start = time.monotonic()
+
+            try:
+                response = http.post(webhook_url, headers=headers, json=payload, timeout=5)
+            except requests.RequestException as e:
+                metrics.count("http_request_seconds", time.monotonic() - start)
+                metrics.count("http_requests", status="error")
+                reason = str(e)
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+            else:
+                metrics.count("http_request_seconds", time.monotonic() - start)
+                metrics.count("http_requests", status=str(response.status_code))
+                self.bucket.update_from_headers(response.headers)
+
+                if (response.status_code == 200):
+                    return True
+
+                reason = f"{response.status_code} {response.text}"
+
+                if (response.status_code not in RETRYABLE_STATUS_CODES):
+                    raise PermanentDeliveryError(f"Failed to send notification to Mattermost: {reason}")
+
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if (retry_after is not None):
+                    # the server knows best, hold back every other request as well
+                    self.bucket.pause(retry_after)
+                    delay = 0.0
+                else:
+                    delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+
+            if (attempt < self.max_retries):
+                logging.warning(f"Failed to send notification to Mattermost ({reason}), retrying in {delay:.2f}s")
+                self.sleep(delay)
+
+        attempts = self.max_retries + 1
+        raise DeliveryError(f"Failed to send notification to Mattermost after {attempts} attempts: {reason}")
+
+    def deliver(self, payload: Dict, webhook_url: str, session: Optional["requests.Session"] = None) -> str:
+        """Store the payload in the outbox (if there is one), send it and forget it once it is sent.
+
+        Returns DELIVERED, or QUEUED when the retries ran out and the payload stays in the outbox for the next start.
+        Raises DeliveryError without an outbox, and PermanentDeliveryError when Mattermost rejected the payload,
+        which is moved to the dead letters.
+        """
+        if (self.outbox is None):
+            self.send(payload, webhook_url, session)
+            return DELIVERED
+
+        entry = self.outbox.put(payload, webhook_url)
+        try:
+            self.send(payload, webhook_url, session)
+        except PermanentDeliveryError:
+            logging.error(f"Mattermost rejected the payload, moved it to {self.outbox.dead_letter(entry)}")
+            raise
+        except DeliveryError as e:
+            logging.error(f"{e}, kept it in the outbox {entry} for the next start")
+            return QUEUED
+
+        self.outbox.remove(entry)
+
+        return DELIVERED
+
+    def queue(self, payload: Dict, webhook_url: str) -> str:
+        """Store the payload in the outbox without sending it, behind the ones queued before. Returns QUEUED."""
+        if (self.outbox is None):
+            raise DeliveryError("There is no outbox to queue the payload in")
+
+        self.outbox.put(payload, webhook_url)
+
+        return QUEUED
+
+    def flush(self, session: Optional["requests.Session"] = None) -> int:
+        """Send the payloads left in the outbox by earlier runs, in order. Returns how many were sent."""
+        if (self.outbox is None):
+            return 0
+
+        sent = 0
+
+        for path in self.outbox.pending():
+            entry = self.outbox.load(path)
+
+            try:
+                self.send(entry["payload"], entry["webhook_url"], session)
+            except PermanentDeliveryError as e:
+                # it would block the rest for good, set it aside and carry on
+                logging.error(f"Mattermost rejected the outbox entry {path}, moved it to "
+                              f"{self.outbox.dead_letter(path)}: {e}")
+                continue
+            except DeliveryError as e:
+                # keep the order, the rest waits for the next start
+                logging.error(f"Failed to flush the outbox entry {path}: {e}")
+                break
+
+            self.outbox.remove(path)
+            sent += 1
+
+        if (sent > 0):
+            logging.info(f"Flushed {sent} unsent posts from the outbox {self.outbox.directory}")
+
+        return sent
+
+
+_default_deliverer: Optional[Deliverer] = None
+_default_deliverer_lock = threading.Lock()
+
+
+def get_deliverer() -> Deliverer:
+    """Deliverer configured from the environment, shared by the whole process (and its rate limit)."""
+    global _default_deliverer
+
+    with _default_deliverer_lock:
+        if (_default_deliverer is None):
+            config = get_config()
+            _default_deliverer = Deliverer(
+                TokenBucket(config.rate_limit_per_second, config.rate_limit_burst),
+                Outbox(config.outbox_dir) if config.outbox_dir else None,
+                max_retries=config.max_retries,
+                backoff_base=config.retry_backoff_seconds,
+                backoff_cap=config.retry_backoff_max_seconds
+            )
+
+        return _default_deliverer
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""Digest of the upcoming birthdays and namedays over a window of days, grouped by day."""
+
+import datetime
+import logging
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from env import get_config
+from index import MonthDay, month_day_keys, parse_feb29_fallback
+from ledger import ledger_locked
+from metrics import get_metrics
+from templates import get_template_set
+from webhook import Celebrations, build_payloads, check_unrouted, compose_sections, get_random_emoji, \
+    iter_parsed_csv, lookup_celebrants, pack_sections, post_once
+
+
+class DayCelebrants(NamedTuple):
+    """People celebrating on one day of the digest."""
+
+    birthdays: List[str]
+    namedays: List[str]
+
+
+def window_days(start: datetime.date, days: int) -> List[datetime.date]:
+    """The dates of the window, crossing the year end as needed."""
+    if (days < 1):
+        raise ValueError(f"Invalid digest window of {days} days. Expected at least 1.")
+
+    return [start + datetime.timedelta(days=offset) for offset in range(days)]
+
+
+def group_celebrants(rows: Iterable[Dict], start: datetime.date, days: int,
+                     feb29_fallback: Optional[str] = None) -> Dict[datetime.date, DayCelebrants]:
+    """Group the people celebrating in the window by day in one pass over the rows, leaving out the empty days."""
+    if (feb29_fallback is None):
+        feb29_fallback = get_config().feb29_fallback
+
+    fallback = parse_feb29_fallback(feb29_fallback)
+    grouped: Dict[datetime.date, DayCelebrants] = {}
+
+    # invert the window, every (month, day) points to the dates of the window it is celebrated on
+    dates_by_key: Dict[MonthDay, List[datetime.date]] = {}
+    for date in window_days(start, days):
+        grouped[date] = DayCelebrants([], [])
+        for key in month_day_keys(date, fallback):
+            dates_by_key.setdefault(key, []).append(date)
+
+    for row in rows:
+        birth_date = row.get("birth_date")
+        if (birth_date):
+            for date in dates_by_key.get((birth_date.month, birth_date.day), ()):
+                grouped[date].birthdays.append(row["user_id"])
+
+        name_date = row.get("name_date")
+        if (name_date):
+            for date in dates_by_key.get((name_date.month, name_date.day), ()):
+                grouped[date].namedays.append(row["user_id"])
+
+    return {date: celebrants for date, celebrants in grouped.items() if (celebrants.birthdays or celebrants.namedays)}
+
+
+def read_window(start: datetime.date, days: int) -> Tuple[Dict[datetime.date, DayCelebrants], int]:
+    """The celebrants of the days of the window, leaving out the empty days, and the number of rows read.
+
+    The roster is read the way run() reads it: from the database, snapshot, roster cache or column store when
+    configured, otherwise the csv is parsed once for all the days, by the parse workers when there are several.
+    """
+    config = get_config()
+    metrics = get_metrics()
+    found = lookup_celebrants(window_days(start, days))
+
+    if (found is not None):
+        grouped = {
+            date: DayCelebrants(celebrants.birthdays, celebrants.namedays)
+            for date, celebrants in found.items() if (celebrants.birthdays or celebrants.namedays)
+        }
+        return grouped, found[start].rows
+
+    if (config.parse_workers > 1):
+        # lazy import, the workers are started only when configured
+        from parallel import parallel_group_celebrants
+
+        with metrics.phase("parse"):
+            return parallel_group_celebrants(config.birthdays_csv_path, start, days, config.parse_workers)
+
+    rows = 0
+
+    def counted(parsed_rows: Iterable[Dict]) -> Iterator[Dict]:
+        nonlocal rows
+        for row in parsed_rows:
+            rows += 1
+            yield row
+
+    with metrics.phase("filter", exclude="parse"):
+        parsed_rows = metrics.timed(iter_parsed_csv(config.birthdays_csv_path), "parse")
+        grouped = group_celebrants(counted(parsed_rows), start, days)
+
+    return grouped, rows
+
+
+def compose_digest_messages(grouped: Dict[datetime.date, DayCelebrants], start: datetime.date, days: int,
+                            icon_emoji_csv: Optional[str] = None,
+                            max_bytes: Optional[int] = None) -> List[str]:
+    """Compose the digest texts: a header and the celebrants of every day, each message within max_bytes."""
+    templates = get_template_set()
+    last_day = window_days(start, days)[-1]
+    sections = [templates["digest_header"].render(
+        emoji=get_random_emoji(icon_emoji_csv),
+        first_day=start.isoformat(),
+        last_day=last_day.isoformat()
+    )]
+
+    for date in sorted(grouped):
+        day = templates.day(date)
+        celebrants = grouped[date]
+        sections.extend(compose_sections("digest_birthday", celebrants.birthdays, icon_emoji_csv, max_bytes, day=day))
+        sections.extend(compose_sections("digest_nameday", celebrants.namedays, icon_emoji_csv, max_bytes, day=day))
+
+    return pack_sections(sections, max_bytes)
+
+
+def run_digest(start: Optional[datetime.date] = None, days: Optional[int] = None) -> bool:
+    """Post the digest of the window starting at start (today unless given) and ZIVIJO_DIGEST_DAYS long."""
+    config = get_config()
+    start = start or datetime.date.today()
+    days = days or config.digest_days
+    metrics = get_metrics()
+
+    # the digest is posted to ZIVIJO_CHANNEL, a roster routing its rows elsewhere is refused
+    check_unrouted(config.birthdays_csv_path, "the digest")
+
+    grouped, _ = read_window(start, days)
+
+    for celebrants in grouped.values():
+        metrics.count("celebrants_matched", len(celebrants.birthdays), kind="birthday")
+        metrics.count("celebrants_matched", len(celebrants.namedays), kind="nameday")
+
+    if (len(grouped) == 0):
+        logging.info(f"No birthdays or namedays in the {days} days from {start}")
+        return True
+
+    logging.info(f"Celebrations on {len(grouped)} of the {days} days from {start}")
+
+    def compose(celebrations: Celebrations) -> List[Dict]:
+        return build_payloads(compose_digest_messages(grouped, start, days))
+
+    # the digest is recorded under its first day, with the day of each of its people
+    people = (
+        [f"{date} {people_id}" for date in sorted(grouped) for people_id in grouped[date].birthdays],
+        [f"{date} {people_id}" for date in sorted(grouped) for people_id in grouped[date].namedays],
+    )
+
+    with ledger_locked():
+        return post_once({start: people}, compose, kind="digest")
@@ -3,23 +3,171 @@
 
 import os
 import logging
+from dataclasses import dataclass, fields
+from typing import Any, Mapping, Optional
 
 # Constants
-ZIVIJO_LOGLEVEL = os.getenv('ZIVIJO_LOGLEVEL', logging.getLevelName(logging.INFO)).upper()
+ZIVIJO_BOT_USERNAME = "Živijó"
 
-# the URL of the incoming webhook
-ZIVIJO_WEBHOOK_URL = os.getenv('ZIVIJO_WEBHOOK_URL')
+# prefix of the environment variables, Config.channel is read from ZIVIJO_CHANNEL etc.
+ENV_PREFIX = "ZIVIJO_"
 
-# channel to post in
-ZIVIJO_CHANNEL = os.getenv('ZIVIJO_CHANNEL', 'town-square')
 
-# the path to the CSV file to read
-ZIVIJO_BIRTHDAYS_CSV_PATH = os.getenv('ZIVIJO_BIRTHDAYS_CSV_PATH')
+@dataclass(frozen=True)
+class Config:
+    """Configuration of the webhook, read from the ZIVIJO_* environment variables."""
 
-# bot appearance
-ZIVIJO_BOT_USERNAME = "Živijó"
-ZIVIJO_ICON_EMOJI_CSV = os.getenv(
-    'ZIVIJO_ICON_EMOJI_CSV',
-    # default to some emojis
-    ':champagne:,:tada:,:clinking_glasses:,:confetti_ball:,:gift:,:birthday:'
-)
+    # log level respecting the default python logging levels
+    loglevel: str = logging.getLevelName(logging.INFO)
+
+    # the URL of the incoming webhook
+    webhook_url: Optional[str] = None
+
+    # channel to post in
+    channel: str = "town-square"
+
+    # the path to the CSV file to read
+    birthdays_csv_path: Optional[str] = None
+
+    # SQLite database the csv is imported into (see the import command), queried instead of reading the csv
+    database_path: Optional[str] = None
+
+    # compiled snapshot of the csv (see the compile command), used while it is up to date with the csv
+    snapshot_path: Optional[str] = None
+
+    # cache of the parsed csv and how far it was parsed, so the next runs parse only the rows appended since
+    roster_cache_path: Optional[str] = None
+
+    # where a roster published over HTTP is kept, revalidated with ETag / If-Modified-Since instead of downloaded
+    remote_cache_path: Optional[str] = None
+
+    # longest message (in UTF-8 bytes) sent in one post, longer lists of people are split into more posts
+    max_post_bytes: int = 16383
+
+    # directory keeping the unsent posts across restarts, disabled if not set
+    outbox_dir: Optional[str] = None
+
+    # retries of a failed post, with exponential backoff (and jitter) between them
+    max_retries: int = 5
+    retry_backoff_seconds: float = 1
+    retry_backoff_max_seconds: float = 60
+
+    # client side rate limit, the Mattermost defaults; adjusted by the X-Ratelimit-* headers of the responses
+    rate_limit_per_second: float = 10
+    rate_limit_burst: float = 100
+
+    # local time (HH:MM) at which the daemon posts every day
+    daemon_at: str = "09:00"
+
+    # address (HOST:PORT) of the query service and how often it checks the csv for changes
+    service_listen: str = "127.0.0.1:8080"
+    service_reload_seconds: float = 5.0
+
+    # file remembering the last day posted for, so the days missed are caught up on the next run; disabled if not set
+    state_path: Optional[str] = None
+
+    # how to post the missed days: "per-day" (a belated post for every day) or "combined" (one post for all of them)
+    catchup_policy: str = "combined"
+
+    # how many of the most recent missed days are caught up at most
+    catchup_max_days: int = 7
+
+    # how many days, starting today, the digest covers
+    digest_days: int = 7
+
+    # path to a JSON manifest of tenants, each with its own csv, webhook, channel and emojis
+    tenants_manifest_path: Optional[str] = None
+
+    # how many tenant rosters are parsed in parallel (processes) and how many posts are sent at once
+    parse_concurrency: int = 4
+    post_concurrency: int = 8
+
+    # how the roster is kept in memory while it is matched: "index" (dicts by month/day) or "columnar" (compact arrays)
+    roster_format: str = "index"
+
+    # worker processes parsing one large roster in byte ranges, 1 parses it serially in the main process
+    parse_workers: int = 1
+
+    # append-only ledger of the posts sent (and its lock file), so reruns and overlapping runs never post twice
+    ledger_path: Optional[str] = None
+
+    # where to write the timings and counters of each run: a JSON report and/or a Prometheus textfile
+    report_json_path: Optional[str] = None
+    prometheus_textfile_path: Optional[str] = None
+
+    # where to write the profile of each phase of the runs, disabled if not set, and what to profile: cpu, memory or all
+    profile_path: Optional[str] = None
+    profile_mode: str = "cpu"
+
+    # where to celebrate Feb 29 birthdays and namedays in non-leap years: 02-28, 03-01 or empty to skip them
+    feb29_fallback: str = "02-28"
+
+    # how many sample rows of each kind of problem the validation report keeps
+    validation_samples: int = 5
+
+    # language of the messages (en, sk, cs or one of the templates file) and a JSON file overriding the templates
+    locale: str = "en"
+    templates_path: Optional[str] = None
+
+    # channels of the teams (team=channel pairs, comma separated) for the rows with a team column and no channel column
+    team_channels: Optional[str] = None
+
+    # bot appearance
+    bot_username: str = ZIVIJO_BOT_USERNAME
+    icon_emoji_csv: str = ":champagne:,:tada:,:clinking_glasses:,:confetti_ball:,:gift:,:birthday:"
+
+    @classmethod
+    def from_env(cls, environ: Optional[Mapping[str, str]] = None) -> "Config":
+        """Read the configuration from the environment, missing variables keep their defaults."""
+        environ = os.environ if (environ is None) else environ
+        values: dict = {}
+
+        for config_field in fields(cls):
+            if (config_field.name == "bot_username"):
+                # not configurable
+                continue
+
+            name = f"{ENV_PREFIX}{config_field.name.upper()}"
+            if (name not in environ):
+                continue
+
+            value = environ[name]
+            if (config_field.type in (int, "int")):
+                values[config_field.name] = int(value)
+            elif (config_field.type in (float, "float")):
+                values[config_field.name] = float(value)
+            else:
+                values[config_field.name] = value
+
+        if ("loglevel" in values):
+            values["loglevel"] = values["loglevel"].upper()
+
+        return cls(**values)
+
+
+_config: Optional[Config] = None
+
+
+def load_config(environ: Optional[Mapping[str, str]] = None) -> Config:
+    """Read the configuration from the environment and make it the current one."""
+    global _config
+    _config = Config.from_env(environ)
+    return _config
+
+
+def get_config() -> Config:
+    """The current configuration, read from the environment on first use."""
+    if (_config is None):
+        return load_config()
+
+    return _config
+
+
+def __getattr__(name: str) -> Any:
+    """Keep the old module constants (i.e. env.ZIVIJO_CHANNEL) working, read from the current configuration."""
+    if (name.startswith(ENV_PREFIX)):
+        attribute = name[len(ENV_PREFIX):].lower()
+        if (attribute in {config_field.name for config_field in fields(Config)}):
+            return getattr(get_config(), attribute)
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""Incremental parsing of append-only rosters: only the rows appended since the last run are parsed."""
+
+import csv
+import hashlib
+import json
+import locale
+import logging
+import os
+from dataclasses import asdict, dataclass
+from typing import Any, BinaryIO, Iterator, List, Optional
+
+from compression import file_compression
+from index import CelebrationIndex
+from metrics import write_atomically
+from webhook import iter_parsed_csv, iter_parsed_lines
+
+# version of the cache file, a cache of another version is ignored
+CACHE_VERSION = 1
+
+# size of the blocks the prefix is hashed in
+HASH_BLOCK_SIZE = 1 << 20
+
+
+@dataclass
+class Checkpoint:
+    """How far the csv was parsed: the end of the last complete line, the lines read, their hash and the header."""
+
+    offset: int
+    rows: int
+    prefix_sha256: str
+    fieldnames: List[str]
+
+
+class IncrementalRoster:
+    """The parsed roster and its checkpoint, kept in a JSON cache file across runs if cache_path is given."""
+
+    def __init__(self, csv_path: str, cache_path: Optional[str] = None, feb29_fallback: Optional[str] = None) -> None:
+        self.csv_path = csv_path
+        self.cache_path = cache_path
+        self.feb29_fallback = feb29_fallback
+        self.checkpoint: Optional[Checkpoint] = None
+        self.index: Optional[CelebrationIndex] = None
+
+        if (cache_path and os.path.exists(cache_path)):
+            self.load()
+
+    def load(self) -> None:
+        """Read the checkpoint and the roster from the cache file, a broken or outdated cache is ignored."""
+        if (not self.cache_path):
+            return
+
+        try:
+            with open(self.cache_path) as cache_file:
+                cache = json.load(cache_file)
+
+            if (cache.get("version") != CACHE_VERSION):
+                raise ValueError(f"unsupported version {cache.get('version')}")
+
+            index = CelebrationIndex.from_dict(cache, self.feb29_fallback)
+
+            self.checkpoint = Checkpoint(**cache["checkpoint"])
+            self.index = index
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Ignoring the roster cache {self.cache_path}: {e}")
+
+    def save(self) -> None:
+        """Write the checkpoint and the roster to the cache file."""
+        if ((not self.cache_path) or (self.checkpoint is None) or (self.index is None)):
+            return
+
+        write_atomically(self.cache_path, json.dumps({
+            "version": CACHE_VERSION,
+            "checkpoint": asdict(self.checkpoint),
+            **self.index.to_dict(),
+        }))
+
+    def prefix_matches(self, csvfile: BinaryIO, sha256: Any) -> bool:
+        """Is the part of the csv parsed before unchanged? Hashes it into sha256 on the way."""
+        checkpoint = self.checkpoint
+
+        if ((checkpoint is None) or (os.fstat(csvfile.fileno()).st_size < checkpoint.offset)):
+            return False
+
+        remaining = checkpoint.offset
+        while (remaining > 0):
+            block = csvfile.read(min(remaining, HASH_BLOCK_SIZE))
+            if (not block):
+                return False
+
+            sha256.update(block)
+            remaining -= len(block)
+
+        return sha256.hexdigest() == checkpoint.prefix_sha256
+
+    def refresh(self) -> CelebrationIndex:
+        """Parse what was appended to the csv since the checkpoint, or all of it when it was rewritten."""
+        if (file_compression(self.csv_path) is not None):
+            # the offsets of a compressed file cannot be resumed from
+            logging.info(f"{self.csv_path} is compressed, parsing all of it")
+            self.index = CelebrationIndex.from_rows(iter_parsed_csv(self.csv_path), self.feb29_fallback)
+            return self.index
+
+        encoding = locale.getpreferredencoding(False)
+
+        with open(self.csv_path, "rb") as csvfile:
+            sha256 = hashlib.sha256()
+
+            checkpoint = self.checkpoint
+            if ((self.index is not None) and (checkpoint is not None) and self.prefix_matches(csvfile, sha256)):
+                index = self.index
+                fieldnames = checkpoint.fieldnames
+                rows = checkpoint.rows
+                logging.debug(f"{self.csv_path} unchanged up to byte {checkpoint.offset}, parsing only the rest")
+            else:
+                if (self.index is not None):
+                    logging.info(f"{self.csv_path} was rewritten, parsing all of it")
+
+                csvfile.seek(0)
+                sha256 = hashlib.sha256()
+                header = csvfile.readline()
+                sha256.update(header)
+
+                index = CelebrationIndex(self.feb29_fallback)
+                fieldnames = next(csv.reader([header.decode(encoding)]), [])
+                rows = 0
+
+            offset = csvfile.tell()
+            new_rows = 0
+            # the last line when it does not end yet, parsed for this run only
+            tail: Optional[str] = None
+
+            def new_lines() -> Iterator[str]:
+                """The complete lines after the checkpoint, a line still being written is kept apart as the tail."""
+                nonlocal offset, new_rows, tail
+                for line in iter(csvfile.readline, b""):
+                    if (not line.endswith(b"\n")):
+                        tail = line.decode(encoding)
+                        break
+
+                    sha256.update(line)
+                    offset += len(line)
+                    new_rows += 1
+                    yield line.decode(encoding)
+
+            # the lines are numbered after the header and the lines parsed before
+            for row in iter_parsed_lines(new_lines(), fieldnames, line_offset=1 + rows, source=self.csv_path):
+                index.add(row)
+
+        self.index = index
+        self.checkpoint = Checkpoint(offset, rows + new_rows, sha256.hexdigest(), fieldnames)
+        self.save()
+
+        logging.info(f"Parsed {new_rows} new lines of {self.csv_path}, {index.size} birthdays in total")
+
+        if (tail is None):
+            return index
+
+        # the checkpoint stays before the tail, so it is parsed again once it is complete or has grown
+        logging.debug(f"{self.csv_path} ends without a newline, its last line is not checkpointed")
+        with_tail = index.copy()
+        for row in iter_parsed_lines([tail], fieldnames, line_offset=1 + rows + new_rows, source=self.csv_path):
+            with_tail.add(row)
+
+        return with_tail
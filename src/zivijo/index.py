@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""Day-of-year index of birthdays and namedays."""
+
+import calendar
+import datetime
+import functools
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from env import get_config
+
+# (month, day) key of a celebration
+MonthDay = Tuple[int, int]
+
+LEAP_DAY: MonthDay = (2, 29)
+
+# supported values of ZIVIJO_FEB29_FALLBACK
+FEB29_FALLBACKS: Dict[str, MonthDay] = {
+    "02-28": (2, 28),
+    "03-01": (3, 1),
+}
+
+
+def parse_feb29_fallback(value: Optional[str]) -> Optional[MonthDay]:
+    """Translate the ZIVIJO_FEB29_FALLBACK value into a (month, day) key or None if Feb 29 is skipped."""
+    if (not value):
+        return None
+
+    if (value not in FEB29_FALLBACKS):
+        supported = ", ".join(FEB29_FALLBACKS)
+        raise ValueError(f"Unsupported Feb 29 fallback {value}. Use one of {supported} or leave empty.")
+
+    return FEB29_FALLBACKS[value]
+
+
+def month_day_keys(date: datetime.date, feb29_fallback: Optional[MonthDay] = None) -> Tuple[MonthDay, ...]:
+    """Return the (month, day) keys that are celebrated on the given date."""
+    key = (date.month, date.day)
+
+    # in non-leap years the Feb 29 people are celebrated on the fallback day
+    if ((feb29_fallback is not None) and (key == feb29_fallback) and (not calendar.isleap(date.year))):
+        return (key, LEAP_DAY)
+
+    return (key,)
+
+
+class Celebrants(NamedTuple):
+    """People celebrating on a date and the number of rows looked at."""
+
+    birthdays: List[str]
+    namedays: List[str]
+    rows: int
+
+
+def filter_celebrants(rows: Iterable[Dict], date: datetime.date,
+                      feb29_fallback: Optional[str] = None) -> Celebrants:
+    """Pick the people celebrating on the given date in a single streaming pass, keeping nothing else."""
+    if (feb29_fallback is None):
+        feb29_fallback = get_config().feb29_fallback
+
+    keys = month_day_keys(date, parse_feb29_fallback(feb29_fallback))
+    birthday_people_ids: List[str] = []
+    nameday_people_ids: List[str] = []
+    count = 0
+
+    for row in rows:
+        count += 1
+
+        birth_date = row.get("birth_date")
+        if (birth_date and ((birth_date.month, birth_date.day) in keys)):
+            birthday_people_ids.append(row["user_id"])
+
+        name_date = row.get("name_date")
+        if (name_date and ((name_date.month, name_date.day) in keys)):
+            nameday_people_ids.append(row["user_id"])
+
+    return Celebrants(birthday_people_ids, nameday_people_ids, count)
+
+
+@functools.lru_cache(maxsize=None)
+def parse_team_channels(value: Optional[str]) -> Dict[str, str]:
+    """Translate the ZIVIJO_TEAM_CHANNELS value (team=channel pairs, comma separated) into a map."""
+    team_channels: Dict[str, str] = {}
+
+    for pair in filter(None, (pair.strip() for pair in (value or "").split(","))):
+        team, separator, channel = pair.partition("=")
+        if ((not separator) or (not team.strip()) or (not channel.strip())):
+            raise ValueError(f"Invalid team channel {pair}. Use team=channel pairs, i.e. backend=backend-team.")
+
+        team_channels[team.strip()] = channel.strip()
+
+    return team_channels
+
+
+def route_celebrants(rows: Iterable[Dict], date: datetime.date,
+                     feb29_fallback: Optional[str] = None,
+                     team_channels: Optional[str] = None) -> Dict[Optional[str], Celebrants]:
+    """Pick the people celebrating on the date, grouped by the channel of their row, in a single streaming pass.
+
+    The channel comes from the channel column, else from the team column mapped by team_channels
+    (ZIVIJO_TEAM_CHANNELS), else it is None, the default channel. The channels come in the order first seen.
+    """
+    config = get_config()
+    if (feb29_fallback is None):
+        feb29_fallback = config.feb29_fallback
+    if (team_channels is None):
+        team_channels = config.team_channels
+
+    keys = month_day_keys(date, parse_feb29_fallback(feb29_fallback))
+    channel_of_team = parse_team_channels(team_channels)
+    birthday_people_ids: Dict[Optional[str], List[str]] = {}
+    nameday_people_ids: Dict[Optional[str], List[str]] = {}
+    counts: Dict[Optional[str], int] = {}
+
+    for row in rows:
+        channel = row.get("channel") or channel_of_team.get(row.get("team") or "")
+        counts[channel] = counts.get(channel, 0) + 1
+
+        birth_date = row.get("birth_date")
+        if (birth_date and ((birth_date.month, birth_date.day) in keys)):
+            birthday_people_ids.setdefault(channel, []).append(row["user_id"])
+
+        name_date = row.get("name_date")
+        if (name_date and ((name_date.month, name_date.day) in keys)):
+            nameday_people_ids.setdefault(channel, []).append(row["user_id"])
+
+    return {
+        channel: Celebrants(birthday_people_ids.get(channel, []), nameday_people_ids.get(channel, []), count)
+        for channel, count in counts.items()
+    }
+
+
+class CelebrationIndex:
+    """Birthdays and namedays bucketed by (month, day) for O(1) lookups of any date."""
+
+    def __init__(self, feb29_fallback: Optional[str] = None) -> None:
+        if (feb29_fallback is None):
+            feb29_fallback = get_config().feb29_fallback
+
+        self.feb29_fallback = parse_feb29_fallback(feb29_fallback)
+        self.birthdays: Dict[MonthDay, List[str]] = {}
+        self.namedays: Dict[MonthDay, List[str]] = {}
+        self.size = 0
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict],
+                  feb29_fallback: Optional[str] = None) -> "CelebrationIndex":
+        """Build the index from rows returned by read_and_parse_csv."""
+        index = cls(feb29_fallback)
+
+        for row in rows:
+            index.add(row)
+
+        return index
+
+    @classmethod
+    def from_dict(cls, data: Dict, feb29_fallback: Optional[str] = None) -> "CelebrationIndex":
+        """Restore the index saved by to_dict."""
+        index = cls(feb29_fallback)
+        index.birthdays = {(month, day): ids for month, day, ids in data["birthdays"]}
+        index.namedays = {(month, day): ids for month, day, ids in data["namedays"]}
+        index.size = data["size"]
+
+        return index
+
+    def to_dict(self) -> Dict:
+        """The buckets as JSON friendly lists."""
+        return {
+            "birthdays": [[month, day, ids] for (month, day), ids in self.birthdays.items()],
+            "namedays": [[month, day, ids] for (month, day), ids in self.namedays.items()],
+            "size": self.size,
+        }
+
+    def copy(self) -> "CelebrationIndex":
+        """A copy whose buckets can be added to without changing this index."""
+        index = CelebrationIndex.__new__(CelebrationIndex)
+        index.feb29_fallback = self.feb29_fallback
+        index.birthdays = {key: list(ids) for key, ids in self.birthdays.items()}
+        index.namedays = {key: list(ids) for key, ids in self.namedays.items()}
+        index.size = self.size
+
+        return index
+
+    def add(self, row: Dict) -> None:
+        """Add one parsed row to the buckets."""
+        birth_date = row.get("birth_date")
+        if (birth_date):
+            self.birthdays.setdefault((birth_date.month, birth_date.day), []).append(row["user_id"])
+
+        name_date = row.get("name_date")
+        if (name_date):
+            self.namedays.setdefault((name_date.month, name_date.day), []).append(row["user_id"])
+
+        self.size += 1
+
+    def lookup(self, date: datetime.date) -> Tuple[List[str], List[str]]:
+        """Return the ids of the people celebrating birthday and nameday on the given date."""
+        birthday_people_ids: List[str] = []
+        nameday_people_ids: List[str] = []
+
+        for key in month_day_keys(date, self.feb29_fallback):
+            birthday_people_ids.extend(self.birthdays.get(key, ()))
+            nameday_people_ids.extend(self.namedays.get(key, ()))
+
+        return birthday_people_ids, nameday_people_ids
+
+    def today(self) -> Tuple[List[str], List[str]]:
+        """Return the ids of the people celebrating today."""
+        return self.lookup(datetime.date.today())
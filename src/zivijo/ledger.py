@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""Ledger of the posts sent, so reruns and overlapping runs never post the same greetings twice."""
+
+import contextlib
+import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Iterator, List, Optional, Set, Tuple
+
+from env import get_config
+
+# what a line of the ledger records: (kind, date, channel, celebrants hash) of a post, the kind being "post" for the
+# greetings of the date and "digest" for the digest starting on it, or ("run", date, roster signature)
+Entry = Tuple[str, ...]
+
+
+def celebrants_hash(birthday_people_ids: List[str], nameday_people_ids: List[str]) -> str:
+    """Hash of who celebrates what, the order of the roster does not matter."""
+    sha256 = hashlib.sha256()
+
+    for people_ids in (birthday_people_ids, nameday_people_ids):
+        sha256.update("\n".join(sorted(people_ids)).encode())
+        sha256.update(b"\0")
+
+    return sha256.hexdigest()
+
+
+def roster_signature(csv_path: Optional[str]) -> Optional[str]:
+    """The path, size and mtime of the roster, None if it is not a local file."""
+    if (csv_path is None):
+        return None
+
+    try:
+        stat = os.stat(csv_path)
+    except OSError:
+        return None
+
+    return f"{csv_path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class Ledger:
+    """Append-only file of the posts sent and the runs completed, one JSON array per line."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.entries: Set[Entry] = set()
+        # the channels are posted from several threads
+        self.mutex = threading.Lock()
+        # the thread holding the lock file, it may take it again
+        self.owner: Optional[int] = None
+        self.load()
+
+    def load(self) -> None:
+        """Read the entries written so far, by this process or another one."""
+        if (not os.path.exists(self.path)):
+            return
+
+        with open(self.path) as ledger_file:
+            for number, line in enumerate(ledger_file, start=1):
+                try:
+                    self.entries.add(tuple(json.loads(line)))
+                except ValueError:
+                    # a line torn by a crash, the post it stands for is repeated at worst
+                    logging.warning(f"Ignoring line {number} of the ledger {self.path}")
+
+    def record(self, *entry: str) -> None:
+        """Append the entry, on disk before it counts."""
+        with self.mutex:
+            with open(self.path, "a") as ledger_file:
+                ledger_file.write(json.dumps(entry) + "\n")
+                ledger_file.flush()
+                os.fsync(ledger_file.fileno())
+
+            self.entries.add(entry)
+
+    def posted(self, date: datetime.date, channel: str, birthday_people_ids: List[str],
+               nameday_people_ids: List[str], kind: str = "post") -> bool:
+        """Were these celebrants already posted to the channel for the date?"""
+        entry = (kind, date.isoformat(), channel, celebrants_hash(birthday_people_ids, nameday_people_ids))
+        return entry in self.entries
+
+    def record_post(self, date: datetime.date, channel: str, birthday_people_ids: List[str],
+                    nameday_people_ids: List[str], kind: str = "post") -> None:
+        """Remember that the celebrants were posted to the channel for the date."""
+        self.record(kind, date.isoformat(), channel, celebrants_hash(birthday_people_ids, nameday_people_ids))
+
+    def completed(self, date: datetime.date, signature: Optional[str]) -> bool:
+        """Was the run of the date completed with this very roster?"""
+        return (signature is not None) and (("run", date.isoformat(), signature) in self.entries)
+
+    def record_run(self, date: datetime.date, signature: Optional[str]) -> None:
+        """Remember that the run of the date was completed with the roster, unless it has no signature."""
+        if (signature is not None):
+            self.record("run", date.isoformat(), signature)
+
+    @contextlib.contextmanager
+    def locked(self) -> Iterator["Ledger"]:
+        """Hold the lock file for the whole run, a concurrent run waits and then finds what this one posted.
+
+        A run nested in one holding the lock (i.e. today's run of the catch-up) goes on under the same lock.
+        """
+        # lazy import, fcntl is not needed unless the ledger is configured
+        import fcntl
+
+        if (self.owner == threading.get_ident()):
+            yield self
+            return
+
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            self.owner = threading.get_ident()
+            try:
+                self.entries.clear()
+                self.load()
+                yield self
+            finally:
+                self.owner = None
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+_ledger: Optional[Ledger] = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger() -> Optional[Ledger]:
+    """Ledger at ZIVIJO_LEDGER_PATH, shared by the whole process, None if not configured."""
+    global _ledger
+
+    ledger_path = get_config().ledger_path
+    if (not ledger_path):
+        return None
+
+    with _ledger_lock:
+        if ((_ledger is None) or (_ledger.path != ledger_path)):
+            _ledger = Ledger(ledger_path)
+
+        return _ledger
+
+
+@contextlib.contextmanager
+def ledger_locked() -> Iterator[Optional[Ledger]]:
+    """The ledger at ZIVIJO_LEDGER_PATH locked for the whole run, None (and no lock) if not configured."""
+    ledger = get_ledger()
+    if (ledger is None):
+        yield None
+        return
+
+    with ledger.locked():
+        yield ledger
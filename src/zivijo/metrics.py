@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""Per-phase timings and counters of a run, exported as a JSON report and/or a Prometheus textfile."""
+
+import contextlib
+import datetime
+import json
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, Optional, Tuple, TypeVar
+
+from env import Config, get_config
+
+if TYPE_CHECKING:
+    from profiling import PhaseProfiler
+
+T = TypeVar("T")
+
+# sorted (name, value) pairs of the labels of a counter
+Labels = Tuple[Tuple[str, str], ...]
+
+PROMETHEUS_PREFIX = "zivijo_"
+
+
+class RunMetrics:
+    """Monotonic phase timers and labelled counters of one run. Safe to update from several threads."""
+
+    def __init__(self) -> None:
+        self.started = time.time()
+        self.phases: Dict[str, float] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.lock = threading.Lock()
+
+    def count(self, name: str, value: float = 1, **labels: str) -> None:
+        """Add the value to the counter with the given labels."""
+        key = (name, tuple(sorted(labels.items())))
+
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        """Set the counter with the given labels to the value."""
+        key = (name, tuple(sorted(labels.items())))
+
+        with self.lock:
+            self.counters[key] = value
+
+    def get(self, name: str, **labels: str) -> float:
+        """Current value of the counter, 0 if never counted."""
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def add_phase_time(self, name: str, seconds: float) -> None:
+        """Add the seconds to the phase timer."""
+        with self.lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def phase(self, name: str, exclude: Optional[str] = None) -> Iterator[None]:
+        """Time the block as the given phase, minus the time the excluded phase accrued meanwhile."""
+        excluded_before = self.phases.get(exclude, 0.0) if exclude else 0.0
+        profiler = _profiler
+        if (profiler is not None):
+            profiler.enter(name)
+        start = time.monotonic()
+
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            if (exclude):
+                elapsed -= self.phases.get(exclude, 0.0) - excluded_before
+            self.add_phase_time(name, elapsed)
+
+            if (profiler is not None):
+                profiler.exit()
+
+    def timed(self, items: Iterable[T], phase: str) -> Iterator[T]:
+        """Pass the items through, accounting the time spent producing them to the phase."""
+        # profiled item by item only when profiling, the loop below stays as it is otherwise
+        iterator = iter(items) if (_profiler is None) else _profiler.profiled(items, phase)
+        clock = time.monotonic
+        spent = 0.0
+
+        try:
+            while True:
+                start = clock()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    spent += clock() - start
+                    return
+                spent += clock() - start
+                yield item
+        finally:
+            self.add_phase_time(phase, spent)
+
+    def as_dict(self) -> Dict:
+        """The report as a JSON serializable dictionary."""
+        return {
+            "started": datetime.datetime.fromtimestamp(self.started, datetime.timezone.utc).isoformat(),
+            "phases": dict(self.phases),
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ],
+        }
+
+    def to_prometheus(self) -> str:
+        """The report in the Prometheus text exposition format."""
+        lines = [
+            f"# TYPE {PROMETHEUS_PREFIX}run_started_timestamp_seconds gauge",
+            f"{PROMETHEUS_PREFIX}run_started_timestamp_seconds {self.started}",
+            f"# TYPE {PROMETHEUS_PREFIX}phase_seconds gauge",
+        ]
+        lines.extend(
+            f'{PROMETHEUS_PREFIX}phase_seconds{{phase="{name}"}} {seconds}'
+            for name, seconds in sorted(self.phases.items())
+        )
+
+        typed = set()
+        for (name, labels), value in sorted(self.counters.items()):
+            if (name not in typed):
+                lines.append(f"# TYPE {PROMETHEUS_PREFIX}{name} gauge")
+                typed.add(name)
+
+            label_text = ",".join(f'{label}="{label_value}"' for label, label_value in labels)
+            lines.append(f"{PROMETHEUS_PREFIX}{name}{{{label_text}}} {value}" if label_text else
+                         f"{PROMETHEUS_PREFIX}{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def write_atomically(path: str, content: str) -> None:
+    """Write the file through a temporary one, so readers (i.e. node_exporter) never see it half written."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+
+    with open(tmp_path, "w") as tmp_file:
+        tmp_file.write(content)
+
+    os.replace(tmp_path, path)
+
+
+_metrics = RunMetrics()
+
+# profiler of the phases, only set when profiling (see profiling.py)
+_profiler: Optional["PhaseProfiler"] = None
+
+
+def get_metrics() -> RunMetrics:
+    """Metrics of the current run."""
+    return _metrics
+
+
+def get_profiler() -> Optional["PhaseProfiler"]:
+    """Profiler of the phases, None unless profiling."""
+    return _profiler
+
+
+def set_profiler(profiler: Optional["PhaseProfiler"]) -> None:
+    """Profile the phases with the profiler from now on, or stop with None."""
+    global _profiler
+    _profiler = profiler
+
+
+def reset_metrics() -> RunMetrics:
+    """Start collecting the metrics of a new run."""
+    global _metrics
+    _metrics = RunMetrics()
+    return _metrics
+
+
+def export_metrics(config: Optional[Config] = None) -> None:
+    """Write the metrics of the current run to the configured JSON report and/or Prometheus textfile."""
+    config = config or get_config()
+
+    if (config.report_json_path):
+        write_atomically(config.report_json_path, json.dumps(_metrics.as_dict(), indent=2))
+
+    if (config.prometheus_textfile_path):
+        write_atomically(config.prometheus_textfile_path, _metrics.to_prometheus())
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""Parsing very large rosters in parallel processes, one newline aligned byte range each.
+
+The rows must not contain quoted line breaks (the roster format never needs them), otherwise a range could
+start in the middle of a row. A compressed roster cannot be split and is parsed in the main process.
+"""
+
+import concurrent.futures
+import csv
+import datetime
+import functools
+import locale
+import logging
+import os
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from compression import file_compression
+from digest import DayCelebrants, group_celebrants
+from env import get_config
+from index import Celebrants, route_celebrants
+from metrics import get_metrics, reset_metrics
+from validation import ValidationReport
+from webhook import iter_parsed_csv, iter_parsed_lines, log_validation
+
+T = TypeVar("T")
+
+# (start, end) byte offsets of a part of the file
+ByteRange = Tuple[int, int]
+
+
+def split_ranges(csv_path: str, parts: int) -> Tuple[List[str], List[ByteRange]]:
+    """Read the header and split the rest of the file into at most parts byte ranges, each ending with a newline."""
+
+    with open(csv_path, "rb") as csvfile:
+        header = csvfile.readline()
+        start = csvfile.tell()
+        size = os.fstat(csvfile.fileno()).st_size
+
+        ranges: List[ByteRange] = []
+        step = max((size - start) // max(parts, 1), 1)
+
+        while (start < size):
+            # move the boundary to the end of the line it falls into
+            csvfile.seek(min(start + step, size))
+            if (csvfile.tell() < size):
+                csvfile.readline()
+            end = csvfile.tell()
+
+            ranges.append((start, end))
+            start = end
+
+    fieldnames = next(csv.reader([header.decode(locale.getpreferredencoding(False))]), [])
+
+    return fieldnames, ranges
+
+
+def iter_range_lines(csv_path: str, byte_range: ByteRange) -> Iterator[str]:
+    """Yield the decoded lines of the byte range, the same way open() would decode them."""
+    start, end = byte_range
+    encoding = locale.getpreferredencoding(False)
+
+    with open(csv_path, "rb") as csvfile:
+        csvfile.seek(start)
+        position = start
+
+        while (position < end):
+            line = csvfile.readline()
+            if (not line):
+                break
+
+            position += len(line)
+            yield line.decode(encoding)
+
+
+class _RecordCollector(logging.Handler):
+    """Keeps the log records of a worker, so the parent can emit them in the order of the serial path."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.records: List[logging.LogRecord] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # make the record picklable, the message is all that is needed
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        self.records.append(record)
+
+
+def parse_range(csv_path: str, fieldnames: List[str], byte_range: ByteRange, match: Callable[[Iterator[Dict]], T],
+                level: int = logging.NOTSET) -> Tuple[T, ValidationReport, List[logging.LogRecord], Dict]:
+    """Parse one byte range in a worker and match its rows, match being a picklable function of the parsed rows.
+
+    Returns the matches, the problems (lines counted from the start of the range), the log records at the level of
+    the parent or above and the counters.
+    """
+
+    root = logging.getLogger()
+    collector = _RecordCollector()
+    handlers, level = root.handlers, root.level
+    root.handlers = [collector]
+    # the records the parent would drop are not even created, let alone sent back
+    root.setLevel(level)
+    reset_metrics()
+    report = ValidationReport()
+
+    try:
+        matches = match(iter_parsed_lines(iter_range_lines(csv_path, byte_range), fieldnames, report))
+    finally:
+        root.handlers = handlers
+        root.setLevel(level)
+
+    return matches, report, collector.records, get_metrics().counters
+
+
+def parallel_parse(csv_path: str, workers: int, match: Callable[[Iterator[Dict]], T]) -> List[T]:
+    """Parse the byte ranges of the csv in a pool of worker processes, the matches of each range in the file order.
+
+    The log records, the problems and the counters of the workers are emitted and merged as in the serial path.
+    """
+    fieldnames, ranges = split_ranges(csv_path, workers)
+    metrics = get_metrics()
+    # the problems of the ranges, their lines numbered after the header
+    report = ValidationReport()
+    report.lines = 1
+    results: List[T] = []
+    level = logging.getLogger().getEffectiveLevel()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures: List[concurrent.futures.Future[Tuple[T, ValidationReport, List[logging.LogRecord], Dict]]] = [
+            executor.submit(parse_range, csv_path, fieldnames, byte_range, match, level) for byte_range in ranges
+        ]
+
+        # the ranges are merged in the file order, so the ids, the logs and the problems come out as in the serial path
+        for future in futures:
+            matches, range_report, records, counters = future.result()
+            results.append(matches)
+            report.merge(range_report, report.lines)
+
+            for record in records:
+                logger = logging.getLogger(record.name)
+                if (logger.isEnabledFor(record.levelno)):
+                    logger.handle(record)
+
+            for (name, labels), value in counters.items():
+                metrics.count(name, value, **dict(labels))
+
+    log_validation(report, csv_path)
+
+    return results
+
+
+def parallel_filter_celebrants(csv_path: str, date: datetime.date, workers: int,
+                               feb29_fallback: Optional[str] = None) -> Celebrants:
+    """Same as filter_celebrants(iter_parsed_csv(csv_path), date), split over a pool of worker processes."""
+    channels = parallel_route_celebrants(csv_path, date, workers, feb29_fallback)
+
+    return Celebrants(
+        [people_id for celebrants in channels.values() for people_id in celebrants.birthdays],
+        [people_id for celebrants in channels.values() for people_id in celebrants.namedays],
+        sum(celebrants.rows for celebrants in channels.values()),
+    )
+
+
+def parallel_route_celebrants(csv_path: str, date: datetime.date, workers: int,
+                              feb29_fallback: Optional[str] = None,
+                              team_channels: Optional[str] = None) -> Dict[Optional[str], Celebrants]:
+    """Same as route_celebrants(iter_parsed_csv(csv_path), date), split over a pool of worker processes."""
+    config = get_config()
+    if (feb29_fallback is None):
+        feb29_fallback = config.feb29_fallback
+    if (team_channels is None):
+        team_channels = config.team_channels
+
+    match = functools.partial(route_celebrants, date=date, feb29_fallback=feb29_fallback, team_channels=team_channels)
+
+    if (file_compression(csv_path) is not None):
+        logging.info(f"{csv_path} is compressed and cannot be split, parsing it in the main process")
+        return match(iter_parsed_csv(csv_path))
+
+    birthday_people_ids: Dict[Optional[str], List[str]] = {}
+    nameday_people_ids: Dict[Optional[str], List[str]] = {}
+    counts: Dict[Optional[str], int] = {}
+
+    for channels in parallel_parse(csv_path, workers, match):
+        # the channels in the order first seen, as in the serial path
+        for channel, celebrants in channels.items():
+            birthday_people_ids.setdefault(channel, []).extend(celebrants.birthdays)
+            nameday_people_ids.setdefault(channel, []).extend(celebrants.namedays)
+            counts[channel] = counts.get(channel, 0) + celebrants.rows
+
+    return {
+        channel: Celebrants(birthday_people_ids[channel], nameday_people_ids[channel], count)
+        for channel, count in counts.items()
+    }
+
+
+def count_and_group(rows: Iterable[Dict], start: datetime.date, days: int,
+                    feb29_fallback: Optional[str] = None) -> Tuple[Dict[datetime.date, DayCelebrants], int]:
+    """group_celebrants and the number of rows grouped."""
+    count = 0
+
+    def counted() -> Iterator[Dict]:
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    return group_celebrants(counted(), start, days, feb29_fallback), count
+
+
+def parallel_group_celebrants(csv_path: str, start: datetime.date, days: int, workers: int,
+                              feb29_fallback: Optional[str] = None) -> Tuple[Dict[datetime.date, DayCelebrants], int]:
+    """Same as group_celebrants(iter_parsed_csv(csv_path), start, days) and the number of rows, split over a pool of
+    worker processes."""
+    if (feb29_fallback is None):
+        feb29_fallback = get_config().feb29_fallback
+
+    match = functools.partial(count_and_group, start=start, days=days, feb29_fallback=feb29_fallback)
+
+    if (file_compression(csv_path) is not None):
+        logging.info(f"{csv_path} is compressed and cannot be split, parsing it in the main process")
+        return match(iter_parsed_csv(csv_path))
+
+    grouped: Dict[datetime.date, DayCelebrants] = {}
+    rows = 0
+
+    for range_grouped, range_rows in parallel_parse(csv_path, workers, match):
+        for date, celebrants in range_grouped.items():
+            grouped.setdefault(date, DayCelebrants([], []))
+            grouped[date].birthdays.extend(celebrants.birthdays)
+            grouped[date].namedays.extend(celebrants.namedays)
+        rows += range_rows
+
+    # the days in the window order, as in the serial path
+    return dict(sorted(grouped.items())), rows
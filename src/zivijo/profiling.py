@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""Profiling of the phases of a run (parse, filter, compose, post) with cProfile and/or tracemalloc.
+
+Imported only when ZIVIJO_PROFILE_PATH or --profile is set. Until then the phases of the run metrics find no
+profiler and nothing is measured beyond their timings.
+"""
+
+import cProfile
+import datetime
+import io
+import pstats
+import threading
+import tracemalloc
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from env import get_config
+from metrics import get_profiler, set_profiler, write_atomically
+
+T = TypeVar("T")
+
+PROFILE_MODES = ("cpu", "memory", "all")
+
+# how many functions and allocation sites are listed per phase
+PROFILE_TOP = 25
+
+# the order of the functions listed per phase
+PROFILE_SORT = "cumulative"
+
+# the allocations of the profiling itself, left out of the report
+PROFILER_FILES = {tracemalloc.__file__, __file__}
+
+# how many frames tracemalloc keeps per allocation, deep enough to find the items being parsed under the csv module
+PROFILE_FRAMES = 32
+
+
+class PhaseProfiler:
+    """cProfile and/or tracemalloc of each phase, written as one text report.
+
+    The CPU profile is kept per phase and thread. The allocations are counted in the first thread to enter a
+    phase only, as tracemalloc sees the whole process; a phase nested in another one is counted apart from it.
+    The items profiled as a phase (the streamed rows) are produced item by item while the phase around them runs,
+    what is allocated under the code producing them is counted in their phase.
+    """
+
+    def __init__(self, path: str, mode: str = "cpu", top: int = PROFILE_TOP) -> None:
+        if (mode not in PROFILE_MODES):
+            raise ValueError(f"Invalid profile mode {mode}. Expected one of {', '.join(PROFILE_MODES)}.")
+
+        self.path = path
+        self.cpu = mode in ("cpu", "all")
+        self.memory = mode in ("memory", "all")
+        self.top = top
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # bumped when the report is written, so the threads start new profiles
+        self.generation = 0
+        self.profiles: List[Tuple[str, cProfile.Profile]] = []
+        # the thread counting the allocations and the snapshot its current phase started from
+        self.memory_thread: Optional[int] = None
+        self.memory_start: Optional[tracemalloc.Snapshot] = None
+        self.memory_current = 0
+        # size and count of the allocations by site, and the peak above the start, per phase
+        self.allocations: Dict[str, Dict[str, List[int]]] = {}
+        self.peaks: Dict[str, int] = {}
+        # the phase of the generators profiled item by item, by the file and the lines of their code
+        self.producers: Dict[Tuple[str, int, int], str] = {}
+
+    def stack(self) -> List[str]:
+        """The phases the current thread is in, innermost last."""
+        if (getattr(self.local, "generation", None) != self.generation):
+            self.local.generation = self.generation
+            self.local.stack = []
+            self.local.profiles = {}
+
+        return self.local.stack
+
+    def profile(self, name: str) -> cProfile.Profile:
+        """The CPU profile of the phase in the current thread."""
+        profiles = self.local.profiles
+
+        if (name not in profiles):
+            profiles[name] = cProfile.Profile()
+            with self.lock:
+                self.profiles.append((name, profiles[name]))
+
+        return profiles[name]
+
+    def enable(self, name: str) -> None:
+        try:
+            self.profile(name).enable()
+        except ValueError:
+            # Python 3.12+ profiles one thread at a time, the phase goes unprofiled in this one
+            pass
+
+    def enter(self, name: str, memory: bool = True) -> None:
+        """Start profiling the phase, pausing the one it is nested in."""
+        stack = self.stack()
+
+        if (self.cpu and stack):
+            self.profile(stack[-1]).disable()
+
+        # the snapshots are taken outside of the CPU profiles
+        if (memory and self.memory and self.owns_memory(stack)):
+            if (stack):
+                self.count_allocations(stack[-1])
+            self.start_allocations()
+
+        stack.append(name)
+
+        if (self.cpu):
+            self.enable(name)
+
+    def exit(self, memory: bool = True) -> None:
+        """Stop profiling the innermost phase and resume the one it is nested in."""
+        stack = self.stack()
+        if (not stack):
+            # the report was written in the middle of the phase
+            return
+
+        name = stack.pop()
+
+        if (self.cpu):
+            self.profile(name).disable()
+
+        if (memory and self.memory and (self.memory_thread == threading.get_ident())):
+            self.count_allocations(name)
+            if (stack):
+                self.start_allocations()
+            else:
+                self.memory_thread = None
+
+        if (self.cpu and stack):
+            self.enable(stack[-1])
+
+    def profiled(self, items: Iterable[T], name: str) -> Iterator[T]:
+        """Pass the items through, profiling the CPU time spent producing them as the phase.
+
+        A snapshot per item would be too slow, the allocations are told apart from the ones of the phase around
+        them when it is counted, see attribute().
+        """
+        iterator = iter(items)
+
+        code = getattr(iterator, "gi_code", None)
+        if (self.memory and (code is not None)):
+            lines = [line for _, _, line in code.co_lines() if (line is not None)] + [code.co_firstlineno]
+            with self.lock:
+                self.producers[(code.co_filename, min(lines), max(lines))] = name
+
+        while True:
+            self.enter(name, memory=False)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.exit(memory=False)
+
+            yield item
+
+    def owns_memory(self, stack: List[str]) -> bool:
+        """Is the current thread the one counting the allocations? Taken by the first thread to enter a phase."""
+        with self.lock:
+            if ((self.memory_thread is None) and (not stack)):
+                self.memory_thread = threading.get_ident()
+
+        return self.memory_thread == threading.get_ident()
+
+    def start_allocations(self) -> None:
+        self.memory_start = tracemalloc.take_snapshot()
+        self.memory_current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+    def attribute(self, name: str, traceback: tracemalloc.Traceback) -> str:
+        """The phase of an allocation made while the phase ran: the one of the innermost generator profiled item by
+        item the allocation was made under, the phase itself otherwise."""
+        with self.lock:
+            producers = list(self.producers.items())
+
+        # the frames go from the oldest to the allocating one
+        for frame in reversed(traceback):
+            for (filename, first, last), producer in producers:
+                if ((frame.filename == filename) and (first <= frame.lineno <= last)):
+                    return producer
+
+        return name
+
+    def count_allocations(self, name: str) -> None:
+        """Add the allocations since the phase started, or was last resumed, to the phase."""
+        if (self.memory_start is None):
+            return
+
+        peak = tracemalloc.get_traced_memory()[1] - self.memory_current
+        self.peaks[name] = max(self.peaks.get(name, 0), peak)
+
+        for diff in tracemalloc.take_snapshot().compare_to(self.memory_start, "traceback"):
+            # the line allocating, whatever the stack above it, is the site
+            frame = diff.traceback[-1]
+            # the snapshots themselves are not what the phase allocated
+            if ((diff.size_diff or diff.count_diff) and (frame.filename not in PROFILER_FILES)):
+                sites = self.allocations.setdefault(self.attribute(name, diff.traceback), {})
+                site = sites.setdefault(str(frame), [0, 0])
+                site[0] += diff.size_diff
+                site[1] += diff.count_diff
+
+    def format_report(self) -> str:
+        """The functions taking the most time and the sites allocating the most memory, phase by phase."""
+        lines = [f"Profile of the phases, written {datetime.datetime.now().isoformat(timespec='seconds')}"]
+
+        with self.lock:
+            profiles = list(self.profiles)
+
+        by_phase: Dict[str, List[cProfile.Profile]] = {}
+        for name, profile in profiles:
+            profile.create_stats()
+            if (profile.stats):
+                by_phase.setdefault(name, []).append(profile)
+
+        for name, phase_profiles in by_phase.items():
+            stream = io.StringIO()
+            stats = pstats.Stats(*phase_profiles, stream=stream)
+            stats.sort_stats(PROFILE_SORT).print_stats(self.top)
+            lines.extend(["", f"=== {name}: cpu ===", stream.getvalue().strip()])
+
+        for name, sites in self.allocations.items():
+            # the items produced within another phase have no peak of their own
+            peak = f"peak {self.peaks[name] / 1024:,.1f} KiB" if (name in self.peaks) else "peak in the phase around"
+            lines.extend(["", f"=== {name}: memory, {peak} ==="])
+            lines.append(f"{'KiB':>12} {'blocks':>10}  site")
+
+            top_sites = sorted(sites.items(), key=lambda site: abs(site[1][0]), reverse=True)[:self.top]
+            lines.extend(f"{size / 1024:+12,.1f} {count:+10,}  {site}" for site, (size, count) in top_sites)
+
+        return "\n".join(lines) + "\n"
+
+    def has_data(self) -> bool:
+        return bool(self.profiles or self.allocations)
+
+    def write(self) -> None:
+        """Write the report of the phases profiled since the last one and start over. Nothing to report, no file."""
+        if (not self.has_data()):
+            return
+
+        write_atomically(self.path, self.format_report())
+
+        with self.lock:
+            self.generation += 1
+            self.profiles = []
+            self.allocations = {}
+            self.peaks = {}
+
+
+def start_profiling(path: Optional[str] = None, mode: Optional[str] = None) -> Optional[PhaseProfiler]:
+    """Profile the phases from now on into the file, ZIVIJO_PROFILE_PATH unless given. None if not configured."""
+    config = get_config()
+    path = path or config.profile_path
+    if (not path):
+        return None
+
+    profiler = PhaseProfiler(path, mode or config.profile_mode)
+    if (profiler.memory):
+        tracemalloc.start(PROFILE_FRAMES)
+
+    set_profiler(profiler)
+    return profiler
+
+
+def stop_profiling() -> None:
+    """Write the report of the phases still unreported and stop profiling."""
+    profiler = get_profiler()
+    if (profiler is None):
+        return
+
+    set_profiler(None)
+    profiler.write()
+
+    if (profiler.memory):
+        tracemalloc.stop()
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""Rosters published over HTTP: streamed into the parser, cached locally and revalidated with conditional requests."""
+
+import contextlib
+import io
+import json
+import locale
+import logging
+import os
+import urllib.parse
+from typing import TYPE_CHECKING, BinaryIO, Dict, Iterator, Optional
+
+from compression import decompressed_text, decompressing
+from index import CelebrationIndex
+from metrics import write_atomically
+from validation import ValidationReport
+from webhook import create_session, iter_parsed_lines
+
+if TYPE_CHECKING:
+    # the type of the buffers readinto() fills, there from Python 3.12 on
+    from collections.abc import Buffer
+
+    # requests is imported only when a roster is downloaded
+    import requests
+
+# version of the cache file, a cache of another version is ignored
+CACHE_VERSION = 1
+
+# seconds to wait for the server to connect and for each part of the body
+TIMEOUT_SECONDS = 30
+
+
+class _TeeReader(io.RawIOBase):
+    """Passes the bytes of the response through, copying them into the cached body on the way."""
+
+    def __init__(self, raw: io.RawIOBase, copy: Optional[BinaryIO] = None) -> None:
+        super().__init__()
+        self.raw = raw
+        self.copy = copy
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: "Buffer") -> int:
+        size = self.raw.readinto(buffer) or 0
+        if (self.copy is not None):
+            self.copy.write(memoryview(buffer)[:size])
+        return size
+
+
+class RemoteRoster:
+    """The roster at the URL, its body kept in cache_path and its validators and parsed roster in cache_path.json.
+
+    Without cache_path every refresh downloads and parses the whole roster.
+    """
+
+    def __init__(self, url: str, cache_path: Optional[str] = None, feb29_fallback: Optional[str] = None,
+                 session: Optional["requests.Session"] = None) -> None:
+        self.url = url
+        self.cache_path = cache_path
+        self.feb29_fallback = feb29_fallback
+        self.session = session
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.encoding: Optional[str] = None
+        self.index: Optional[CelebrationIndex] = None
+
+        if (cache_path and os.path.exists(cache_path) and os.path.exists(self.meta_path)):
+            self.load()
+
+    @property
+    def meta_path(self) -> str:
+        return f"{self.cache_path}.json"
+
+    def load(self) -> None:
+        """Read the validators and the parsed roster of the cached body, a broken or outdated cache is ignored."""
+        try:
+            with open(self.meta_path) as meta_file:
+                meta = json.load(meta_file)
+
+            if (meta.get("version") != CACHE_VERSION):
+                raise ValueError(f"unsupported version {meta.get('version')}")
+            if (meta["url"] != self.url):
+                raise ValueError(f"cached from {meta['url']}")
+
+            self.etag = meta["etag"]
+            self.last_modified = meta["last_modified"]
+            self.encoding = meta["encoding"]
+            self.index = CelebrationIndex.from_dict(meta["index"], self.feb29_fallback) if meta["index"] else None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Ignoring the cached roster {self.cache_path}: {e}")
+
+    def save(self) -> None:
+        """Write the validators and the parsed roster (if any) of the cached body."""
+        if (not self.cache_path):
+            return
+
+        write_atomically(self.meta_path, json.dumps({
+            "version": CACHE_VERSION,
+            "url": self.url,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "encoding": self.encoding,
+            "index": self.index.to_dict() if (self.index is not None) else None,
+        }))
+
+    @property
+    def path(self) -> str:
+        """The path of the URL, its extension tells the compression when the first bytes do not."""
+        return urllib.parse.urlsplit(self.url).path
+
+    @property
+    def cached(self) -> bool:
+        """Is there a cached body to revalidate?"""
+        return (self.encoding is not None) and (self.cache_path is not None) and os.path.exists(self.cache_path)
+
+    @contextlib.contextmanager
+    def opened_session(self) -> Iterator["requests.Session"]:
+        """The session given, or a session of its own closed once the roster is read."""
+        if (self.session is not None):
+            yield self.session
+            return
+
+        with create_session(1) as session:
+            yield session
+
+    def request(self, session: "requests.Session") -> Optional["requests.Response"]:
+        """Ask for the roster unless not modified since cached. Returns the streamed response, None to use the cache."""
+        import requests
+
+        headers = {}
+        if (self.cached):
+            if (self.etag):
+                headers["If-None-Match"] = self.etag
+            if (self.last_modified):
+                headers["If-Modified-Since"] = self.last_modified
+
+        try:
+            response = session.get(self.url, headers=headers, stream=True, timeout=TIMEOUT_SECONDS)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            if (not self.cached):
+                raise
+
+            # an outdated roster is better than no greetings at all
+            logging.warning(f"Failed to download {self.url} ({e}), using the cached copy {self.cache_path}")
+            return None
+
+        if (response.status_code == 304):
+            response.close()
+            logging.info(f"{self.url} not modified, using the cached copy {self.cache_path}")
+            return None
+
+        return response
+
+    def iter_response_rows(self, response: "requests.Response",
+                           report: Optional[ValidationReport] = None) -> Iterator[Dict]:
+        """Parse the body while it is downloaded, replacing the cached body once all of it is read.
+
+        A compressed body (i.e. birthdays.csv.gz) is cached as it is and decompressed on the way to the parser.
+        """
+        content_type = response.headers.get("Content-Type", "").lower()
+        # a body without a charset is read like the local files
+        encoding = response.encoding if ("charset" in content_type) else locale.getpreferredencoding(False)
+        # the transfer encodings (gzip, deflate) are undone on the way
+        response.raw.decode_content = True
+
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        copy = open(tmp_path, "wb") if (self.cache_path) else None
+        completed = False
+
+        try:
+            body = decompressing(io.BufferedReader(_TeeReader(response.raw, copy)), self.path)
+            with response, io.TextIOWrapper(body, encoding) as lines:
+                yield from iter_parsed_lines(lines, report=report, source=self.url)
+            completed = True
+        finally:
+            if (copy is not None):
+                copy.close()
+
+                # there is a copy only with a cache path
+                if (completed and self.cache_path):
+                    os.replace(tmp_path, self.cache_path)
+                else:
+                    os.remove(tmp_path)
+
+        self.etag = response.headers.get("ETag")
+        self.last_modified = response.headers.get("Last-Modified")
+        self.encoding = encoding
+        self.index = None
+        self.save()
+
+    def iter_cached_rows(self, report: Optional[ValidationReport] = None) -> Iterator[Dict]:
+        """Parse the cached body."""
+        if (self.cache_path is None):
+            raise ValueError(f"No cached body of {self.url}")
+
+        with open(self.cache_path, encoding=self.encoding) as cached:
+            with decompressed_text(cached, self.path) as lines:
+                yield from iter_parsed_lines(lines, report=report, source=self.cache_path)
+
+    def iter_rows(self, report: Optional[ValidationReport] = None) -> Iterator[Dict]:
+        """Yield the valid rows of the roster, downloaded only if it changed since cached.
+
+        The problems go to the given report, otherwise they are summarized at the end.
+        """
+        with self.opened_session() as session:
+            response = self.request(session)
+
+            if (response is None):
+                yield from self.iter_cached_rows(report)
+            else:
+                yield from self.iter_response_rows(response, report)
+
+    def refresh(self) -> CelebrationIndex:
+        """The parsed roster, downloaded and parsed again only if it changed since cached."""
+        with self.opened_session() as session:
+            response = self.request(session)
+
+            if ((response is None) and (self.index is not None)):
+                return self.index
+
+            rows = self.iter_cached_rows() if (response is None) else self.iter_response_rows(response)
+            index = CelebrationIndex.from_rows(rows, self.feb29_fallback)
+
+        self.index = index
+        self.save()
+
+        logging.info(f"Parsed {index.size} birthdays from {self.url}")
+
+        return index
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""Query service: who celebrates on a date or in a range of dates, answered over HTTP from a warm roster."""
+
+import datetime
+import http.server
+import json
+import logging
+import threading
+import urllib.parse
+from typing import Any, Dict, List, Optional, Tuple
+
+from daemon import Roster, RosterCache
+from env import get_config
+from metrics import get_metrics
+
+# longest range of dates one request may ask for
+MAX_RANGE_DAYS = 366
+
+
+def parse_listen(value: str) -> Tuple[str, int]:
+    """Parse the HOST:PORT value of ZIVIJO_SERVICE_LISTEN."""
+    host, separator, port = value.rpartition(":")
+
+    if ((not separator) or (not port.isdigit())):
+        raise ValueError(f"Invalid address {value}. Expected HOST:PORT, i.e. 127.0.0.1:8080.")
+
+    return host, int(port)
+
+
+def parse_date(params: Dict[str, List[str]], name: str) -> Optional[datetime.date]:
+    """The date of the query parameter, None if not given."""
+    values = params.get(name)
+    if (not values):
+        return None
+
+    try:
+        return datetime.date.fromisoformat(values[0])
+    except ValueError:
+        raise ValueError(f"Invalid {name} {values[0]}. Expected YYYY-MM-DD.")
+
+
+class RosterService:
+    """The roster's index kept warm in memory and swapped for a new one when the csv changes.
+
+    The requests read the current index without locking, only the watcher thread reloads it.
+    """
+
+    def __init__(self, csv_path: str, reload_seconds: float) -> None:
+        self.cache = RosterCache(csv_path)
+        self.index: Roster = self.load()
+        self.reload_seconds = reload_seconds
+        self.stopped = threading.Event()
+
+    def load(self) -> Roster:
+        """Parse the csv into a new index."""
+        with get_metrics().phase("parse"):
+            return self.cache.get()
+
+    def reload(self) -> bool:
+        """Parse the csv again if it has changed. Returns whether it did."""
+        if (not self.cache.is_stale()):
+            return False
+
+        self.index = self.load()
+        return True
+
+    def watch(self) -> None:
+        """Keep reloading the csv when it changes until stopped. A failed reload keeps the index in use."""
+        while (not self.stopped.wait(self.reload_seconds)):
+            try:
+                self.reload()
+            except Exception:
+                logging.exception(f"Failed to reload {self.cache.csv_path}, still serving the roster loaded before")
+
+    def lookup(self, date: datetime.date, index: Optional[Roster] = None) -> Dict:
+        """Who celebrates on the date."""
+        birthday_people_ids, nameday_people_ids = (index or self.index).lookup(date)
+        return {"date": date.isoformat(), "birthdays": birthday_people_ids, "namedays": nameday_people_ids}
+
+    def lookup_range(self, start: datetime.date, end: datetime.date) -> List[Dict]:
+        """Who celebrates on the days from start to end (both included), the days nobody does are left out."""
+        days = (end - start).days + 1
+        if ((days < 1) or (days > MAX_RANGE_DAYS)):
+            raise ValueError(f"The range has to be 1 to {MAX_RANGE_DAYS} days long, not {days}.")
+
+        # the whole range is answered from the same version of the roster
+        index = self.index
+        lookups = (self.lookup(start + datetime.timedelta(days=offset), index) for offset in range(days))
+
+        return [lookup for lookup in lookups if (lookup["birthdays"] or lookup["namedays"])]
+
+    def query(self, params: Dict[str, List[str]]) -> Dict:
+        """Answer ?date=YYYY-MM-DD (today if not given) or ?start=YYYY-MM-DD&end=YYYY-MM-DD."""
+        start = parse_date(params, "start")
+        end = parse_date(params, "end")
+
+        # the requests are not timed with the run metrics, the service never exports them and they would only grow
+        if ((start is None) and (end is None)):
+            return self.lookup(parse_date(params, "date") or datetime.date.today())
+
+        if ((start is None) or (end is None)):
+            raise ValueError("Both start and end are needed for a range.")
+
+        return {"start": start.isoformat(), "end": end.isoformat(), "days": self.lookup_range(start, end)}
+
+
+class QueryHandler(http.server.BaseHTTPRequestHandler):
+    """GET /celebrants and GET /health, answered in JSON over keep-alive connections."""
+
+    protocol_version = "HTTP/1.1"
+    # the headers and the body leave in one segment, right away
+    wbufsize = 1 << 16
+    disable_nagle_algorithm = True
+    server: "QueryServer"
+
+    def do_GET(self) -> None:
+        url = urllib.parse.urlsplit(self.path)
+        service = self.server.service
+
+        try:
+            if (url.path == "/celebrants"):
+                self.respond(200, service.query(urllib.parse.parse_qs(url.query)))
+            elif (url.path == "/health"):
+                self.respond(200, {"rows": service.index.size})
+            else:
+                self.respond(404, {"error": f"Unknown path {url.path}. Use /celebrants or /health."})
+        except ValueError as e:
+            self.respond(400, {"error": str(e)})
+
+    def respond(self, status: int, body: Dict) -> None:
+        content = json.dumps(body).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logging.debug("%s - " + format, self.address_string(), *args)
+
+
+class QueryServer(http.server.ThreadingHTTPServer):
+    """Answers the requests in threads of their own, sharing the service."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], service: RosterService) -> None:
+        super().__init__(address, QueryHandler)
+        self.service = service
+
+
+def start_service(csv_path: Optional[str] = None, listen: Optional[str] = None,
+                  reload_seconds: Optional[float] = None) -> QueryServer:
+    """Load the roster and start the watcher, the server is ready to serve_forever()."""
+    config = get_config()
+    service = RosterService(csv_path or config.birthdays_csv_path,
+                            config.service_reload_seconds if (reload_seconds is None) else reload_seconds)
+
+    server = QueryServer(parse_listen(listen or config.service_listen), service)
+    threading.Thread(target=service.watch, name="roster-watcher", daemon=True).start()
+
+    return server
+
+
+def run_service(listen: Optional[str] = None) -> None:
+    """Serve the queries with the configuration from the environment until interrupted."""
+    server = start_service(listen=listen)
+    # the address bound, as a str and with the port picked by the system for port 0
+    host, port = server.socket.getsockname()[:2]
+
+    logging.info(f"Serving who celebrates when on http://{host}:{port}/celebrants")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Stopping the query service")
+    finally:
+        server.service.stopped.set()
+        server.server_close()
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""Compiled binary snapshot of the roster, memory mapped so a run reads only the bucket of its day.
+
+Layout (little endian):
+    header   magic, version, size, mtime (ns) and sha256 of the source csv, number of rows
+    table    2 x 367 offsets into the ids: birthdays then namedays, one bucket per day of a leap year plus the end
+    ids      UTF-8 user ids, separated by newlines within a bucket
+"""
+
+import datetime
+import hashlib
+import io
+import logging
+import mmap
+import os
+import struct
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from compression import decompressing
+from env import get_config
+from index import Celebrants, CelebrationIndex, MonthDay, month_day_keys, parse_feb29_fallback
+from webhook import iter_parsed_lines
+
+if TYPE_CHECKING:
+    # the type of the buffers readinto() fills, there from Python 3.12 on
+    from collections.abc import Buffer
+
+MAGIC = b"ZIVIJOSN"
+VERSION = 1
+
+HEADER = struct.Struct("<8sHQqQ32s")
+DAYS = 366
+# one more offset than buckets, the end of the last one
+TABLE = struct.Struct(f"<{2 * (DAYS + 1)}Q")
+
+ID_SEPARATOR = b"\n"
+
+# bucket of every (month, day), in the order of a leap year
+DAY_INDEX: Dict[MonthDay, int] = {
+    (date.month, date.day): day
+    for day, date in enumerate(datetime.date(2000, 1, 1) + datetime.timedelta(days=day) for day in range(DAYS))
+}
+
+
+class _HashingReader(io.RawIOBase):
+    """Passes the bytes of the file through, hashing them on the way, so the csv is read only once."""
+
+    def __init__(self, raw: io.BufferedReader) -> None:
+        super().__init__()
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: "Buffer") -> int:
+        size = self.raw.readinto(buffer)
+        self.sha256.update(memoryview(buffer)[:size])
+        return size
+
+
+def file_sha256(path: str) -> bytes:
+    """Hash of the whole file."""
+    sha256 = hashlib.sha256()
+
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(1 << 20), b""):
+            sha256.update(chunk)
+
+    return sha256.digest()
+
+
+def compile_snapshot(csv_path: str, snapshot_path: str) -> int:
+    """Parse the csv into the snapshot, replaced atomically. Returns the number of rows."""
+    stat = os.stat(csv_path)
+
+    with open(csv_path, "rb") as raw:
+        hashing = _HashingReader(raw)
+        lines = io.TextIOWrapper(decompressing(io.BufferedReader(hashing), csv_path))
+        index = CelebrationIndex.from_rows(iter_parsed_lines(lines, source=csv_path))
+        # the hash covers the whole file, even past the last row read
+        while (hashing.read(1 << 20)):
+            pass
+
+    blob = bytearray()
+    offsets: List[int] = []
+    for buckets in (index.birthdays, index.namedays):
+        for month_day in DAY_INDEX:
+            offsets.append(len(blob))
+            blob += ID_SEPARATOR.join(people_id.encode() for people_id in buckets.get(month_day, ()))
+        offsets.append(len(blob))
+
+    tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as snapshot:
+        snapshot.write(HEADER.pack(MAGIC, VERSION, stat.st_size, stat.st_mtime_ns, index.size,
+                                   hashing.sha256.digest()))
+        snapshot.write(TABLE.pack(*offsets))
+        snapshot.write(blob)
+
+    os.replace(tmp_path, snapshot_path)
+
+    logging.info(f"Compiled {index.size} birthdays from {csv_path} into {snapshot_path}")
+
+    return index.size
+
+
+class Snapshot:
+    """A memory mapped snapshot, the buckets are decoded only when looked up."""
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as snapshot:
+            self.mmap = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if (len(self.mmap) < HEADER.size + TABLE.size):
+            self.close()
+            raise ValueError(f"Snapshot {path} is truncated")
+
+        magic, version, self.size, self.mtime_ns, self.rows, self.sha256 = HEADER.unpack_from(self.mmap)
+
+        if ((magic != MAGIC) or (version != VERSION)):
+            self.close()
+            raise ValueError(f"Snapshot {path} is not a version {VERSION} snapshot")
+
+    def close(self) -> None:
+        self.mmap.close()
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def is_fresh(self, csv_path: str) -> bool:
+        """Was the snapshot compiled from the current csv? A changed mtime alone is checked against the hash."""
+        stat = os.stat(csv_path)
+
+        if (stat.st_size != self.size):
+            return False
+
+        return (stat.st_mtime_ns == self.mtime_ns) or (file_sha256(csv_path) == self.sha256)
+
+    def bucket(self, kind: int, day: int) -> List[str]:
+        """Ids of one bucket, kind 0 for birthdays and 1 for namedays."""
+        position = HEADER.size + 8 * (kind * (DAYS + 1) + day)
+        start, end = struct.unpack_from("<QQ", self.mmap, position)
+
+        if (start == end):
+            return []
+
+        blob = HEADER.size + TABLE.size
+        return self.mmap[blob + start:blob + end].decode().split(ID_SEPARATOR.decode())
+
+    def lookup(self, date: datetime.date, feb29_fallback: Optional[str] = None) -> Tuple[List[str], List[str]]:
+        """Return the ids of the people celebrating birthday and nameday on the given date."""
+        if (feb29_fallback is None):
+            feb29_fallback = get_config().feb29_fallback
+
+        birthday_people_ids: List[str] = []
+        nameday_people_ids: List[str] = []
+
+        for key in month_day_keys(date, parse_feb29_fallback(feb29_fallback)):
+            birthday_people_ids.extend(self.bucket(0, DAY_INDEX[key]))
+            nameday_people_ids.extend(self.bucket(1, DAY_INDEX[key]))
+
+        return birthday_people_ids, nameday_people_ids
+
+
+def load_snapshot(snapshot_path: str, csv_path: str) -> Optional[Snapshot]:
+    """Open the snapshot if it is there and up to date with the csv, None otherwise."""
+    if (not os.path.exists(snapshot_path)):
+        logging.info(f"No snapshot {snapshot_path}, parsing {csv_path}")
+        return None
+
+    try:
+        snapshot = Snapshot(snapshot_path)
+    except ValueError as e:
+        logging.warning(f"{e}, parsing {csv_path}")
+        return None
+
+    if (not snapshot.is_fresh(csv_path)):
+        snapshot.close()
+        logging.warning(f"Snapshot {snapshot_path} is stale, parsing {csv_path}. Compile it again.")
+        return None
+
+    return snapshot
+
+
+def lookup_snapshot(snapshot_path: str, csv_path: str, date: datetime.date) -> Optional[Celebrants]:
+    """People celebrating on the date according to the snapshot, None if it cannot be used."""
+    snapshot = load_snapshot(snapshot_path, csv_path)
+
+    if (snapshot is None):
+        return None
+
+    with snapshot:
+        birthday_people_ids, nameday_people_ids = snapshot.lookup(date)
+        return Celebrants(birthday_people_ids, nameday_people_ids, snapshot.rows)
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""Message templates and pools per locale, validated and compiled once, optionally overridden from a JSON file."""
+
+import datetime
+import functools
+import json
+import string
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from env import get_config
+
+# fields every template may use, and the ones it must
+GREETING_FIELDS = frozenset(["emoji", "colleague_wording", "colleague_id_list", "random_message"])
+TEMPLATE_FIELDS: Dict[str, Tuple[FrozenSet[str], FrozenSet[str]]] = {
+    "birthday": (GREETING_FIELDS, frozenset(["colleague_id_list"])),
+    "nameday": (GREETING_FIELDS, frozenset(["colleague_id_list"])),
+    "digest_header": (frozenset(["emoji", "first_day", "last_day"]), frozenset()),
+    "digest_birthday": (GREETING_FIELDS | {"day"}, frozenset(["colleague_id_list", "day"])),
+    "digest_nameday": (GREETING_FIELDS | {"day"}, frozenset(["colleague_id_list", "day"])),
+    "belated_header": (frozenset(["emoji"]), frozenset()),
+    "belated_birthday": (GREETING_FIELDS | {"day"}, frozenset(["colleague_id_list", "day"])),
+    "belated_nameday": (GREETING_FIELDS | {"day"}, frozenset(["colleague_id_list", "day"])),
+}
+
+# everything else a locale defines
+LOCALE_KEYS = frozenset(["colleague", "colleagues", "weekdays", "messages"])
+
+DEFAULT_LOCALE = "en"
+
+DEFAULT_LOCALES: Dict[str, Dict] = {
+    "en": {
+        "birthday": "### {emoji} Happy Birthday! {emoji} \nToday is the birthday of our beloved {colleague_wording} {colleague_id_list}. {random_message} :)",  # noqa: E501
+        "nameday": "### {emoji} Happy Nameday! {emoji} \nThe day has come to celebrate the nameday of our dearest {colleague_wording} {colleague_id_list}. {random_message} :)",  # noqa: E501
+        "digest_header": "### {emoji} Upcoming celebrations {emoji} \nBirthdays and namedays from {first_day} to {last_day}.",  # noqa: E501
+        "digest_birthday": "**{day}** :birthday: birthday of our {colleague_wording} {colleague_id_list}",
+        "digest_nameday": "**{day}** :tada: nameday of our {colleague_wording} {colleague_id_list}",
+        "belated_header": "### {emoji} Belated wishes {emoji} \nWe missed a few celebrations, sorry about that!",
+        "belated_birthday": "### {emoji} Belated Happy Birthday! {emoji} \nOn {day} it was the birthday of our beloved {colleague_wording} {colleague_id_list}. {random_message} :)",  # noqa: E501
+        "belated_nameday": "### {emoji} Belated Happy Nameday! {emoji} \nOn {day} it was the nameday of our dearest {colleague_wording} {colleague_id_list}. {random_message} :)",  # noqa: E501
+        "colleague": "colleague",
+        "colleagues": "colleagues",
+        "weekdays": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"],
+        "messages": [
+            "All the best and many more years to come.",
+            "Your presence brightens our workplace.",
+            "We're grateful to have you as part of our team.",
+            "We're truly appreciative to have you contributing to our team.",
+            "Wishing you continued success and prosperity in the years ahead.",
+            "Here's to your ongoing achievements and a future filled with happiness.",
+            "Sending you wishes for a lifetime of joy, fulfillment, and memorable experiences.",
+            "May each passing year bring you closer to your dreams and aspirations.",
+            "Here's to a future brimming with excitement, prosperity, and fulfillment.",
+            "May the coming years be even more fulfilling and rewarding than the ones before.",
+        ],
+    },
+    "sk": {
+        "birthday": "### {emoji} Všetko najlepšie k narodeninám! {emoji} \nDnes oslavujeme narodeniny {colleague_wording} {colleague_id_list}. {random_message} :)",  # noqa: E501
+        "nameday": "### {emoji} Všetko najlepšie k meninám! {emoji} \nDnes oslavujeme meniny {colleague_wording} {colleague_id_list}. {random_message} :)",  # noqa: E501
+        "digest_header": "### {emoji} Blížiace sa oslavy {emoji} \nNarodeniny a meniny od {first_day} do {last_day}.",
+        "digest_birthday": "**{day}** :birthday: narodeniny {colleague_wording} {colleague_id_list}",
+        "digest_nameday": "**{day}** :tada: meniny {colleague_wording} {colleague_id_list}",
+        "belated_header": "### {emoji} Oneskorené blahoželania {emoji} \nZmeškali sme zopár osláv, prepáčte!",
+        "belated_birthday": "### {emoji} Oneskorené blahoželanie k narodeninám! {emoji} \nOslava narodenín {colleague_wording} {colleague_id_list} ({day}) nám ušla. {random_message} :)",  # noqa: E501
+        "belated_nameday": "### {emoji} Oneskorené blahoželanie k meninám! {emoji} \nOslava menín {colleague_wording} {colleague_id_list} ({day}) nám ušla. {random_message} :)",  # noqa: E501
+        "colleague": "nášho milého kolegu",
+        "colleagues": "našich milých kolegov",
+        "weekdays": ["pondelok", "utorok", "streda", "štvrtok", "piatok", "sobota", "nedeľa"],
+        "messages": [
+            "Veľa zdravia, šťastia a ešte veľa ďalších rokov.",
+            "Tvoja prítomnosť rozjasňuje naše pracovisko.",
+            "Sme vďační, že si súčasťou nášho tímu.",
+            "Prajeme veľa úspechov aj v ďalších rokoch.",
+            "Nech sa ti splnia všetky sny.",
+            "Nech sú nasledujúce roky ešte lepšie ako tie predošlé.",
+        ],
+    },
+    "cs": {
+        "birthday": "### {emoji} Všechno nejlepší k narozeninám! {emoji} \nDnes slavíme narozeniny {colleague_wording} {colleague_id_list}. {random_message} :)",  # noqa: E501
+        "nameday": "### {emoji} Všechno nejlepší k svátku! {emoji} \nDnes slavíme svátek {colleague_wording} {colleague_id_list}. {random_message} :)",  # noqa: E501
+        "digest_header": "### {emoji} Blížící se oslavy {emoji} \nNarozeniny a svátky od {first_day} do {last_day}.",
+        "digest_birthday": "**{day}** :birthday: narozeniny {colleague_wording} {colleague_id_list}",
+        "digest_nameday": "**{day}** :tada: svátek {colleague_wording} {colleague_id_list}",
+        "belated_header": "### {emoji} Opožděná přání {emoji} \nPár oslav nám uteklo, omlouváme se!",
+        "belated_birthday": "### {emoji} Opožděné přání k narozeninám! {emoji} \nOslava narozenin {colleague_wording} {colleague_id_list} ({day}) nám utekla. {random_message} :)",  # noqa: E501
+        "belated_nameday": "### {emoji} Opožděné přání k svátku! {emoji} \nOslava svátku {colleague_wording} {colleague_id_list} ({day}) nám utekla. {random_message} :)",  # noqa: E501
+        "colleague": "našeho milého kolegy",
+        "colleagues": "našich milých kolegů",
+        "weekdays": ["pondělí", "úterý", "středa", "čtvrtek", "pátek", "sobota", "neděle"],
+        "messages": [
+            "Hodně zdraví, štěstí a ještě spoustu dalších let.",
+            "Tvoje přítomnost rozzáří naše pracoviště.",
+            "Jsme rádi, že jsi součástí našeho týmu.",
+            "Přejeme hodně úspěchů i v dalších letech.",
+            "Ať se ti splní všechny sny.",
+            "Ať jsou další roky ještě lepší než ty předchozí.",
+        ],
+    },
+}
+
+
+class Template:
+    """A template checked against the fields it may and must use, rendered by its bound format method."""
+
+    __slots__ = ("name", "source", "fields", "render")
+
+    def __init__(self, name: str, source: str, locale: str = DEFAULT_LOCALE) -> None:
+        allowed, required = TEMPLATE_FIELDS[name]
+
+        try:
+            fields = frozenset(field for _, field, _, _ in string.Formatter().parse(source) if field is not None)
+        except ValueError as e:
+            raise ValueError(f"Invalid {name} template of locale {locale}: {e}")
+
+        unknown = fields - allowed
+        if (unknown):
+            raise ValueError(f"Unknown fields {sorted(unknown)} in the {name} template of locale {locale}. "
+                             f"Use {sorted(allowed)}.")
+
+        missing = required - fields
+        if (missing):
+            raise ValueError(f"The {name} template of locale {locale} lacks the fields {sorted(missing)}.")
+
+        self.name = name
+        self.source = source
+        self.fields = fields
+        self.render = source.format
+
+
+@dataclass(frozen=True)
+class TemplateSet:
+    """The compiled templates and the preparsed pools of one locale."""
+
+    locale: str
+    templates: Dict[str, Template]
+    messages: Tuple[str, ...]
+    weekdays: Tuple[str, ...]
+    colleague: str
+    colleagues: str
+
+    def __getitem__(self, name: str) -> Template:
+        return self.templates[name]
+
+    def wording(self, count: int) -> str:
+        """How to call one or more colleagues."""
+        return self.colleague if (count == 1) else self.colleagues
+
+    def longest_wording(self) -> str:
+        """The longer of the wordings, to estimate the size of a message on the safe side."""
+        return max(self.colleague, self.colleagues, key=lambda wording: len(wording.encode()))
+
+    def day(self, date: datetime.date) -> str:
+        """Label of a day in the messages, i.e. Monday 2024-01-01."""
+        return f"{self.weekdays[date.weekday()]} {date.isoformat()}"
+
+
+def compile_locale(locale: str, definition: Dict) -> TemplateSet:
+    """Validate the definition of a locale and compile it."""
+    unknown = set(definition) - set(TEMPLATE_FIELDS) - LOCALE_KEYS
+    if (unknown):
+        raise ValueError(f"Unknown keys {sorted(unknown)} in locale {locale}")
+
+    missing = (set(TEMPLATE_FIELDS) | LOCALE_KEYS) - set(definition)
+    if (missing):
+        raise ValueError(f"Locale {locale} lacks {sorted(missing)}")
+
+    messages = tuple(definition["messages"])
+    if ((len(messages) == 0) or (not all(isinstance(message, str) and message for message in messages))):
+        raise ValueError(f"Locale {locale} needs a non-empty list of messages")
+
+    weekdays = tuple(definition["weekdays"])
+    if (len(weekdays) != 7):
+        raise ValueError(f"Locale {locale} needs 7 weekdays, Monday first")
+
+    return TemplateSet(
+        locale=locale,
+        templates={name: Template(name, definition[name], locale) for name in TEMPLATE_FIELDS},
+        messages=messages,
+        weekdays=weekdays,
+        colleague=definition["colleague"],
+        colleagues=definition["colleagues"],
+    )
+
+
+def load_template_sets(templates_path: Optional[str] = None) -> Dict[str, TemplateSet]:
+    """Compile the built-in locales and the ones of the JSON file, which override the built-in ones key by key.
+
+    The file looks like {"locales": {"sk": {"birthday": "...", "messages": ["..."]}}}. A new locale takes what it
+    does not define from the English one.
+    """
+    definitions = {locale: dict(definition) for locale, definition in DEFAULT_LOCALES.items()}
+
+    if (templates_path):
+        with open(templates_path) as templates_file:
+            locales = json.load(templates_file).get("locales", {})
+
+        for locale, definition in locales.items():
+            definitions.setdefault(locale, dict(DEFAULT_LOCALES[DEFAULT_LOCALE])).update(definition)
+
+    return {locale: compile_locale(locale, definition) for locale, definition in definitions.items()}
+
+
+@functools.lru_cache(maxsize=None)
+def _template_set(templates_path: Optional[str], locale: str) -> TemplateSet:
+    template_sets = load_template_sets(templates_path)
+
+    if (locale not in template_sets):
+        supported = ", ".join(sorted(template_sets))
+        raise ValueError(f"Unsupported locale {locale}. Use one of {supported}.")
+
+    return template_sets[locale]
+
+
+def get_template_set(locale: Optional[str] = None) -> TemplateSet:
+    """The templates of the locale (ZIVIJO_LOCALE unless given), loaded and validated on first use."""
+    config = get_config()
+    return _template_set(config.templates_path, locale or config.locale)
+
+
+@functools.lru_cache(maxsize=None)
+def emoji_pool(icon_emoji_csv: str) -> Tuple[str, ...]:
+    """The emojis of the comma separated list, split once."""
+    return tuple(icon_emoji_csv.split(","))
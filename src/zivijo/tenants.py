@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""Running many tenants (roster, webhook, channel, emojis) in one invocation."""
+
+import concurrent.futures
+import datetime
+import itertools
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
+
+from env import Config, get_config
+from index import Celebrants, filter_celebrants
+from ledger import ledger_locked
+from metrics import get_metrics, reset_metrics
+from webhook import create_session, iter_parsed_csv, post_message
+
+if TYPE_CHECKING:
+    import requests
+
+
+@dataclass(frozen=True)
+class Tenant:
+    """One team: its roster and where and how to congratulate."""
+
+    name: str
+    csv_path: str
+    webhook_url: str
+    channel: str = Config.channel
+    icon_emoji_csv: str = Config.icon_emoji_csv
+
+
+@dataclass
+class TenantReport:
+    """Outcome of one tenant's run."""
+
+    name: str
+    rows: int = 0
+    birthdays: List[str] = field(default_factory=list)
+    namedays: List[str] = field(default_factory=list)
+    posted: bool = False
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        """The tenant was processed without errors."""
+        return self.error is None
+
+
+def load_manifest(manifest_path: str) -> List[Tenant]:
+    """Read the tenants from a JSON manifest: {"tenants": [{"name": ..., "csv_path": ..., "webhook_url": ...}]}."""
+
+    with open(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+
+    config = get_config()
+    tenants: List[Tenant] = []
+
+    for i, item in enumerate(manifest.get("tenants", [])):
+        missing = [key for key in ("name", "csv_path", "webhook_url") if not item.get(key)]
+        if (missing):
+            raise ValueError(f"Tenant #{i} in {manifest_path} is missing {', '.join(missing)}.")
+
+        tenants.append(Tenant(
+            name=item["name"],
+            csv_path=item["csv_path"],
+            webhook_url=item["webhook_url"],
+            channel=item.get("channel") or config.channel,
+            icon_emoji_csv=item.get("icon_emoji_csv") or config.icon_emoji_csv
+        ))
+
+    return tenants
+
+
+def parse_tenant(tenant: Tenant, date: datetime.date) -> Celebrants:
+    """Stream the tenant's roster and keep only the people celebrating on the date."""
+    return filter_celebrants(iter_parsed_csv(tenant.csv_path), date)
+
+
+def run_tenants(tenants: List[Tenant],
+                date: Optional[datetime.date] = None,
+                parse_concurrency: Optional[int] = None,
+                post_concurrency: Optional[int] = None) -> List[TenantReport]:
+    """Parse the rosters in parallel processes and post concurrently over one pooled session."""
+
+    config = get_config()
+    parse_concurrency = parse_concurrency or config.parse_concurrency
+    post_concurrency = post_concurrency or config.post_concurrency
+    date = date or datetime.date.today()
+    reports = [TenantReport(tenant.name) for tenant in tenants]
+
+    # parsing is CPU bound, so it goes to processes (or stays in-process when the concurrency is 1)
+    if (parse_concurrency > 1):
+        metrics = get_metrics()
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=parse_concurrency) as pool:
+            parse_results = []
+
+            # the counters of the workers (rows read, skipped, ...) are added to the ones of this run
+            for result, counters in pool.map(_parse_tenant_in_worker, tenants, itertools.repeat(date)):
+                parse_results.append(result)
+                for (name, labels), value in counters.items():
+                    metrics.count(name, value, **dict(labels))
+    else:
+        parse_results = [_parse_tenant_safely(tenant, date) for tenant in tenants]
+
+    to_post: List[Tuple[Tenant, TenantReport]] = []
+
+    for tenant, report, result in zip(tenants, reports, parse_results):
+        if (isinstance(result, Exception)):
+            report.error = f"Failed to parse {tenant.csv_path}: {result}"
+            continue
+
+        report.rows = result.rows
+        report.birthdays = result.birthdays
+        report.namedays = result.namedays
+
+        if (report.birthdays or report.namedays):
+            to_post.append((tenant, report))
+
+    # posting is I/O bound, so the threads share the connection pool of one session
+    if (to_post):
+        def post_tenant(item: Tuple[Tenant, TenantReport]) -> None:
+            tenant, report = item
+            _post_tenant(tenant, report, date, session)
+
+        session = create_session(post_concurrency)
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=post_concurrency) as executor:
+                list(executor.map(post_tenant, to_post))
+        finally:
+            session.close()
+
+    return reports
+
+
+def run_manifest(manifest_path: str) -> bool:
+    """Run all tenants of the manifest and log a report line per tenant."""
+
+    tenants = load_manifest(manifest_path)
+    logging.info(f"Running {len(tenants)} tenants from {manifest_path}")
+
+    # the runs take turns, a rerun finds the tenants posted in the ledger
+    with ledger_locked():
+        reports = run_tenants(tenants)
+
+    for report in reports:
+        if (report.ok):
+            logging.info(f"Tenant {report.name}: {report.rows} rows, {len(report.birthdays)} birthdays, "
+                         f"{len(report.namedays)} namedays, posted: {report.posted}")
+        else:
+            logging.error(f"Tenant {report.name}: {report.error}")
+
+    return all(report.ok for report in reports)
+
+
+def _parse_tenant_safely(tenant: Tenant, date: datetime.date) -> Union[Celebrants, Exception]:
+    """Parse the tenant's roster, returning the exception instead of raising it."""
+    try:
+        return parse_tenant(tenant, date)
+    except Exception as e:
+        return e
+
+
+def _parse_tenant_in_worker(tenant: Tenant, date: datetime.date) -> Tuple[Union[Celebrants, Exception], Dict]:
+    """Parse the tenant's roster in a worker process, returning the counters of the metrics along."""
+    reset_metrics()
+    return _parse_tenant_safely(tenant, date), get_metrics().counters
+
+
+def _post_tenant(tenant: Tenant, report: TenantReport, date: Optional[datetime.date],
+                 session: "requests.Session") -> None:
+    """Post the tenant's message and record the outcome in the report."""
+    try:
+        report.posted = post_message(
+            report.birthdays,
+            report.namedays,
+            channel=tenant.channel,
+            webhook_url=tenant.webhook_url,
+            icon_emoji_csv=tenant.icon_emoji_csv,
+            session=session,
+            date=date
+        )
+    except Exception as e:
+        report.error = f"Failed to post: {e}"
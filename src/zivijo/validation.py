@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""Problems found in the roster, counted by category with a few samples each and logged once per file."""
+
+from typing import Dict, List, Optional, Tuple
+
+from env import Config
+from metrics import get_metrics
+
+# categories of the problems: whether the row is skipped or fixed and how to describe it
+CATEGORIES: Dict[str, Tuple[str, str]] = {
+    "invalid_birth_date": ("rows_skipped", "invalid birth date, row skipped"),
+    "invalid_name_date": ("rows_skipped", "invalid name date, row skipped"),
+    "missing_user_id": ("rows_skipped", "missing user id, row skipped"),
+    "missing_at": ("rows_fixed", "user id without @, @ added"),
+}
+
+# (line number, user id, offending value) of a problem
+Sample = Tuple[int, str, str]
+
+
+class ValidationReport:
+    """Counts of the problems per category and the first max_samples of each."""
+
+    def __init__(self, max_samples: int = Config.validation_samples) -> None:
+        self.max_samples = max_samples
+        self.counts: Dict[str, int] = {}
+        self.samples: Dict[str, List[Sample]] = {}
+        self.rows = 0
+        self.lines = 0
+
+    def add(self, category: str, line: int, user_id: str, value: str = "") -> None:
+        """Record one problem, keeping it as a sample if there are not enough of them yet."""
+        self.counts[category] = self.counts.get(category, 0) + 1
+
+        samples = self.samples.setdefault(category, [])
+        if (len(samples) < self.max_samples):
+            samples.append((line, user_id, value))
+
+    def merge(self, other: "ValidationReport", line_offset: int = 0) -> None:
+        """Add the problems of a report of a later part of the same file, its lines starting after line_offset."""
+        for category, count in other.counts.items():
+            self.counts[category] = self.counts.get(category, 0) + count
+
+            samples = self.samples.setdefault(category, [])
+            samples.extend((line + line_offset, user_id, value)
+                           for line, user_id, value in other.samples[category][:self.max_samples - len(samples)])
+
+        self.rows += other.rows
+        self.lines = line_offset + other.lines
+
+    def count(self, kind: str) -> int:
+        """Number of the rows skipped (rows_skipped) or fixed (rows_fixed)."""
+        return sum(count for category, count in self.counts.items() if (CATEGORIES[category][0] == kind))
+
+    @property
+    def ok(self) -> bool:
+        """No problems found."""
+        return len(self.counts) == 0
+
+    def count_metrics(self) -> None:
+        """Add the problems to the counters of the run."""
+        metrics = get_metrics()
+
+        for category, count in self.counts.items():
+            metrics.count(CATEGORIES[category][0], count, reason=category)
+
+    def summary(self) -> str:
+        """One line describing the problems."""
+        return ", ".join(f"{count} {CATEGORIES[category][1]}" for category, count in sorted(self.counts.items()))
+
+    def format_report(self, source: Optional[str] = None) -> str:
+        """The full report, every category with its samples."""
+        lines = [f"{source or 'The csv'}: {self.rows} rows, {self.count('rows_skipped')} skipped, "
+                 f"{self.count('rows_fixed')} fixed"]
+
+        for category, count in sorted(self.counts.items()):
+            lines.append(f"  {CATEGORIES[category][1]}: {count}")
+            lines.extend(f"    line {line}: " + " ".join(filter(None, (user_id, value)))
+                         for line, user_id, value in self.samples[category])
+            if (count > len(self.samples[category])):
+                lines.append(f"    ... and {count - len(self.samples[category])} more")
+
+        return "\n".join(lines)
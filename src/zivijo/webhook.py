@@ -2,59 +2,149 @@
 """Živijó mattermost webhook."""
 
 import csv
+import os
 import random
 import datetime
-from typing import Dict, List
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
 import logging
 
-import requests
+from columnar import ColumnarRoster, is_columnar
+from compression import decompressed_text
+from env import Config, get_config
+from dates import parse_iso_date
+from delivery import QUEUED, get_deliverer
+from index import Celebrants, route_celebrants
+from ledger import get_ledger, roster_signature
+from metrics import get_metrics
+from templates import emoji_pool, get_template_set
+from validation import ValidationReport
 
-from env import (
-    ZIVIJO_LOGLEVEL,
-    ZIVIJO_WEBHOOK_URL,
-    ZIVIJO_CHANNEL,
-    ZIVIJO_BIRTHDAYS_CSV_PATH,
-    ZIVIJO_BOT_USERNAME,
-    ZIVIJO_ICON_EMOJI_CSV
-)
+if TYPE_CHECKING:
+    # requests is imported only once there is something to post
+    import requests
 
-logging.basicConfig(level=ZIVIJO_LOGLEVEL)
 
-logging.info("Starting Živijó Mattermost webhook")
-logging.info(f"ZIVIJO_WEBHOOK_URL: {ZIVIJO_WEBHOOK_URL}")
-logging.info(f"ZIVIJO_CHANNEL: {ZIVIJO_CHANNEL}")
-logging.info(f"ZIVIJO_BIRTHDAYS_CSV_PATH: {ZIVIJO_BIRTHDAYS_CSV_PATH}")
-logging.info(f"ZIVIJO_BOT_USERNAME: {ZIVIJO_BOT_USERNAME}")
-logging.info(f"ZIVIJO_ICON_EMOJI_CSV: {ZIVIJO_ICON_EMOJI_CSV}")
+def log_config(config: Config) -> None:
+    """Log the configuration the webhook runs with."""
+    logging.info("Starting Živijó Mattermost webhook")
+    logging.info(f"ZIVIJO_WEBHOOK_URL: {config.webhook_url}")
+    logging.info(f"ZIVIJO_CHANNEL: {config.channel}")
+    logging.info(f"ZIVIJO_BIRTHDAYS_CSV_PATH: {config.birthdays_csv_path}")
+    logging.info(f"ZIVIJO_BOT_USERNAME: {config.bot_username}")
+    logging.info(f"ZIVIJO_ICON_EMOJI_CSV: {config.icon_emoji_csv}")
 
 
-def get_random_emoji() -> str:
-    """Returns randomly one of the emojis defined in ZIVIJO_ICON_EMOJI_CSV."""
-    return random.choice(ZIVIJO_ICON_EMOJI_CSV.split(','))  # nosec B311
+# the (birthday, nameday) people ids of each day posted about
+Celebrations = Mapping[datetime.date, Tuple[List[str], List[str]]]
+
+ID_SEPARATOR = ", "
+SECTION_SEPARATOR = "\n\n"
+
+
+def get_random_emoji(icon_emoji_csv: Optional[str] = None) -> str:
+    """Returns randomly one of the emojis defined in icon_emoji_csv (ZIVIJO_ICON_EMOJI_CSV by default)."""
+    return random.choice(emoji_pool(icon_emoji_csv or get_config().icon_emoji_csv))  # nosec B311
 
 
 def get_random_positive_message() -> str:
-    """Returns randomly one of the messages."""
-    messages = ["All the best and many more years to come.",
-                "Your presence brightens our workplace.",
-                "We're grateful to have you as part of our team.",
-                "We're truly appreciative to have you contributing to our team.",
-                "Wishing you continued success and prosperity in the years ahead.",
-                "Here's to your ongoing achievements and a future filled with happiness.",
-                "Sending you wishes for a lifetime of joy, fulfillment, and memorable experiences.",
-                "May each passing year bring you closer to your dreams and aspirations.",
-                "Here's to a future brimming with excitement, prosperity, and fulfillment.",
-                "May the coming years be even more fulfilling and rewarding than the ones before."
-                ]
-    return random.choice(messages)  # nosec B311
-
-
-def read_and_parse_csv() -> List[Dict]:
-    """Read the csv line by line and parse data into a dictionary."""
+    """Returns randomly one of the messages of the locale."""
+    return random.choice(get_template_set().messages)  # nosec B311
+
+
+def parse_row(row: Dict, report: Optional[ValidationReport] = None, line: int = 0) -> Optional[Dict]:
+    """Validate one csv row and parse its dates. Returns None if the row has to be skipped.
+
+    The problems are recorded in the report (summarized at the end of the file) and logged lazily at debug level.
+    """
+
+    # convert ISO date to date object
+    try:
+        if (row['iso-birth-date']):
+            row["birth_date"] = parse_iso_date(row['iso-birth-date'])
+    except ValueError:
+        logging.debug("Failed to parse birth date %s for user %s. Skipping.", row['iso-birth-date'], row['user_id'])
+        if (report is not None):
+            report.add("invalid_birth_date", line, row['user_id'], row['iso-birth-date'])
+        return None
+
+    try:
+        if (row['iso-name-date']):
+            row["name_date"] = parse_iso_date(row['iso-name-date'])
+    except ValueError:
+        logging.debug("Failed to parse name date %s for user %s. Skipping.", row['iso-name-date'], row['user_id'])
+        if (report is not None):
+            report.add("invalid_name_date", line, row['user_id'], row['iso-name-date'])
+        return None
+
+    # check if user_id is present
+    if (not row.get("user_id")):
+        logging.debug("User ID is missing for user %s. Skipping.", row)
+        if (report is not None):
+            report.add("missing_user_id", line, "", row.get("email") or "")
+        return None
+
+    # check if user_id begins with @
+    if (not row["user_id"].startswith("@")):
+        # add @ to the user_id
+        row["user_id"] = f"@{row['user_id']}"
+        logging.debug("User ID %s does not start with @. Adding @.", row['user_id'])
+        if (report is not None):
+            report.add("missing_at", line, row["user_id"])
+
+    return row
+
+
+def log_validation(report: ValidationReport, source: Optional[str] = None) -> None:
+    """Count the problems of the file in the run metrics and log one summary of them."""
+
+    report.count_metrics()
+
+    if (report.count("rows_skipped") > 0):
+        logging.error("Problems in %s: %s. Run the validate command for details.", source, report.summary())
+    elif (not report.ok):
+        logging.warning("Problems in %s: %s. Run the validate command for details.", source, report.summary())
+
+
+def is_remote(csv_path: Optional[str]) -> bool:
+    """Is the roster published over HTTP instead of a local file?"""
+    return (csv_path is not None) and csv_path.startswith(("http://", "https://"))
 
-    result: List[Dict] = []
 
-    with open(ZIVIJO_BIRTHDAYS_CSV_PATH) as csvfile:
+# columns of the roster routing a row to a channel of its own
+ROUTING_COLUMNS = ("channel", "team")
+
+
+def check_unrouted(csv_path: Optional[str], reader: str) -> None:
+    """Refuse a roster with channel or team columns where the reader posts everything to ZIVIJO_CHANNEL.
+
+    Only the header of a local file is read, a roster published over HTTP is not downloaded for it.
+    """
+    if ((not csv_path) or is_remote(csv_path) or (not os.path.exists(csv_path))):
+        return
+
+    with open(csv_path) as csvfile, decompressed_text(csvfile, csv_path) as lines:
+        header = next(csv.reader(lines), [])
+
+    routed = [column for column in ROUTING_COLUMNS if (column in header)]
+    if (routed):
+        raise ValueError(f"{csv_path} has the {' and '.join(routed)} column, which {reader} does not route. "
+                         "Only the csv parsed by the run command (streamed or with ZIVIJO_PARSE_WORKERS) is.")
+
+
+def iter_parsed_csv(csv_path: Optional[str] = None) -> Iterator[Dict]:
+    """Read the csv (a path or an http(s) URL) line by line and yield the valid rows parsed into dictionaries."""
+
+    config = get_config()
+    csv_path = csv_path or config.birthdays_csv_path
+
+    if (is_remote(csv_path)):
+        # lazy import, requests is needed only for the rosters published over HTTP
+        from remote import RemoteRoster
+
+        yield from RemoteRoster(csv_path, config.remote_cache_path).iter_rows()
+        return
+
+    with open(csv_path) as csvfile, decompressed_text(csvfile, csv_path) as lines:
         # check if the csv has a header
         # has_header = csv.Sniffer().has_header(csvfile.read(1024))
 
@@ -62,43 +152,149 @@ def read_and_parse_csv() -> List[Dict]:
         #     logging.error(f"CSV file {ZIVIJO_BIRTHDAYS_CSV_PATH} does not have a header. Please add correct header.")
         #     return result
 
-        reader = csv.DictReader(csvfile, delimiter=',')
+        yield from iter_parsed_lines(lines, source=csv_path)
+
+
+def validate_csv(csv_path: Optional[str] = None, max_samples: Optional[int] = None) -> ValidationReport:
+    """Read the whole csv and report its problems, with up to max_samples (ZIVIJO_VALIDATION_SAMPLES) rows of each."""
+    config = get_config()
+    report = ValidationReport(config.validation_samples if (max_samples is None) else max_samples)
+
+    csv_path = csv_path or config.birthdays_csv_path
+
+    if (is_remote(csv_path)):
+        # lazy import, requests is needed only for the rosters published over HTTP
+        from remote import RemoteRoster
+
+        # downloaded without a cache, the roster checked is the one published now
+        for _ in RemoteRoster(csv_path).iter_rows(report):
+            pass
+
+        return report
+
+    with open(csv_path) as csvfile, decompressed_text(csvfile, csv_path) as lines:
+        for _ in iter_parsed_lines(lines, report=report):
+            pass
+
+    return report
+
+
+def iter_parsed_lines(lines: Iterable[str], fieldnames: Optional[List[str]] = None,
+                      report: Optional[ValidationReport] = None,
+                      line_offset: int = 0,
+                      source: Optional[str] = None) -> Iterator[Dict]:
+    """Yield the valid rows of the csv lines, the header is read from the first line unless fieldnames are given.
+
+    The problems go to the given report, left to the caller to summarize, otherwise they are summarized at the end.
+    The line numbers in the report are counted from line_offset.
+    """
+
+    reader = csv.DictReader(lines, fieldnames=fieldnames, delimiter=',')
+    own_report = report is None
+    if (report is None):
+        report = ValidationReport()
+    rows_read = 0
+    try:
         for row in reader:
-            # convert ISO date to datetime object
-            try:
-                if (row['iso-birth-date']):
-                    row["birth_date"] = datetime.datetime.strptime(row['iso-birth-date'], '%Y-%m-%d')
-            except ValueError:
-                logging.error(f"Failed to parse birth date {row['iso-birth-date']} for user {row['user_id']}. Skipping.")  # noqa: E501
-                continue
-
-            try:
-                if (row['iso-name-date']):
-                    row["name_date"] = datetime.datetime.strptime(row['iso-name-date'], '%Y-%m-%d')
-            except ValueError:
-                logging.error(f"Failed to parse name date {row['iso-name-date']} for user {row['user_id']}. Skipping.")
-                continue
-
-            # check if user_id is present
-            if (not row.get("user_id")):
-                logging.error(f"User ID is missing for user {row}. Skipping.")
-                continue
-
-            # check if user_id begins with @
-            if (not row["user_id"].startswith("@")):
-                # add @ to the user_id
-                row["user_id"] = f"@{row['user_id']}"
-                logging.warning(f"User ID {row['user_id']} does not start with @. Adding @.")
-
-            result.append(row)
-
-    logging.info(f"Read {len(result)} birthdays from {ZIVIJO_BIRTHDAYS_CSV_PATH}")
+            rows_read += 1
+            parsed_row = parse_row(row, report, line_offset + reader.line_num)
+
+            if (parsed_row is not None):
+                yield parsed_row
+    finally:
+        get_metrics().count("rows_read", rows_read)
+        report.rows += rows_read
+        report.lines = line_offset + reader.line_num
+
+        if (own_report):
+            log_validation(report, source)
+
+
+def read_and_parse_csv(csv_path: Optional[str] = None) -> List[Dict]:
+    """Read the csv line by line and parse data into a dictionary."""
+
+    result: List[Dict] = list(iter_parsed_csv(csv_path))
+
+    logging.info(f"Read {len(result)} birthdays from {csv_path or get_config().birthdays_csv_path}")
 
     return result
 
 
-def post_message(birthday_people_ids: List[str], nameday_people_ids: List[str]) -> bool:
-    """Post a message to the webhook."""
+def read_roster(csv_path: Optional[str] = None) -> ColumnarRoster:
+    """Read the csv into the compact column store, a fraction of the memory of the rows of read_and_parse_csv."""
+
+    roster = ColumnarRoster.from_rows(iter_parsed_csv(csv_path))
+
+    logging.info(f"Read {len(roster)} birthdays from {csv_path or get_config().birthdays_csv_path}")
+
+    return roster
+
+
+def create_session(pool_size: int) -> "requests.Session":
+    """Create a requests session keeping up to pool_size connections alive per host."""
+    import requests
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def compose_sections(template_name: str, people_ids: List[str],
+                     icon_emoji_csv: Optional[str] = None,
+                     max_bytes: Optional[int] = None,
+                     **fields: str) -> List[str]:
+    """Render the named template and its extra fields for the people, in sections that stay within max_bytes."""
+
+    max_bytes = max_bytes or get_config().max_post_bytes
+    templates = get_template_set()
+    render = templates[template_name].render
+    longest_wording = templates.longest_wording()
+    sections: List[str] = []
+    start = 0
+
+    while (start < len(people_ids)):
+        emoji = get_random_emoji(icon_emoji_csv)
+        random_message = get_random_positive_message()
+
+        # size of everything but the ids, with the longer wording to be on the safe side
+        size = len(render(
+            emoji=emoji,
+            colleague_wording=longest_wording,
+            colleague_id_list="",
+            random_message=random_message,
+            **fields
+        ).encode())
+
+        # take as many whole ids as fit, but at least one so that a mention is never split
+        end = start + 1
+        size += len(people_ids[start].encode())
+        while (end < len(people_ids)):
+            size += len(people_ids[end].encode()) + len(ID_SEPARATOR)
+            if (size > max_bytes):
+                break
+            end += 1
+
+        chunk = people_ids[start:end]
+
+        sections.append(render(
+            emoji=emoji,
+            colleague_wording=templates.wording(len(chunk)),
+            colleague_id_list=ID_SEPARATOR.join(chunk),
+            random_message=random_message,
+            **fields
+        ))
+
+        start = end
+
+    return sections
+
+
+def compose_messages(birthday_people_ids: List[str], nameday_people_ids: List[str],
+                     icon_emoji_csv: Optional[str] = None,
+                     max_bytes: Optional[int] = None) -> List[str]:
+    """Compose the message texts, birthdays first, each within max_bytes (ZIVIJO_MAX_POST_BYTES unless given)."""
 
     if ((len(birthday_people_ids) == 0) and (len(nameday_people_ids) == 0)):
         # wtf?
@@ -106,78 +302,339 @@ def post_message(birthday_people_ids: List[str], nameday_people_ids: List[str])
         logging.error(message)
         raise Exception(message)
 
-    if (len(birthday_people_ids) > 0):
-        # prepare the birthday message
-        birthday_colleague_wording = "colleague" if (len(birthday_people_ids) == 1) else "colleagues"
+    sections = compose_sections("birthday", birthday_people_ids, icon_emoji_csv, max_bytes) + \
+        compose_sections("nameday", nameday_people_ids, icon_emoji_csv, max_bytes)
 
-        birthday_colleague_id_list = ", ".join(birthday_people_ids)
+    return pack_sections(sections, max_bytes)
 
-        birthday_message = "### {emoji} Happy Birthday! {emoji} \nToday is the birthday of our beloved {colleague_wording} {colleague_id_list}. {random_message} :)".format(  # noqa: E501
-            emoji=get_random_emoji(),
-            colleague_wording=birthday_colleague_wording,
-            colleague_id_list=birthday_colleague_id_list,
-            random_message=get_random_positive_message()
-        )
 
-    if (len(nameday_people_ids) > 0):
-        # prepare the nameday message
-        nameday_colleague_wording = "colleague" if (len(nameday_people_ids) == 1) else "colleagues"
+def pack_sections(sections: List[str], max_bytes: Optional[int] = None) -> List[str]:
+    """Pack the sections into as few messages within max_bytes as possible, keeping their order."""
 
-        nameday_colleague_id_list = ", ".join(nameday_people_ids)
+    max_bytes = max_bytes or get_config().max_post_bytes
+    messages: List[str] = []
+    current: List[str] = []
+    size = 0
 
-        nameday_message = "### {emoji} Happy Nameday! {emoji} \nThe day has come to celebrate the nameday of our dearest {colleague_wording} {colleague_id_list}. {random_message} :)".format(  # noqa: E501
-            emoji=get_random_emoji(),
-            colleague_wording=nameday_colleague_wording,
-            colleague_id_list=nameday_colleague_id_list,
-            random_message=get_random_positive_message()
-        )
+    for section in sections:
+        section_size = len(section.encode())
 
-    # final message
-    message = "\n\n".join([birthday_message, nameday_message])
+        if (current and (size + len(SECTION_SEPARATOR) + section_size > max_bytes)):
+            messages.append(SECTION_SEPARATOR.join(current))
+            current = []
+            size = 0
 
-    # prepare the payload
-    payload = {
-        "channel": ZIVIJO_CHANNEL,
-        "username": ZIVIJO_BOT_USERNAME,
-        "icon_emoji": get_random_emoji(),
-        "text": message,
-        # "props": {
-        #     "card": "Salesforce Opportunity Information:\n\n [Opportunity](https://salesforce.com/OPPORTUNITY_ID)"
-        # }
-    }
+        size += section_size + (len(SECTION_SEPARATOR) if current else 0)
+        current.append(section)
 
-    headers = {"Content-Type": "application/json"}
+    messages.append(SECTION_SEPARATOR.join(current))
 
-    # post the message
-    response = requests.post(ZIVIJO_WEBHOOK_URL, headers=headers, json=payload, timeout=5)
+    return messages
+
+
+def compose_payloads(birthday_people_ids: List[str], nameday_people_ids: List[str],
+                     channel: Optional[str] = None,
+                     icon_emoji_csv: Optional[str] = None,
+                     max_bytes: Optional[int] = None) -> List[Dict]:
+    """Compose the webhook payloads to be sent in order. The configured channel and emojis are used unless given."""
+
+    messages = compose_messages(birthday_people_ids, nameday_people_ids, icon_emoji_csv, max_bytes)
+
+    return build_payloads(messages, channel, icon_emoji_csv)
 
-    if response.status_code != 200:
-        raise Exception(f"Failed to send notification to Mattermost: {response.text}")
 
-    logging.info(f"Posted message to Mattermost: {message}")
+def build_payloads(messages: List[str],
+                   channel: Optional[str] = None,
+                   icon_emoji_csv: Optional[str] = None) -> List[Dict]:
+    """Wrap the message texts into webhook payloads. The configured channel and emojis are used unless given."""
+
+    config = get_config()
+
+    return [
+        {
+            "channel": channel or config.channel,
+            "username": config.bot_username,
+            "icon_emoji": get_random_emoji(icon_emoji_csv),
+            "text": message,
+            # "props": {
+            #     "card": "Salesforce Opportunity Information:\n\n [Opportunity](https://salesforce.com/OPPORTUNITY_ID)"
+            # }
+        }
+        for message in messages
+    ]
+
+
+def send_payload(payload: Dict,
+                 webhook_url: Optional[str] = None,
+                 session: Optional["requests.Session"] = None) -> bool:
+    """Send an already composed payload to the webhook (ZIVIJO_WEBHOOK_URL unless given).
+
+    Returns False when it could not be sent now and was kept in the outbox for the next start.
+    """
+
+    # post the message through the rate limit, retries and outbox, reusing the pooled connections of the session
+    outcome = get_deliverer().deliver(payload, webhook_url or get_config().webhook_url, session)
+
+    if (outcome == QUEUED):
+        return False
+
+    logging.info(f"Posted message to Mattermost: {payload['text']}")
 
     # everything went fine
     return True
 
 
-def run() -> bool:
-    """Run the bot."""
+def post_message(birthday_people_ids: List[str], nameday_people_ids: List[str],
+                 channel: Optional[str] = None,
+                 webhook_url: Optional[str] = None,
+                 icon_emoji_csv: Optional[str] = None,
+                 session: Optional["requests.Session"] = None,
+                 date: Optional[datetime.date] = None) -> bool:
+    """Post a message to the webhook, once per day (today unless given) with a ledger.
 
-    # read the csv
-    parsed_csv = read_and_parse_csv()
+    The configured channel, webhook and emojis are used unless given.
+    """
 
-    if (len(parsed_csv) == 0):
-        logging.info(f"No data read? {ZIVIJO_BIRTHDAYS_CSV_PATH} is empty?")
-        return False
+    def compose(celebrations: Celebrations) -> List[Dict]:
+        # long lists of people are split into several posts, sent in order
+        return compose_payloads(birthday_people_ids, nameday_people_ids, channel, icon_emoji_csv)
+
+    celebrations = {date or datetime.date.today(): (birthday_people_ids, nameday_people_ids)}
+
+    return post_once(celebrations, compose, channel, webhook_url, session)
+
+
+def post_once(celebrations: Celebrations,
+              compose: Callable[[Celebrations], List[Dict]],
+              channel: Optional[str] = None,
+              webhook_url: Optional[str] = None,
+              session: Optional["requests.Session"] = None,
+              kind: str = "post") -> bool:
+    """Compose the payloads of the celebrations and post them, leaving out the days the ledger has as posted.
+
+    Without a ledger (ZIVIJO_LEDGER_PATH) everything is posted. With one, the days are recorded once their payloads
+    are delivered or queued in the outbox, not when they are rejected. A payload rejected after others went out still
+    fails the post, but the days are recorded first, a rerun would post the ones that went out again. Returns False
+    if the payloads were queued.
+    """
+
+    ledger = get_ledger()
+    channel_name = channel or get_config().channel
+
+    if (ledger is not None):
+        posted = [date for date, (birthday_people_ids, nameday_people_ids) in celebrations.items()
+                  if ledger.posted(date, channel_name, birthday_people_ids, nameday_people_ids, kind)]
+
+        for date in posted:
+            logging.info(f"The {kind} of {date} was already posted to {channel_name}, skipping it")
+
+        celebrations = {date: people for date, people in celebrations.items() if (date not in posted)}
+        if (not celebrations):
+            return True
+
+    with get_metrics().phase("compose"):
+        payloads = compose(celebrations)
+
+    def record() -> None:
+        # the outbox delivers the queued ones on the next start, composing them again would post them twice
+        if (ledger is not None):
+            for date, (birthday_people_ids, nameday_people_ids) in celebrations.items():
+                ledger.record_post(date, channel_name, birthday_people_ids, nameday_people_ids, kind)
+
+    sent: List[Dict] = []
+    try:
+        delivered = post_payloads(payloads, webhook_url, session, sent)
+    except Exception:
+        if (sent):
+            logging.warning(f"{len(sent)} of the {len(payloads)} payloads went out before the failure, "
+                            f"recording the {kind} as posted")
+            record()
+        raise
+
+    record()
+    return delivered
+
+
+def post_payloads(payloads: List[Dict],
+                  webhook_url: Optional[str] = None,
+                  session: Optional["requests.Session"] = None,
+                  sent: Optional[List[Dict]] = None) -> bool:
+    """Send the composed payloads in order. Returns False if they were queued in the outbox for the next start.
+
+    The payloads delivered or queued are added to sent as they go, so a failure later on knows what went out.
+    """
+
+    delivered = True
+
+    with get_metrics().phase("post"):
+        for payload in payloads:
+            if (not delivered):
+                # the rest waits in the outbox behind the first one queued, in order
+                get_deliverer().queue(payload, webhook_url or get_config().webhook_url)
+            elif (not send_payload(payload, webhook_url, session)):
+                delivered = False
+
+            if (sent is not None):
+                sent.append(payload)
+
+    return delivered
+
+
+def post_channels(channels: Dict[Optional[str], Celebrants], post_concurrency: Optional[int] = None) -> bool:
+    """Post the celebrants of each channel (None is the configured one) concurrently over one pooled session."""
+    import concurrent.futures
+
+    to_post = [(channel, celebrants) for channel, celebrants in channels.items()
+               if (celebrants.birthdays or celebrants.namedays)]
+    post_concurrency = min(post_concurrency or get_config().post_concurrency, len(to_post))
+
+    def post_channel(item: Tuple[Optional[str], Celebrants]) -> bool:
+        channel, celebrants = item
+        try:
+            return post_message(celebrants.birthdays, celebrants.namedays, channel=channel, session=session)
+        except Exception:
+            # the other channels are posted all the same
+            logging.exception(f"Failed to post to the channel {channel or get_config().channel}")
+            return False
+
+    logging.info(f"Posting to {len(to_post)} channels")
 
-    # get today's date
-    today = datetime.datetime.today()
+    session = create_session(max(post_concurrency, 1))
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(post_concurrency, 1)) as executor:
+            return all(list(executor.map(post_channel, to_post)))
+    finally:
+        session.close()
 
-    # filter out the birthdays that match today's date
-    birthday_people_ids = [b["user_id"] for b in parsed_csv if b.get("birth_date") and b["birth_date"].month == today.month and b["birth_date"].day == today.day]  # noqa: E501
 
-    # filter out the namedays that match today's date
-    nameday_people_ids = [b["user_id"] for b in parsed_csv if b.get("name_date") and b["name_date"].month == today.month and b["name_date"].day == today.day]  # noqa: E501
+def run(roster: Optional[ColumnarRoster] = None) -> bool:
+    """Run the bot. An already read roster is matched in memory instead of parsing the csv.
+
+    With a ledger (ZIVIJO_LEDGER_PATH) the runs take turns, and a run of a day already completed with the same
+    roster returns before reading it.
+    """
+
+    ledger = get_ledger()
+    if (ledger is None):
+        return _run(roster)
+
+    today = datetime.date.today()
+    signature = roster_signature(get_config().birthdays_csv_path)
+
+    with ledger.locked():
+        if (ledger.completed(today, signature)):
+            logging.info(f"The greetings of {today} were already posted, nothing to do")
+            return True
+
+        result = _run(roster)
+
+        if (result):
+            ledger.record_run(today, signature)
+
+    return result
+
+
+def lookup_celebrants(dates: List[datetime.date], roster: Optional[ColumnarRoster] = None
+                      ) -> Optional[Dict[datetime.date, Celebrants]]:
+    """The celebrants of the days from the roster read ahead: the one given, the database, the roster published over
+    HTTP, the snapshot, the roster cache or the column store, whichever is configured. None when the csv is to be
+    parsed instead."""
+
+    config = get_config()
+    csv_path = config.birthdays_csv_path
+    metrics = get_metrics()
+
+    found = None
+    if (roster is not None):
+        with metrics.phase("filter"):
+            found = {date: roster.match(date) for date in dates}
+    elif (config.database_path):
+        # lazy import, sqlite is needed only when configured
+        from database import query_celebrants
+
+        with metrics.phase("filter"):
+            found = {date: query_celebrants(config.database_path, date) for date in dates}
+    elif (is_remote(csv_path)):
+        # lazy import, requests is needed only for the rosters published over HTTP
+        from remote import RemoteRoster
+
+        with metrics.phase("parse"):
+            index = RemoteRoster(csv_path, config.remote_cache_path).refresh()
+
+        with metrics.phase("filter"):
+            found = {date: Celebrants(*index.lookup(date), index.size) for date in dates}
+    elif (config.snapshot_path):
+        # lazy import, the snapshot is read only when configured
+        from snapshot import load_snapshot
+
+        with metrics.phase("filter"):
+            snapshot = load_snapshot(config.snapshot_path, csv_path)
+            if (snapshot is not None):
+                with snapshot:
+                    found = {date: Celebrants(*snapshot.lookup(date), snapshot.rows) for date in dates}
+
+    if ((found is None) and config.roster_cache_path):
+        # lazy import, the roster is cached only when configured
+        from incremental import IncrementalRoster
+
+        with metrics.phase("parse"):
+            index = IncrementalRoster(csv_path, config.roster_cache_path).refresh()
+
+        with metrics.phase("filter"):
+            found = {date: Celebrants(*index.lookup(date), index.size) for date in dates}
+
+    if ((found is None) and is_columnar(config.roster_format)):
+        with metrics.phase("parse"):
+            roster = read_roster(csv_path)
+
+        with metrics.phase("filter"):
+            found = {date: roster.match(date) for date in dates}
+
+    if (found is not None):
+        # the rows were read without their channels
+        check_unrouted(csv_path, "the database, snapshot, roster cache or column store")
+
+    return found
+
+
+def _run(roster: Optional[ColumnarRoster] = None) -> bool:
+    """Find today's celebrants and post them."""
+
+    config = get_config()
+    csv_path = config.birthdays_csv_path
+    metrics = get_metrics()
+    today = datetime.date.today()
+
+    found = lookup_celebrants([today], roster)
+    # today's celebrants by channel, only known when the csv is streamed
+    channels: Dict[Optional[str], Celebrants] = {}
+    if (found is not None):
+        birthday_people_ids, nameday_people_ids, rows = found[today]
+    else:
+        if (config.parse_workers > 1):
+            # the workers parse and filter their parts of the csv together, there is no telling the phases apart
+            from parallel import parallel_route_celebrants
+
+            with metrics.phase("parse"):
+                channels = parallel_route_celebrants(csv_path, today, config.parse_workers)
+        else:
+            # stream the csv and keep only the people celebrating today, timing the parsing and the filtering apart
+            with metrics.phase("filter", exclude="parse"):
+                parsed_rows = metrics.timed(iter_parsed_csv(csv_path), "parse")
+                channels = route_celebrants(parsed_rows, today)
+
+        birthday_people_ids = [people_id for celebrants in channels.values() for people_id in celebrants.birthdays]
+        nameday_people_ids = [people_id for celebrants in channels.values() for people_id in celebrants.namedays]
+        rows = sum(celebrants.rows for celebrants in channels.values())
+
+    metrics.count("celebrants_matched", len(birthday_people_ids), kind="birthday")
+    metrics.count("celebrants_matched", len(nameday_people_ids), kind="nameday")
+
+    logging.info(f"Read {rows} birthdays from {csv_path}")
+
+    if (rows == 0):
+        logging.info(f"No data read? {csv_path} is empty?")
+        return False
 
     if (len(birthday_people_ids) == 0):
         logging.info("No birthdays today :(")
@@ -192,5 +649,9 @@ def run() -> bool:
     if ((len(birthday_people_ids) == 0) and (len(nameday_people_ids) == 0)):
         return True
 
+    # the rows with a channel or a team of their own are posted there
+    if (set(channels) - {None}):
+        return post_channels(channels)
+
     # post the message
     return post_message(birthday_people_ids, nameday_people_ids)
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""Fixtures shared by the tests."""
+
+import os
+import sys
+from typing import Iterator
+
+import pytest
+
+# the stub servers are shared with the benchmarks
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+
+from stub_server import StubServer  # noqa: E402
+
+ROSTER_CONTENT = """email,user_id,iso-birth-date,iso-name-date
+jozko@email.com,@jozko,1990-01-01,1990-03-19
+ferko@email.com,ferko,1992-05-17,
+žofka@email.com,@žofka,1988-05-17,1988-01-01
+"""
+
+
+@pytest.fixture
+def stub_server(request: pytest.FixtureRequest) -> Iterator[StubServer]:
+    """Stub webhook answering with the responses given as the indirect parameter, then 200."""
+    with StubServer(getattr(request, "param", [])) as server:
+        yield server
+
+
+@pytest.fixture
+def roster_server() -> Iterator[StubServer]:
+    """Stub server publishing ROSTER_CONTENT."""
+    with StubServer(roster=ROSTER_CONTENT.encode()) as server:
+        yield server
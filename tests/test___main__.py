@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Testing the cold start of the command line entry point."""
+
+import datetime
+import os
+import pathlib
+import re
+import subprocess  # nosec B404
+import sys
+import time
+
+# budgets of a one-shot run on a day nobody celebrates
+WALL_CLOCK_BUDGET_SECONDS = 2.0
+IMPORT_TIME_BUDGET_SECONDS = 0.3
+
+SRC_PATH = pathlib.Path(__file__).parent.parent / "src"
+
+
+def test_cold_start_without_celebrants(tmp_path: pathlib.Path) -> None:
+    """Nobody celebrates today: requests is never imported and the run stays within its budgets."""
+    tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_text(
+        "email,user_id,iso-birth-date,iso-name-date\n"
+        f"user_1@email.com,@user_1_id,1990-{tomorrow:%m-%d},\n"
+    )
+
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": os.pathsep.join([str(SRC_PATH), str(SRC_PATH / "zivijo")]),
+        "ZIVIJO_WEBHOOK_URL": "http://127.0.0.1:9/hooks/unused",
+        "ZIVIJO_BIRTHDAYS_CSV_PATH": str(csv_path),
+        "ZIVIJO_TENANTS_MANIFEST_PATH": "",
+        "ZIVIJO_OUTBOX_DIR": "",
+    })
+
+    start = time.monotonic()
+    result = subprocess.run(  # nosec B603
+        [sys.executable, "-X", "importtime", "-m", "zivijo"],
+        env=env, capture_output=True, text=True, timeout=30
+    )
+    elapsed = time.monotonic() - start
+
+    assert result.returncode == 0, result.stderr
+    assert "No birthdays today" in result.stderr
+
+    imports = re.findall(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$", result.stderr, re.MULTILINE)
+    imported_modules = {name for _, _, _, name in imports}
+    assert "requests" not in imported_modules
+    assert "urllib3" not in imported_modules
+
+    # self times of all the imports, interpreter startup included
+    import_time = sum(int(self_us) for self_us, _, _, _ in imports) / 1_000_000
+    assert import_time < IMPORT_TIME_BUDGET_SECONDS
+
+    assert elapsed < WALL_CLOCK_BUDGET_SECONDS
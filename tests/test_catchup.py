@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""Testing the catch-up of the missed days."""
+
+import datetime
+import pathlib
+import re
+from typing import Any, Dict, List, Optional
+from unittest.mock import patch
+
+import pytest
+
+from catchup import missed_days, read_last_posted, run_catchup, write_last_posted
+from database import import_csv
+from env import Config
+from snapshot import compile_snapshot
+
+CSV_CONTENT = """email,user_id,iso-birth-date,iso-name-date
+jozko@email.com,@jozko,1990-12-30,1990-01-02
+ferko@email.com,@ferko,1992-01-01,
+janko@email.com,@janko,1988-05-05,1988-12-31
+"""
+
+TODAY = datetime.date(2024, 1, 2)
+
+
+def test_missed_days() -> None:
+    """The days between the last posted one and today, capped to the most recent ones."""
+    assert missed_days(None, TODAY, 7) == []
+    assert missed_days(datetime.date(2024, 1, 1), TODAY, 7) == []
+    assert missed_days(TODAY, TODAY, 7) == []
+    assert missed_days(datetime.date(2023, 12, 29), TODAY, 7) == [
+        datetime.date(2023, 12, 30),
+        datetime.date(2023, 12, 31),
+        datetime.date(2024, 1, 1),
+    ]
+    assert missed_days(datetime.date(2023, 1, 1), TODAY, 2) == [datetime.date(2023, 12, 31), datetime.date(2024, 1, 1)]
+
+
+def test_last_posted(tmp_path: pathlib.Path) -> None:
+    """The last posted day is kept in the state file."""
+    state_path = str(tmp_path / "state.json")
+
+    assert read_last_posted(state_path) is None
+    write_last_posted(state_path, TODAY)
+    assert read_last_posted(state_path) == TODAY
+
+
+def run_with(tmp_path: pathlib.Path, policy: str, last_posted: datetime.date, ledger_path: Optional[str] = None,
+             **settings: Any) -> List[str]:
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_text(CSV_CONTENT)
+    state_path = tmp_path / "state.json"
+    write_last_posted(str(state_path), last_posted)
+    config = Config(birthdays_csv_path=str(csv_path), state_path=str(state_path), catchup_policy=policy,
+                    catchup_max_days=7, feb29_fallback="02-28", max_post_bytes=1000, ledger_path=ledger_path,
+                    **settings)
+
+    with patch("env._config", config), \
+            patch("catchup.get_config", return_value=config), \
+            patch("digest.get_config", return_value=config), \
+            patch("webhook.get_config", return_value=config), \
+            patch("ledger.get_config", return_value=config), \
+            patch("digest.iter_parsed_csv", wraps=__import__("webhook").iter_parsed_csv) as mocked_iter, \
+            patch("webhook.post_payloads", return_value=True) as mocked_post_payloads, \
+            patch("catchup.post_message", return_value=True) as mocked_post_message:
+        assert run_catchup(TODAY) is True
+
+    # the csv is parsed once, unless the roster is read from elsewhere or by the parse workers
+    assert mocked_iter.call_count == (0 if settings else 1)
+    mocked_post_message.assert_called_once_with([], ["@jozko"], date=TODAY)
+    assert read_last_posted(str(state_path)) == TODAY
+
+    return [payload["text"] for call in mocked_post_payloads.call_args_list for payload in call.args[0]]
+
+
+def test_run_catchup_combined(tmp_path: pathlib.Path) -> None:
+    """The missed days are posted in one belated message before today's greetings."""
+    texts = run_with(tmp_path, "combined", datetime.date(2023, 12, 28))
+
+    assert len(texts) == 1
+    lines = texts[0].split("\n\n")
+    assert "Belated wishes" in lines[0]
+    assert lines[1:] == [
+        "**Saturday 2023-12-30** :birthday: birthday of our colleague @jozko",
+        "**Sunday 2023-12-31** :tada: nameday of our colleague @janko",
+        "**Monday 2024-01-01** :birthday: birthday of our colleague @ferko",
+    ]
+
+
+def test_run_catchup_per_day(tmp_path: pathlib.Path) -> None:
+    """Every missed day with celebrants gets its own belated message."""
+    texts = run_with(tmp_path, "per-day", datetime.date(2023, 12, 28))
+
+    assert len(texts) == 3
+    assert "Belated Happy Birthday" in texts[0] and "Saturday 2023-12-30" in texts[0] and "@jozko" in texts[0]
+    assert "Belated Happy Nameday" in texts[1] and "@janko" in texts[1]
+    assert "Belated Happy Birthday" in texts[2] and "@ferko" in texts[2]
+
+
+@pytest.mark.parametrize("source", ["database", "snapshot", "roster_cache", "columnar", "parse_workers"])
+def test_run_catchup_reads_the_roster_like_run(tmp_path: pathlib.Path, source: str) -> None:
+    """The catch-up reads the roster from the same source as the usual run and wishes the same people."""
+    def celebrated(texts: List[str]) -> List[List[str]]:
+        # the greetings are worded at random, the days and the people are compared
+        return [re.findall(r"@\w+|\d{4}-\d\d-\d\d", text) for text in texts]
+
+    expected = celebrated(run_with(tmp_path, "per-day", datetime.date(2023, 12, 28)))
+    csv_path = str(tmp_path / "birthdays.csv")
+
+    settings: Dict[str, Any] = {}
+    if (source == "database"):
+        settings["database_path"] = str(tmp_path / "roster.sqlite")
+        import_csv(csv_path, settings["database_path"])
+    elif (source == "snapshot"):
+        settings["snapshot_path"] = str(tmp_path / "roster.snapshot")
+        compile_snapshot(csv_path, settings["snapshot_path"])
+    elif (source == "roster_cache"):
+        settings["roster_cache_path"] = str(tmp_path / "roster.cache")
+    elif (source == "columnar"):
+        settings["roster_format"] = "columnar"
+    else:
+        settings["parse_workers"] = 2
+
+    assert celebrated(run_with(tmp_path, "per-day", datetime.date(2023, 12, 28), **settings)) == expected
+    assert len(expected) == 3
+
+
+@pytest.mark.parametrize("policy", ["per-day", "combined"])
+def test_run_catchup_posts_the_days_once(tmp_path: pathlib.Path, policy: str) -> None:
+    """With a ledger the days posted by a catch-up are not posted again, even if the state file was lost."""
+    ledger_path = str(tmp_path / "ledger.jsonl")
+
+    assert len(run_with(tmp_path, policy, datetime.date(2023, 12, 28), ledger_path)) > 0
+    assert run_with(tmp_path, policy, datetime.date(2023, 12, 28), ledger_path) == []
+
+
+def test_run_catchup_nothing_missed(tmp_path: pathlib.Path) -> None:
+    """Without missed days it is the usual run."""
+    config = Config(state_path=str(tmp_path / "state.json"))
+    write_last_posted(config.state_path, TODAY - datetime.timedelta(days=1))
+
+    with patch("catchup.get_config", return_value=config), \
+            patch("catchup.zivijo_run", return_value=True) as mocked_run:
+        assert run_catchup(TODAY) is True
+
+    mocked_run.assert_called_once_with()
+    assert read_last_posted(config.state_path) == TODAY
+
+
+def test_run_catchup_failed_run_is_not_recorded(tmp_path: pathlib.Path) -> None:
+    """The day is caught up later if the run fails."""
+    config = Config(state_path=str(tmp_path / "state.json"))
+
+    with patch("catchup.get_config", return_value=config), \
+            patch("catchup.zivijo_run", return_value=False):
+        assert run_catchup(TODAY) is False
+
+    assert read_last_posted(config.state_path) is None
+
+
+def test_run_catchup_invalid_policy() -> None:
+    """Unknown policies are refused."""
+    with patch("catchup.get_config", return_value=Config(state_path="state.json", catchup_policy="never")):
+        with pytest.raises(ValueError):
+            run_catchup(TODAY)
+
+
+def test_run_catchup_refuses_the_channels(tmp_path: pathlib.Path) -> None:
+    """The belated wishes cannot be routed, a roster with a channel column is refused before anything is posted."""
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_text("email,user_id,iso-birth-date,iso-name-date,channel\njozko@email.com,@jozko,1990-12-30,,dev\n")
+    config = Config(birthdays_csv_path=str(csv_path), state_path=str(tmp_path / "state.json"))
+    write_last_posted(config.state_path, TODAY - datetime.timedelta(days=3))
+
+    with patch("catchup.get_config", return_value=config), \
+            patch("catchup.post_message") as mocked_post_message, \
+            pytest.raises(ValueError, match="channel column, which the catch-up"):
+        run_catchup(TODAY)
+
+    mocked_post_message.assert_not_called()
+
+
+def test_run_catchup_routes_when_nothing_was_missed(tmp_path: pathlib.Path) -> None:
+    """With no missed days the routed roster goes through the usual run, which routes it."""
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_text("email,user_id,iso-birth-date,iso-name-date,channel\njozko@email.com,@jozko,1990-12-30,,dev\n")
+    config = Config(birthdays_csv_path=str(csv_path), state_path=str(tmp_path / "state.json"))
+    write_last_posted(config.state_path, TODAY - datetime.timedelta(days=1))
+
+    with patch("catchup.get_config", return_value=config), \
+            patch("catchup.zivijo_run", return_value=True) as mocked_run:
+        assert run_catchup(TODAY) is True
+
+    mocked_run.assert_called_once_with()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""Testing the columnar roster."""
+
+import datetime
+import pathlib
+from unittest.mock import patch
+
+import pytest
+
+from columnar import ColumnarRoster, is_columnar, pack_month_day
+from daemon import RosterCache
+from env import Config
+from index import filter_celebrants
+from webhook import run
+
+ROWS = [
+    {"user_id": "@jozko", "birth_date": datetime.date(1990, 1, 1), "name_date": datetime.date(1990, 3, 19)},
+    {"user_id": "@ferko", "birth_date": datetime.date(1992, 2, 29)},
+    {"user_id": "@janko", "name_date": datetime.date(1988, 1, 1)},
+    {"user_id": "@marienka", "birth_date": datetime.date(1995, 2, 28), "name_date": datetime.date(1996, 2, 29)},
+    {"user_id": "@jozko", "birth_date": datetime.date(1991, 12, 31)},
+]
+
+CSV_CONTENT = """email,user_id,iso-birth-date,iso-name-date
+jozko@email.com,@jozko,1990-01-01,1990-03-19
+ferko@email.com,@ferko,1992-02-29,
+janko@email.com,@janko,,1988-01-01
+"""
+
+DATES = [
+    datetime.date(2023, 1, 1),
+    datetime.date(2023, 2, 28),
+    datetime.date(2023, 3, 1),
+    datetime.date(2024, 2, 28),
+    datetime.date(2024, 2, 29),
+    datetime.date(2023, 12, 31),
+    datetime.date(2023, 7, 7),
+]
+
+
+def test_pack_month_day_is_unique() -> None:
+    """Every day of the year packs into a different key, none of them the empty one."""
+    keys = {pack_month_day(month, day) for month in range(1, 13) for day in range(1, 32)}
+
+    assert len(keys) == 12 * 31
+    assert 0 not in keys
+
+
+def test_ids_are_interned() -> None:
+    """The same id read twice is kept only once."""
+    roster = ColumnarRoster.from_rows(dict(row) for row in ROWS)
+
+    assert len(roster) == 5
+    assert roster.ids[0] is roster.ids[4]
+
+
+@pytest.mark.parametrize("feb29_fallback", ["02-28", "03-01", ""])
+@pytest.mark.parametrize("date", DATES)
+def test_match_like_filter_celebrants(date: datetime.date, feb29_fallback: str) -> None:
+    """The vectorised match finds the same people, in the same order, as the streaming filter."""
+    roster = ColumnarRoster.from_rows(ROWS)
+
+    assert roster.match(date, feb29_fallback, use_numpy=False) == filter_celebrants(ROWS, date, feb29_fallback)
+
+
+@pytest.mark.parametrize("date", DATES)
+def test_match_with_numpy(date: datetime.date) -> None:
+    """numpy, when installed, gives the same answer as the pure python fallback."""
+    pytest.importorskip("numpy")
+    roster = ColumnarRoster.from_rows(ROWS)
+
+    assert roster.match(date, "02-28", use_numpy=True) == roster.match(date, "02-28", use_numpy=False)
+
+
+def test_run_with_roster() -> None:
+    """run() matches an already read roster without opening the csv."""
+    roster = ColumnarRoster.from_rows(ROWS)
+
+    with patch("webhook.datetime") as mocked_datetime, \
+            patch("webhook.iter_parsed_csv") as mocked_iter, \
+            patch("webhook.post_message", return_value=True) as mocked_post:
+        mocked_datetime.date.today.return_value = datetime.date(2023, 1, 1)
+
+        assert run(roster) is True
+
+    mocked_iter.assert_not_called()
+    mocked_post.assert_called_once_with(["@jozko"], ["@janko"])
+
+
+def test_roster_format() -> None:
+    assert is_columnar("columnar")
+    assert not is_columnar("index")
+    with pytest.raises(ValueError):
+        is_columnar("arrow")
+
+
+def test_run_reads_the_columnar_roster(tmp_path: pathlib.Path) -> None:
+    """With ZIVIJO_ROSTER_FORMAT=columnar the csv is read into the column store and matched there."""
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_text(CSV_CONTENT)
+    config = Config(birthdays_csv_path=str(csv_path), roster_format="columnar")
+
+    with patch("webhook.get_config", return_value=config), \
+            patch("webhook.datetime") as mocked_datetime, \
+            patch("webhook.route_celebrants") as mocked_route, \
+            patch("webhook.post_message", return_value=True) as mocked_post:
+        mocked_datetime.date.today.return_value = datetime.date(2023, 1, 1)
+
+        assert run() is True
+
+    mocked_route.assert_not_called()
+    mocked_post.assert_called_once_with(["@jozko"], ["@janko"])
+
+
+def test_roster_cache_keeps_the_columnar_roster(tmp_path: pathlib.Path) -> None:
+    """The daemon and the query service keep the column store, looked up like the index."""
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_text(CSV_CONTENT)
+
+    with patch("daemon.get_config", return_value=Config(roster_format="columnar")):
+        roster = RosterCache(str(csv_path)).get()
+
+    assert isinstance(roster, ColumnarRoster)
+    assert roster.size == 3
+    assert roster.lookup(datetime.date(2023, 1, 1)) == (["@jozko"], ["@janko"])
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""Testing the compressed rosters."""
+
+import bz2
+import datetime
+import gzip
+import lzma
+import pathlib
+from typing import Callable, Dict, Optional
+
+import pytest
+
+from compression import detect_compression
+from index import filter_celebrants
+from parallel import parallel_filter_celebrants
+from snapshot import compile_snapshot, lookup_snapshot
+from webhook import iter_parsed_csv, validate_csv
+
+CSV_CONTENT = """email,user_id,iso-birth-date,iso-name-date
+jozko@email.com,@jozko,1990-01-01,1990-03-19
+ferko@email.com,ferko,1992-05-17,
+žofka@email.com,@žofka,1988-05-17,1988-01-01
+janko@email.com,@janko,1988-02-30,
+"""
+
+COMPRESSORS: Dict[str, Callable[[bytes], bytes]] = {"gzip": gzip.compress, "bz2": bz2.compress, "lzma": lzma.compress}
+
+DATE = datetime.date(2030, 5, 17)
+
+
+@pytest.fixture(params=sorted(COMPRESSORS))
+def compressed(request: pytest.FixtureRequest, tmp_path: pathlib.Path) -> str:
+    # the name tells nothing, the magic bytes have to
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_bytes(COMPRESSORS[request.param](CSV_CONTENT.encode()))
+    return str(csv_path)
+
+
+@pytest.fixture
+def plain(tmp_path: pathlib.Path) -> str:
+    csv_path = tmp_path / "plain.csv"
+    csv_path.write_text(CSV_CONTENT)
+    return str(csv_path)
+
+
+@pytest.mark.parametrize("head, path, expected", [
+    (gzip.compress(b"a"), "", "gzip"),
+    (bz2.compress(b"a"), "", "bz2"),
+    (lzma.compress(b"a"), "", "lzma"),
+    (b"email,user_id", "birthdays.csv", None),
+    (b"", "birthdays.csv.gz", "gzip"),
+    (b"", "BIRTHDAYS.CSV.XZ", "lzma"),
+    (b"email,user_id", "birthdays.csv.gz", None),
+])
+def test_detect_compression(head: bytes, path: str, expected: Optional[str]) -> None:
+    """The magic bytes tell the compression, the extension only when the head is too short to hold them."""
+    assert detect_compression(head[:6], path) == expected
+
+
+def test_iter_parsed_csv_decompresses(compressed: str, plain: str, tmp_path: pathlib.Path) -> None:
+    """The compressed roster is parsed like the plain one, without a decompressed copy on disk."""
+    files = set(tmp_path.iterdir())
+
+    assert list(iter_parsed_csv(compressed)) == list(iter_parsed_csv(plain))
+    assert set(tmp_path.iterdir()) == files
+
+
+def test_validate_csv_decompresses(compressed: str, plain: str) -> None:
+    """The problems of the compressed roster are found on the same lines."""
+    assert validate_csv(compressed).samples == validate_csv(plain).samples
+
+
+def test_parallel_parses_compressed_serially(compressed: str, plain: str) -> None:
+    """A compressed roster cannot be split, it is parsed in the main process instead."""
+    expected = filter_celebrants(iter_parsed_csv(plain), DATE, "02-28")
+
+    assert parallel_filter_celebrants(compressed, DATE, 4, "02-28") == expected
+    assert expected.birthdays == ["@ferko", "@žofka"]
+
+
+def test_compile_snapshot_decompresses(compressed: str, plain: str, tmp_path: pathlib.Path) -> None:
+    """The snapshot of a compressed roster answers like the plain roster."""
+    snapshot_path = str(tmp_path / "birthdays.snapshot")
+
+    assert compile_snapshot(compressed, snapshot_path) == 3
+    assert lookup_snapshot(snapshot_path, compressed, DATE) == filter_celebrants(iter_parsed_csv(plain), DATE)
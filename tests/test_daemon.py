@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Testing the daemon mode."""
+
+import datetime
+import os
+import pathlib
+import pytest
+from typing import List
+from unittest.mock import patch
+
+from daemon import Daemon, RosterCache, next_trigger, parse_time_of_day
+
+# constants for further testing
+CSV_CONTENT = """email,user_id,iso-birth-date,iso-name-date
+user_1@email.com,@user_1_id,1990-05-17,1990-05-17
+"""
+
+
+class FakeClock:
+    """Wall clock that moves only when slept on."""
+
+    def __init__(self, now: datetime.datetime) -> None:
+        self.current = now
+        self.sleeps: List[float] = []
+
+    def now(self) -> datetime.datetime:
+        return self.current
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.current += datetime.timedelta(seconds=seconds)
+
+
+def test_next_trigger() -> None:
+    """The trigger is later today or tomorrow."""
+    at = parse_time_of_day("09:00")
+
+    assert next_trigger(datetime.datetime(2030, 5, 17, 8, 0), at) == datetime.datetime(2030, 5, 17, 9, 0)
+    assert next_trigger(datetime.datetime(2030, 5, 17, 9, 0), at) == datetime.datetime(2030, 5, 18, 9, 0)
+
+
+def test_parse_time_of_day_invalid() -> None:
+    """Invalid times are refused."""
+    with pytest.raises(ValueError):
+        parse_time_of_day("25:00")
+
+
+def test_roster_cache_reloads_on_change(tmp_path: pathlib.Path) -> None:
+    """The csv is parsed once and again only after it changes."""
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_text(CSV_CONTENT)
+    cache = RosterCache(str(csv_path))
+
+    with patch("daemon.iter_parsed_csv", wraps=__import__("webhook").iter_parsed_csv) as mock_iter:
+        index = cache.get()
+        assert cache.get() is index
+        assert mock_iter.call_count == 1
+        assert not cache.is_stale()
+
+        csv_path.write_text(CSV_CONTENT + "user_2@email.com,@user_2_id,1990-05-17,\n")
+        os.utime(csv_path, ns=(0, 0))
+
+        assert cache.is_stale()
+        assert cache.get().lookup(datetime.date(2030, 5, 17))[0] == ["@user_1_id", "@user_2_id"]
+        assert mock_iter.call_count == 2
+
+
+def test_daemon_posts_prepared_payload(tmp_path: pathlib.Path) -> None:
+    """The payload is prepared before the trigger and only sent at the trigger."""
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_text(CSV_CONTENT)
+    clock = FakeClock(datetime.datetime(2030, 5, 16, 12, 0))
+    daemon = Daemon(str(csv_path), "09:00", now=clock.now, sleep=clock.sleep)
+
+    with patch("webhook.send_payload", return_value=True) as mock_send:
+        with patch("daemon.compose_payloads", wraps=__import__("webhook").compose_payloads) as mock_compose:
+            daemon.run_forever(max_runs=2)
+
+    # greetings on the 17th rendered once ahead of time, nobody celebrates on the 18th
+    assert mock_compose.call_count == 1
+    assert mock_send.call_count == 1
+    assert "@user_1_id" in mock_send.call_args_list[0].args[0]["text"]
+    assert clock.current >= datetime.datetime(2030, 5, 18, 9, 0)
+    assert max(clock.sleeps) <= 300
+
+
+def test_daemon_flushes_the_outbox(tmp_path: pathlib.Path) -> None:
+    """The posts left in the outbox are sent at the start and before the greetings of every trigger."""
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_text(CSV_CONTENT)
+    clock = FakeClock(datetime.datetime(2030, 5, 16, 12, 0))
+    daemon = Daemon(str(csv_path), "09:00", now=clock.now, sleep=clock.sleep)
+    calls: List[str] = []
+
+    with patch("daemon.get_deliverer") as get_deliverer, \
+            patch("webhook.send_payload", side_effect=lambda *args: calls.append("send")):
+        get_deliverer.return_value.flush.side_effect = lambda: calls.append("flush")
+        daemon.run_forever(max_runs=2)
+
+    assert calls == ["flush", "flush", "send", "flush"]
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Testing the SQLite backend."""
+
+import datetime
+import pathlib
+from typing import Tuple
+from unittest.mock import patch
+
+import pytest
+
+from database import connect, import_csv, import_rows, query_celebrants, select_celebrants
+from env import Config
+from index import filter_celebrants
+from webhook import iter_parsed_csv, run
+
+CSV_CONTENT = """email,user_id,iso-birth-date,iso-name-date
+jozko@email.com,@jozko,1990-01-01,1990-03-19
+ferko@email.com,ferko,1992-02-29,
+janko@email.com,@janko,1988-12-31,1988-01-01
+marienka@email.com,@marienka,1995-02-28,1996-02-29
+hraska@email.com,@hraska,1991-01-01,not-a-date
+"""
+
+DATES = [
+    datetime.date(2023, 1, 1),
+    datetime.date(2023, 2, 28),
+    datetime.date(2024, 2, 29),
+    datetime.date(2023, 12, 31),
+    datetime.date(2023, 7, 7),
+]
+
+
+@pytest.fixture
+def database(tmp_path: pathlib.Path) -> Tuple[str, str]:
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_text(CSV_CONTENT)
+    database_path = str(tmp_path / "birthdays.sqlite")
+
+    with patch("database.get_config", return_value=Config(birthdays_csv_path=str(csv_path),
+                                                          database_path=database_path)):
+        assert import_csv() == 4
+
+    return str(csv_path), database_path
+
+
+@pytest.mark.parametrize("date", DATES)
+def test_query_celebrants_like_filter_celebrants(database: Tuple[str, str], date: datetime.date) -> None:
+    """The database answers like a scan of the csv, in roster order."""
+    csv_path, database_path = database
+
+    assert query_celebrants(database_path, date, "02-28") == filter_celebrants(iter_parsed_csv(csv_path), date,
+                                                                               "02-28")
+
+
+def test_query_uses_the_indexes(database: Tuple[str, str]) -> None:
+    """Today's celebrants are looked up by the month/day indexes, not by scanning the table."""
+    _, database_path = database
+    connection = connect(database_path)
+
+    try:
+        for month_column, day_column, index in (("birth_month", "birth_day", "people_birth"),
+                                                ("name_month", "name_day", "people_name")):
+            plan = connection.execute(
+                f"EXPLAIN QUERY PLAN SELECT user_id FROM people WHERE ({month_column} = 1 AND {day_column} = 1) "
+                f"OR ({month_column} = 2 AND {day_column} = 29) ORDER BY id"
+            ).fetchall()
+            assert index in " ".join(str(step[-1]) for step in plan)
+    finally:
+        connection.close()
+
+
+def test_import_replaces_the_roster(database: Tuple[str, str]) -> None:
+    """A new import replaces the previous roster."""
+    _, database_path = database
+    connection = connect(database_path)
+
+    try:
+        assert import_rows(connection, [{"user_id": "@new", "birth_date": datetime.date(2000, 1, 1)}]) == 1
+        assert select_celebrants(connection, "birthday", datetime.date(2023, 1, 1), "02-28") == ["@new"]
+    finally:
+        connection.close()
+
+
+def test_failed_import_keeps_the_roster(database: Tuple[str, str]) -> None:
+    """An import failing midway is rolled back."""
+    _, database_path = database
+    connection = connect(database_path)
+
+    try:
+        with pytest.raises(KeyError):
+            import_rows(connection, [{"user_id": "@new"}, {"no": "user_id"}])
+
+        assert select_celebrants(connection, "birthday", datetime.date(2023, 1, 1), "02-28") == ["@jozko"]
+    finally:
+        connection.close()
+
+
+def test_run_with_database(database: Tuple[str, str]) -> None:
+    """run() queries the database instead of reading the csv."""
+    _, database_path = database
+    config = Config(database_path=database_path, feb29_fallback="02-28")
+
+    with patch("webhook.get_config", return_value=config), \
+            patch("database.get_config", return_value=config), \
+            patch("webhook.datetime") as mocked_datetime, \
+            patch("webhook.iter_parsed_csv") as mocked_iter, \
+            patch("webhook.post_message", return_value=True) as mocked_post:
+        mocked_datetime.date.today.return_value = datetime.date(2023, 1, 1)
+
+        assert run() is True
+
+    mocked_iter.assert_not_called()
+    mocked_post.assert_called_once_with(["@jozko"], ["@janko"])
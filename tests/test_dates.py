@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""Testing the date parsing helpers."""
+
+import datetime
+import pytest
+
+from dates import parse_iso_date
+
+
+def test_parse_iso_date() -> None:
+    """Test the canonical ISO date."""
+    assert parse_iso_date("2022-01-31") == datetime.date(2022, 1, 31)
+    assert parse_iso_date("2024-02-29") == datetime.date(2024, 2, 29)
+
+
+def test_parse_iso_date_not_padded() -> None:
+    """Dates accepted by strptime before are still accepted."""
+    assert parse_iso_date("2022-1-5") == datetime.date(2022, 1, 5)
+
+
+@pytest.mark.parametrize("value", [
+    "2022-01-32", "2023-02-29", "2022-13-01", "2022-0a-01", "20220101x1", "", "2022/01/01"
+])
+def test_parse_iso_date_invalid(value: str) -> None:
+    """Malformed dates raise ValueError, same as datetime.strptime."""
+    with pytest.raises(ValueError):
+        datetime.datetime.strptime(value, "%Y-%m-%d")
+
+    with pytest.raises(ValueError):
+        parse_iso_date(value)
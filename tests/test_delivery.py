@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Testing the delivery of the payloads against a local stub server."""
+
+import datetime
+import pathlib
+import pytest
+from typing import List, Tuple
+
+from delivery import DEAD_LETTER_DIR, DELIVERED, QUEUED, Deliverer, DeliveryError, Outbox, PermanentDeliveryError, \
+    TokenBucket, parse_retry_after
+from stub_server import StubServer
+
+# constants for further testing
+PAYLOAD = {"channel": "town-square", "text": "Happy Birthday!"}
+
+
+def make_deliverer(outbox: Outbox = None, max_retries: int = 3) -> Tuple[Deliverer, List[float]]:
+    """Deliverer recording the sleeps instead of sleeping."""
+    sleeps: List[float] = []
+    bucket = TokenBucket(1000, 1000, sleep=sleeps.append)
+    return Deliverer(bucket, outbox, max_retries=max_retries, backoff_base=0.5, backoff_cap=4,
+                     sleep=sleeps.append), sleeps
+
+
+@pytest.mark.parametrize("stub_server", [[(429, {"Retry-After": "0"}), (503, {})]], indirect=True)
+def test_deliver_retries(stub_server: StubServer) -> None:
+    """Rate limited and failed posts are retried."""
+    deliverer, sleeps = make_deliverer()
+
+    assert deliverer.deliver(PAYLOAD, stub_server.url) == DELIVERED
+
+    assert stub_server.received == [PAYLOAD] * 3
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[1] <= 1
+
+
+@pytest.mark.parametrize("stub_server", [[(503, {})] * 10], indirect=True)
+def test_deliver_gives_up(stub_server: StubServer, tmp_path: pathlib.Path) -> None:
+    """After the last retry the payload stays in the outbox and is flushed on the next start."""
+    outbox = Outbox(str(tmp_path / "outbox"))
+    deliverer, sleeps = make_deliverer(outbox, max_retries=2)
+
+    assert deliverer.deliver(PAYLOAD, stub_server.url) == QUEUED
+
+    assert len(stub_server.received) == 3
+    assert len(outbox.pending()) == 1
+
+    # the next start, Mattermost is fine again
+    stub_server.responses.clear()
+    restarted, _ = make_deliverer(Outbox(str(tmp_path / "outbox")))
+
+    assert restarted.flush() == 1
+    assert outbox.pending() == []
+    assert stub_server.received[-1] == PAYLOAD
+
+
+@pytest.mark.parametrize("stub_server", [[(503, {})] * 10], indirect=True)
+def test_deliver_gives_up_without_outbox(stub_server: StubServer) -> None:
+    """Without an outbox the payload is lost, the caller is told."""
+    deliverer, _ = make_deliverer(max_retries=1)
+
+    with pytest.raises(DeliveryError):
+        deliverer.deliver(PAYLOAD, stub_server.url)
+
+    with pytest.raises(DeliveryError):
+        deliverer.queue(PAYLOAD, stub_server.url)
+
+
+@pytest.mark.parametrize("stub_server", [[(400, {})]], indirect=True)
+def test_deliver_does_not_retry_client_errors(stub_server: StubServer) -> None:
+    """Bad requests are not retried."""
+    deliverer, _ = make_deliverer()
+
+    with pytest.raises(PermanentDeliveryError):
+        deliverer.deliver(PAYLOAD, stub_server.url)
+
+    assert len(stub_server.received) == 1
+
+
+@pytest.mark.parametrize("stub_server", [[(400, {})]], indirect=True)
+def test_rejected_payloads_are_dead_lettered(stub_server: StubServer, tmp_path: pathlib.Path) -> None:
+    """A payload Mattermost rejected is set aside instead of waiting in the outbox for good."""
+    outbox = Outbox(str(tmp_path / "outbox"))
+    deliverer, _ = make_deliverer(outbox)
+
+    with pytest.raises(PermanentDeliveryError):
+        deliverer.deliver(PAYLOAD, stub_server.url)
+
+    assert outbox.pending() == []
+    assert len(list((tmp_path / "outbox" / DEAD_LETTER_DIR).iterdir())) == 1
+
+
+@pytest.mark.parametrize("stub_server", [[(404, {})]], indirect=True)
+def test_flush_skips_rejected_entries(stub_server: StubServer, tmp_path: pathlib.Path) -> None:
+    """An entry rejected on the flush does not block the ones queued after it."""
+    outbox = Outbox(str(tmp_path / "outbox"))
+    outbox.put(PAYLOAD, stub_server.url)
+    outbox.put({"channel": "town-square", "text": "Happy Nameday!"}, stub_server.url)
+    deliverer, _ = make_deliverer(outbox)
+
+    assert deliverer.flush() == 1
+
+    assert outbox.pending() == []
+    assert stub_server.received[-1]["text"] == "Happy Nameday!"
+    assert len(list((tmp_path / "outbox" / DEAD_LETTER_DIR).iterdir())) == 1
+
+
+def test_token_bucket_follows_headers() -> None:
+    """An exhausted rate limit blocks the bucket until the reset."""
+    now = [0.0]
+    sleeps: List[float] = []
+
+    def sleep(seconds: float) -> None:
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket(10, 10, clock=lambda: now[0], sleep=sleep)
+    bucket.update_from_headers({"X-Ratelimit-Limit": "10", "X-Ratelimit-Remaining": "0", "X-Ratelimit-Reset": "3"})
+    bucket.acquire()
+
+    assert sum(sleeps) == pytest.approx(3)
+
+
+def test_parse_retry_after() -> None:
+    """Both the seconds and the HTTP date forms are understood."""
+    now = datetime.datetime(2030, 5, 17, 9, 0, tzinfo=datetime.timezone.utc)
+
+    assert parse_retry_after("7") == 7
+    assert parse_retry_after("Fri, 17 May 2030 09:00:30 GMT", now) == 30
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""Testing the digest mode."""
+
+import datetime
+import pathlib
+from unittest.mock import patch
+
+import pytest
+
+from database import import_csv
+from digest import compose_digest_messages, group_celebrants, run_digest, window_days
+from env import Config
+
+ROWS = [
+    {"user_id": "@jozko", "birth_date": datetime.date(1990, 12, 30), "name_date": datetime.date(1990, 1, 2)},
+    {"user_id": "@ferko", "birth_date": datetime.date(1992, 1, 1)},
+    {"user_id": "@janko", "name_date": datetime.date(1988, 12, 30)},
+    {"user_id": "@marienka", "birth_date": datetime.date(1996, 2, 29)},
+    {"user_id": "@hraska", "birth_date": datetime.date(1991, 6, 15)},
+]
+
+
+def test_window_days_wraps_around_the_year_end() -> None:
+    """The window simply continues into the next year."""
+    assert window_days(datetime.date(2023, 12, 30), 4) == [
+        datetime.date(2023, 12, 30),
+        datetime.date(2023, 12, 31),
+        datetime.date(2024, 1, 1),
+        datetime.date(2024, 1, 2),
+    ]
+
+    with pytest.raises(ValueError):
+        window_days(datetime.date(2023, 12, 30), 0)
+
+
+def test_group_celebrants() -> None:
+    """The people are grouped by the day of the window they celebrate on, empty days are left out."""
+    grouped = group_celebrants(ROWS, datetime.date(2023, 12, 30), 4, "02-28")
+
+    assert list(grouped) == [datetime.date(2023, 12, 30), datetime.date(2024, 1, 1), datetime.date(2024, 1, 2)]
+    assert grouped[datetime.date(2023, 12, 30)] == (["@jozko"], ["@janko"])
+    assert grouped[datetime.date(2024, 1, 1)] == (["@ferko"], [])
+    assert grouped[datetime.date(2024, 1, 2)] == ([], ["@jozko"])
+
+
+def test_group_celebrants_feb29() -> None:
+    """Feb 29 people are celebrated on the fallback day of non-leap years, and on Feb 29 of leap years."""
+    assert group_celebrants(ROWS, datetime.date(2023, 2, 27), 3, "03-01") == {
+        datetime.date(2023, 3, 1): (["@marienka"], []),
+    }
+    assert group_celebrants(ROWS, datetime.date(2024, 2, 27), 3, "03-01") == {
+        datetime.date(2024, 2, 29): (["@marienka"], []),
+    }
+
+
+def test_compose_digest_messages() -> None:
+    """The digest has a header and a line per day and kind, in date order."""
+    grouped = group_celebrants(ROWS, datetime.date(2023, 12, 30), 4, "02-28")
+
+    with patch("webhook.get_config", return_value=Config(max_post_bytes=1000)):
+        messages = compose_digest_messages(grouped, datetime.date(2023, 12, 30), 4)
+
+    assert len(messages) == 1
+    lines = messages[0].split("\n\n")
+    assert "from 2023-12-30 to 2024-01-02" in lines[0]
+    assert lines[1] == "**Saturday 2023-12-30** :birthday: birthday of our colleague @jozko"
+    assert lines[2] == "**Saturday 2023-12-30** :tada: nameday of our colleague @janko"
+    assert lines[3] == "**Monday 2024-01-01** :birthday: birthday of our colleague @ferko"
+    assert lines[4] == "**Tuesday 2024-01-02** :tada: nameday of our colleague @jozko"
+
+
+def test_run_digest() -> None:
+    """The digest is read in one pass and posted through the common payload path."""
+    config = Config(birthdays_csv_path="some.csv", digest_days=4, feb29_fallback="02-28")
+
+    with patch("digest.get_config", return_value=config), \
+            patch("digest.iter_parsed_csv", return_value=iter(ROWS)) as mocked_iter, \
+            patch("webhook.post_payloads", return_value=True) as mocked_post:
+        assert run_digest(datetime.date(2023, 12, 30)) is True
+
+    mocked_iter.assert_called_once_with("some.csv")
+    payloads = mocked_post.call_args.args[0]
+    assert len(payloads) == 1
+    assert "@ferko" in payloads[0]["text"]
+
+
+def test_run_digest_nobody() -> None:
+    """Nothing is posted when nobody celebrates in the window."""
+    config = Config(birthdays_csv_path="some.csv", feb29_fallback="02-28")
+
+    with patch("digest.get_config", return_value=config), \
+            patch("digest.iter_parsed_csv", return_value=iter(ROWS)), \
+            patch("webhook.post_payloads") as mocked_post:
+        assert run_digest(datetime.date(2023, 3, 1), 7) is True
+
+    mocked_post.assert_not_called()
+
+
+def test_run_digest_reads_the_roster_like_run(tmp_path: pathlib.Path) -> None:
+    """With a database configured the digest is looked up there, the csv is not parsed."""
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_text("email,user_id,iso-birth-date,iso-name-date\n"
+                        "jozko@email.com,@jozko,1990-12-30,1990-01-02\n"
+                        "ferko@email.com,@ferko,1992-01-01,\n")
+    config = Config(birthdays_csv_path=str(csv_path), database_path=str(tmp_path / "roster.sqlite"),
+                    feb29_fallback="02-28")
+    import_csv(str(csv_path), config.database_path)
+
+    with patch("env._config", config), \
+            patch("digest.get_config", return_value=config), \
+            patch("webhook.get_config", return_value=config), \
+            patch("digest.iter_parsed_csv") as mocked_iter, \
+            patch("webhook.post_payloads", return_value=True) as mocked_post:
+        assert run_digest(datetime.date(2023, 12, 30), 4) is True
+
+    mocked_iter.assert_not_called()
+    text = mocked_post.call_args.args[0][0]["text"]
+    assert "@jozko" in text and "@ferko" in text
+
+
+def test_run_digest_refuses_the_channels(tmp_path: pathlib.Path) -> None:
+    """The digest goes to ZIVIJO_CHANNEL only, a roster routing its rows elsewhere is refused."""
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_text("email,user_id,iso-birth-date,iso-name-date,channel\n")
+    config = Config(birthdays_csv_path=str(csv_path))
+
+    with patch("digest.get_config", return_value=config), \
+            patch("webhook.post_payloads") as mocked_post, \
+            pytest.raises(ValueError, match="the digest"):
+        run_digest(datetime.date(2023, 12, 30), 4)
+
+    mocked_post.assert_not_called()
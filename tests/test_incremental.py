@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""Testing the incremental parsing of append-only rosters."""
+
+import datetime
+import logging
+import pathlib
+from typing import List, Tuple
+from unittest.mock import patch
+
+import pytest
+
+from env import Config
+from incremental import IncrementalRoster
+from index import CelebrationIndex
+from webhook import iter_parsed_csv, run
+
+CSV_CONTENT = """email,user_id,iso-birth-date,iso-name-date
+jozko@email.com,@jozko,1990-01-01,1990-03-19
+ferko@email.com,ferko,1992-05-17,
+"""
+
+APPENDED = """janko@email.com,janko,1988-05-17,1988-01-01
+hraska@email.com,@hraska,1991-02-31,
+"""
+
+DATES = [datetime.date(2030, 1, 1), datetime.date(2030, 5, 17), datetime.date(2030, 3, 19)]
+
+
+def lookups(index: CelebrationIndex) -> List[Tuple[List[str], List[str]]]:
+    return [index.lookup(date) for date in DATES]
+
+
+def test_refresh_parses_only_the_appended_rows(tmp_path: pathlib.Path, caplog: pytest.LogCaptureFixture) -> None:
+    """The appended rows are validated like the rest and merged into the parsed roster."""
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_text(CSV_CONTENT)
+    roster = IncrementalRoster(str(csv_path), feb29_fallback="02-28")
+
+    assert lookups(roster.refresh()) == lookups(CelebrationIndex.from_rows(iter_parsed_csv(str(csv_path)), "02-28"))
+    assert roster.checkpoint.offset == len(CSV_CONTENT)
+    assert roster.checkpoint.rows == 2
+
+    with open(csv_path, "a") as csvfile:
+        csvfile.write(APPENDED)
+    caplog.clear()
+    caplog.set_level(logging.DEBUG)
+
+    index = roster.refresh()
+    logged = caplog.text
+
+    assert lookups(index) == lookups(CelebrationIndex.from_rows(iter_parsed_csv(str(csv_path)), "02-28"))
+    assert index.lookup(datetime.date(2030, 5, 17)) == (["@ferko", "@janko"], [])
+    assert index.size == 3
+    assert roster.checkpoint.rows == 4
+    # only the new rows were looked at
+    assert "Parsed 2 new lines" in logged
+    assert "User ID @janko does not start with @" in logged
+    assert "Failed to parse birth date 1991-02-31 for user @hraska" in logged
+    assert "1 invalid birth date, row skipped, 1 user id without @, @ added" in logged
+    assert "ferko" not in logged
+
+
+def test_refresh_waits_for_a_complete_line(tmp_path: pathlib.Path) -> None:
+    """A last line without a newline is parsed, but checkpointed only once it ends."""
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_text(CSV_CONTENT + APPENDED.splitlines()[0])
+    roster = IncrementalRoster(str(csv_path), feb29_fallback="02-28")
+
+    assert roster.refresh().size == 3
+    assert roster.checkpoint.offset == len(CSV_CONTENT)
+    assert roster.index.size == 2
+
+    # parsed again, not twice
+    assert roster.refresh().size == 3
+
+    csv_path.write_text(CSV_CONTENT + APPENDED)
+
+    index = roster.refresh()
+    assert index.size == 3
+    assert lookups(index) == lookups(CelebrationIndex.from_rows(iter_parsed_csv(str(csv_path)), "02-28"))
+    assert roster.checkpoint.offset == len(CSV_CONTENT + APPENDED)
+
+
+def test_refresh_after_rewrite(tmp_path: pathlib.Path, caplog: pytest.LogCaptureFixture) -> None:
+    """A rewritten csv is parsed all over again."""
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_text(CSV_CONTENT + APPENDED)
+    roster = IncrementalRoster(str(csv_path), feb29_fallback="02-28")
+    roster.refresh()
+
+    csv_path.write_text(CSV_CONTENT.replace("1990-01-01", "1990-01-02"))
+    caplog.set_level(logging.INFO)
+    index = roster.refresh()
+
+    assert "was rewritten" in caplog.text
+    assert index.size == 2
+    assert index.lookup(datetime.date(2030, 1, 2)) == (["@jozko"], [])
+    assert index.lookup(datetime.date(2030, 5, 17)) == (["@ferko"], [])
+
+
+def test_cache_file(tmp_path: pathlib.Path, caplog: pytest.LogCaptureFixture) -> None:
+    """The checkpoint and the roster survive in the cache file, a broken cache is ignored."""
+    csv_path = tmp_path / "birthdays.csv"
+    cache_path = tmp_path / "roster.json"
+    csv_path.write_text(CSV_CONTENT)
+    IncrementalRoster(str(csv_path), str(cache_path), "02-28").refresh()
+
+    with open(csv_path, "a") as csvfile:
+        csvfile.write(APPENDED)
+
+    caplog.set_level(logging.INFO)
+    roster = IncrementalRoster(str(csv_path), str(cache_path), "02-28")
+    assert roster.checkpoint.rows == 2
+    assert roster.refresh().lookup(datetime.date(2030, 5, 17)) == (["@ferko", "@janko"], [])
+    assert "Parsed 2 new lines" in caplog.text
+
+    cache_path.write_text("{not json")
+    roster = IncrementalRoster(str(csv_path), str(cache_path), "02-28")
+    assert roster.index is None
+    assert "Ignoring the roster cache" in caplog.text
+    assert roster.refresh().size == 3
+
+
+def test_run_with_roster_cache(tmp_path: pathlib.Path) -> None:
+    """run() keeps the parsed roster in the cache file between the runs."""
+    csv_path = tmp_path / "birthdays.csv"
+    cache_path = tmp_path / "roster.json"
+    csv_path.write_text(CSV_CONTENT + APPENDED)
+    config = Config(birthdays_csv_path=str(csv_path), roster_cache_path=str(cache_path), feb29_fallback="02-28")
+
+    with patch("webhook.get_config", return_value=config), \
+            patch("index.get_config", return_value=config), \
+            patch("webhook.datetime") as mocked_datetime, \
+            patch("webhook.post_message", return_value=True) as mocked_post:
+        mocked_datetime.date.today.return_value = datetime.date(2030, 5, 17)
+
+        assert run() is True
+        assert run() is True
+
+    assert cache_path.exists()
+    assert mocked_post.call_args_list[0].args == (["@ferko", "@janko"], [])
+    assert mocked_post.call_args_list[1].args == (["@ferko", "@janko"], [])
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Testing the celebration index."""
+
+import datetime
+import pytest
+
+from index import CelebrationIndex, filter_celebrants, month_day_keys, parse_feb29_fallback, parse_team_channels, \
+    route_celebrants
+
+# constants for further testing
+
+USER_1 = {
+    "user_id": "@user_1_id",
+    "birth_date": datetime.datetime(2022, 1, 1),
+    "name_date": datetime.datetime(2022, 1, 2)
+}
+
+USER_2 = {
+    "user_id": "@user_2_id",
+    "birth_date": datetime.datetime(2022, 1, 2),
+}
+
+USER_LEAP = {
+    "user_id": "@user_leap_id",
+    "birth_date": datetime.datetime(2020, 2, 29),
+}
+
+
+def test_lookup() -> None:
+    """Test the lookup of birthdays and namedays for a date."""
+    index = CelebrationIndex.from_rows([USER_1, USER_2])
+
+    assert index.size == 2
+    assert index.lookup(datetime.date(2030, 1, 1)) == (["@user_1_id"], [])
+    assert index.lookup(datetime.date(2030, 1, 2)) == (["@user_2_id"], ["@user_1_id"])
+    assert index.lookup(datetime.date(2030, 1, 3)) == ([], [])
+
+
+def test_lookup_feb29_fallback() -> None:
+    """Feb 29 people are celebrated on the fallback day in non-leap years only."""
+    index = CelebrationIndex.from_rows([USER_LEAP], feb29_fallback="03-01")
+
+    assert index.lookup(datetime.date(2023, 3, 1)) == (["@user_leap_id"], [])
+    assert index.lookup(datetime.date(2023, 2, 28)) == ([], [])
+    assert index.lookup(datetime.date(2024, 3, 1)) == ([], [])
+    assert index.lookup(datetime.date(2024, 2, 29)) == (["@user_leap_id"], [])
+
+
+def test_lookup_feb29_skipped() -> None:
+    """Feb 29 people are not celebrated in non-leap years when the fallback is disabled."""
+    index = CelebrationIndex.from_rows([USER_LEAP], feb29_fallback="")
+
+    assert index.lookup(datetime.date(2023, 2, 28)) == ([], [])
+    assert index.lookup(datetime.date(2023, 3, 1)) == ([], [])
+
+
+def test_month_day_keys() -> None:
+    """Test the keys celebrated on a date."""
+    assert month_day_keys(datetime.date(2023, 2, 28), (2, 28)) == ((2, 28), (2, 29))
+    assert month_day_keys(datetime.date(2024, 2, 28), (2, 28)) == ((2, 28),)
+    assert month_day_keys(datetime.date(2023, 2, 28)) == ((2, 28),)
+
+
+def test_parse_feb29_fallback_invalid() -> None:
+    """Unsupported fallback values are refused."""
+    with pytest.raises(ValueError):
+        parse_feb29_fallback("02-30")
+
+
+def test_filter_celebrants() -> None:
+    """Test the streaming filter for a date."""
+    result = filter_celebrants(iter([USER_1, USER_2, USER_LEAP]), datetime.date(2030, 1, 2))
+
+    assert result.birthdays == ["@user_2_id"]
+    assert result.namedays == ["@user_1_id"]
+    assert result.rows == 3
+
+
+def test_filter_celebrants_matches_index() -> None:
+    """The streaming filter and the index agree, including Feb 29."""
+    rows = [USER_1, USER_2, USER_LEAP]
+    index = CelebrationIndex.from_rows(rows, feb29_fallback="02-28")
+
+    for date in (datetime.date(2023, 2, 28), datetime.date(2024, 2, 29), datetime.date(2030, 1, 2)):
+        result = filter_celebrants(rows, date, feb29_fallback="02-28")
+        assert (result.birthdays, result.namedays) == index.lookup(date)
+
+
+def test_route_celebrants() -> None:
+    """The celebrants are grouped by the channel column, else the team's channel, else the default one."""
+    rows = [
+        dict(USER_1, channel="backend"),
+        dict(USER_2, team="design"),
+        dict(USER_LEAP, team="sales"),
+        dict(USER_1, user_id="@user_3_id", channel="", team="design"),
+    ]
+
+    result = route_celebrants(iter(rows), datetime.date(2030, 1, 2), "02-28", "design=design-team, qa=qa")
+
+    assert result == {
+        "backend": ([], ["@user_1_id"], 1),
+        "design-team": (["@user_2_id"], ["@user_3_id"], 2),
+        None: ([], [], 1),
+    }
+    assert list(result) == ["backend", "design-team", None]
+
+
+def test_route_celebrants_matches_filter() -> None:
+    """Without channels everyone goes to the default channel, like with the plain filter."""
+    rows = [USER_1, USER_2, USER_LEAP]
+
+    for date in (datetime.date(2023, 2, 28), datetime.date(2030, 1, 2)):
+        assert route_celebrants(rows, date, "02-28", "") == {None: filter_celebrants(rows, date, "02-28")}
+
+
+@pytest.mark.parametrize("value", ["backend", "=backend", "backend=", "a=b,c"])
+def test_parse_team_channels_invalid(value: str) -> None:
+    """Only team=channel pairs are accepted."""
+    with pytest.raises(ValueError):
+        parse_team_channels(value)
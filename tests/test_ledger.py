@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""Testing the ledger of the posts sent."""
+
+import datetime
+import pathlib
+import threading
+from typing import Dict, Iterator, List
+from unittest.mock import patch
+
+import pytest
+
+from delivery import DeliveryError, PermanentDeliveryError
+from env import Config
+from ledger import Ledger, celebrants_hash, roster_signature
+from webhook import Celebrations, iter_parsed_csv, post_message, post_once, run
+
+CSV_CONTENT = """email,user_id,iso-birth-date,iso-name-date
+jozko@email.com,@jozko,1990-05-17,
+ferko@email.com,@ferko,1992-01-01,
+"""
+
+TODAY = datetime.date(2030, 5, 17)
+
+
+@pytest.fixture
+def config(tmp_path: pathlib.Path) -> Iterator[Config]:
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_text(CSV_CONTENT)
+    config = Config(birthdays_csv_path=str(csv_path), ledger_path=str(tmp_path / "ledger.jsonl"))
+
+    with patch("webhook.get_config", return_value=config), \
+            patch("index.get_config", return_value=config), \
+            patch("ledger.get_config", return_value=config), \
+            patch("webhook.datetime") as mocked_datetime:
+        mocked_datetime.date.today.return_value = TODAY
+        yield config
+
+
+def test_celebrants_hash_ignores_the_order() -> None:
+    """The same people celebrating the same way hash the same, whatever their order."""
+    assert celebrants_hash(["@a", "@b"], ["@c"]) == celebrants_hash(["@b", "@a"], ["@c"])
+    assert celebrants_hash(["@a", "@b"], ["@c"]) != celebrants_hash(["@a"], ["@b", "@c"])
+
+
+def test_post_message_posts_once(config: Config) -> None:
+    """The same greetings are posted once per channel and day."""
+    with patch("webhook.send_payload") as send_payload:
+        assert post_message(["@jozko"], [])
+        assert post_message(["@jozko"], [])
+        assert post_message(["@jozko"], [], channel="backend")
+        assert post_message(["@jozko", "@ferko"], [])
+
+    channels = [call.args[0]["channel"] for call in send_payload.call_args_list]
+    assert channels == ["town-square", "backend", "town-square"]
+
+
+def test_repeated_run_reads_nothing(config: Config) -> None:
+    """A run of a day already completed returns before reading the roster."""
+    with patch("webhook.send_payload") as send_payload:
+        assert run()
+
+        with patch("webhook.iter_parsed_csv") as mocked_iter:
+            assert run()
+
+    mocked_iter.assert_not_called()
+    assert send_payload.call_count == 1
+
+
+def test_changed_roster_posts_only_new_greetings(config: Config) -> None:
+    """A changed roster is read again, the greetings already posted are not repeated."""
+    with patch("webhook.send_payload") as send_payload:
+        assert run()
+
+        # same celebrants, another roster
+        with open(config.birthdays_csv_path, "a") as csvfile:
+            csvfile.write("janko@email.com,@janko,1988-02-02,\n")
+
+        with patch("webhook.iter_parsed_csv", wraps=iter_parsed_csv) as mocked_iter:
+            assert run()
+
+        assert mocked_iter.called
+        assert send_payload.call_count == 1
+
+        with open(config.birthdays_csv_path, "a") as csvfile:
+            csvfile.write("hraska@email.com,@hraska,1991-05-17,\n")
+
+        assert run()
+
+    assert send_payload.call_count == 2
+    assert "@hraska" in send_payload.call_args.args[0]["text"]
+
+
+def test_overlapping_runs_take_turns(config: Config) -> None:
+    """A run waits for the lock of the one in progress and then finds its greetings posted."""
+    ledger = Ledger(config.ledger_path)
+    results = []
+
+    with patch("webhook.send_payload") as send_payload:
+        with ledger.locked():
+            thread = threading.Thread(target=lambda: results.append(run()))
+            thread.start()
+            thread.join(0.2)
+
+            # the other run holds the lock
+            assert thread.is_alive()
+            assert send_payload.call_count == 0
+
+            ledger.record_post(TODAY, "town-square", ["@jozko"], [])
+            ledger.record_run(TODAY, roster_signature(config.birthdays_csv_path))
+
+        thread.join(5)
+
+    assert results == [True]
+    assert send_payload.call_count == 0
+
+
+def test_queued_posts_are_recorded(config: Config) -> None:
+    """A post left in the outbox is delivered on the next start, the rerun does not compose it again."""
+    with patch("webhook.send_payload", return_value=False):
+        assert not post_message(["@jozko"], [])
+
+    with patch("webhook.send_payload") as send_payload:
+        assert post_message(["@jozko"], [])
+
+    send_payload.assert_not_called()
+
+
+@pytest.mark.parametrize("error", [PermanentDeliveryError("400 bad request"), DeliveryError("down")])
+def test_failed_posts_are_not_recorded(config: Config, error: DeliveryError) -> None:
+    """A post rejected by Mattermost, or lost for lack of an outbox, is posted again by the rerun."""
+    with patch("webhook.send_payload", side_effect=error), pytest.raises(DeliveryError):
+        post_message(["@jozko"], [])
+
+    with patch("webhook.send_payload", return_value=True) as send_payload:
+        assert post_message(["@jozko"], [])
+
+    send_payload.assert_called_once()
+
+
+def test_posts_rejected_after_others_went_out_are_recorded(config: Config) -> None:
+    """A payload rejected after others of the day were delivered fails the post, the rerun does not repeat them."""
+    def compose(celebrations: Celebrations) -> List[Dict]:
+        return [{"text": "first part"}, {"text": "second part"}]
+
+    with patch("webhook.send_payload", side_effect=[True, PermanentDeliveryError("400 bad request")]), \
+            pytest.raises(PermanentDeliveryError):
+        post_once({TODAY: (["@jozko"], [])}, compose)
+
+    with patch("webhook.send_payload", return_value=True) as send_payload:
+        assert post_once({TODAY: (["@jozko"], [])}, compose)
+
+    send_payload.assert_not_called()
+
+
+def test_nested_runs_share_the_lock(config: Config) -> None:
+    """A run in a run holding the lock (i.e. today's run of the catch-up) does not wait for itself."""
+    ledger = Ledger(config.ledger_path)
+
+    with ledger.locked(), ledger.locked():
+        ledger.record_post(TODAY, "town-square", ["@jozko"], [])
+
+    assert ledger.owner is None
+
+
+def test_torn_lines_are_ignored(tmp_path: pathlib.Path) -> None:
+    """A line cut short by a crash does not stop the ledger from being read."""
+    path = tmp_path / "ledger.jsonl"
+    ledger = Ledger(str(path))
+    ledger.record_post(TODAY, "town-square", ["@jozko"], [])
+
+    with open(path, "a") as ledger_file:
+        ledger_file.write('["post", "2030-05-')
+
+    reloaded = Ledger(str(path))
+
+    assert reloaded.posted(TODAY, "town-square", ["@jozko"], [])
+    assert not reloaded.posted(TODAY, "town-square", ["@ferko"], [])
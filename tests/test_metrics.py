@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Testing the run metrics."""
+
+import datetime
+import json
+import pathlib
+import time
+from typing import Iterator
+from unittest.mock import patch, mock_open
+
+from env import Config
+from metrics import RunMetrics, export_metrics, get_metrics, reset_metrics
+from webhook import run
+
+# constants for further testing
+TODAY = datetime.date.today()
+
+CSV_CONTENT = f"""email,user_id,iso-birth-date,iso-name-date
+user_1@email.com,@user_1_id,1990-{TODAY:%m-%d},
+user_2@email.com,user_2_id,1990-01-32,
+user_3@email.com,,1990-01-01,
+user_4@email.com,user_4_id,1990-{TODAY:%m-%d},
+"""
+
+
+def test_counters() -> None:
+    """Counters add up per labels."""
+    metrics = RunMetrics()
+    metrics.count("rows_skipped", reason="a")
+    metrics.count("rows_skipped", 2, reason="a")
+    metrics.count("rows_skipped", reason="b")
+
+    assert metrics.get("rows_skipped", reason="a") == 3
+    assert metrics.get("rows_skipped", reason="b") == 1
+    assert metrics.get("rows_skipped", reason="c") == 0
+
+
+def test_phase_excludes_nested_phase() -> None:
+    """The time of the excluded phase is not counted twice."""
+    metrics = RunMetrics()
+
+    def slow_items() -> Iterator[int]:
+        for i in range(3):
+            time.sleep(0.05)
+            yield i
+
+    with metrics.phase("filter", exclude="parse"):
+        items = list(metrics.timed(slow_items(), "parse"))
+
+    assert items == [0, 1, 2]
+    assert metrics.phases["parse"] >= 0.15
+    assert 0 <= metrics.phases["filter"] < 0.05
+
+
+def test_prometheus_format() -> None:
+    """The textfile collector format."""
+    metrics = RunMetrics()
+    metrics.add_phase_time("parse", 1.5)
+    metrics.count("rows_read", 10)
+    metrics.count("http_requests", status="200")
+
+    result = metrics.to_prometheus()
+
+    assert 'zivijo_phase_seconds{phase="parse"} 1.5\n' in result
+    assert "zivijo_rows_read 10\n" in result
+    assert 'zivijo_http_requests{status="200"} 1\n' in result
+
+
+def test_run_metrics(tmp_path: pathlib.Path) -> None:
+    """A run counts the rows, the skipped rows and the celebrants, and the report is exported."""
+    reset_metrics()
+    config = Config(
+        birthdays_csv_path="birthdays.csv",
+        report_json_path=str(tmp_path / "report.json"),
+        prometheus_textfile_path=str(tmp_path / "zivijo.prom")
+    )
+
+    with patch('builtins.open', mock_open(read_data=CSV_CONTENT)):
+        with patch('webhook.get_config', return_value=config):
+            with patch('webhook.post_message', return_value=True):
+                assert run() is True
+
+    metrics = get_metrics()
+    assert metrics.get("rows_read") == 4
+    assert metrics.get("rows_skipped", reason="invalid_birth_date") == 1
+    assert metrics.get("rows_skipped", reason="missing_user_id") == 1
+    assert metrics.get("rows_fixed", reason="missing_at") == 1
+    assert metrics.get("celebrants_matched", kind="birthday") == 2
+    assert {"parse", "filter"} <= set(metrics.phases)
+
+    export_metrics(config)
+
+    report = json.loads((tmp_path / "report.json").read_text())
+    assert {"name": "rows_read", "labels": {}, "value": 4} in report["counters"]
+    assert "zivijo_rows_read 4" in (tmp_path / "zivijo.prom").read_text()
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""Testing the parallel parsing."""
+
+import concurrent.futures
+import datetime
+import functools
+import logging
+import pathlib
+from typing import Any, Callable, List, Tuple
+from unittest.mock import patch
+
+import pytest
+
+from digest import group_celebrants
+from index import filter_celebrants, route_celebrants
+from metrics import reset_metrics
+import parallel
+from parallel import parallel_filter_celebrants, parallel_group_celebrants, parse_range, split_ranges
+from validation import ValidationReport
+from webhook import iter_parsed_csv, iter_parsed_lines
+
+CSV_CONTENT = """email,user_id,iso-birth-date,iso-name-date
+user_1@email.com,@user_1_id,2022-01-01,2022-01-02
+user_2@email.com,user_2_id,2022-01-01,
+user_3@email.com,@user_3_id,2022-02-31,2022-01-01
+user_4@email.com,,2022-01-01,2022-01-01
+
+user_5@email.com,@user_5_id,1990-05-05,2000-01-01
+user_6@email.com,user_6_id,1990-01-01,2000-01-01
+user_7@email.com,@user_7_id,1990-01-01,not-a-date
+user_8@email.com,@user_8_id,1991-01-01,1991-01-01"""
+
+DATE = datetime.date(2023, 1, 1)
+
+
+def write_csv(tmp_path: pathlib.Path, content: str, newline: str = "\n") -> str:
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_bytes(content.replace("\n", newline).encode())
+    return str(csv_path)
+
+
+def logged(caplog: pytest.LogCaptureFixture) -> List[Tuple[int, str]]:
+    return [(record.levelno, record.getMessage()) for record in caplog.records]
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+def test_split_ranges(tmp_path: pathlib.Path, newline: str) -> None:
+    """The ranges cover the rows after the header exactly, each ending at a line end."""
+    csv_path = write_csv(tmp_path, CSV_CONTENT, newline)
+    with open(csv_path, "rb") as csvfile:
+        data = csvfile.read()
+
+    for parts in range(1, 12):
+        fieldnames, ranges = split_ranges(csv_path, parts)
+
+        assert fieldnames == ["email", "user_id", "iso-birth-date", "iso-name-date"]
+        assert ranges[0][0] == data.index(b"\n") + 1
+        assert ranges[-1][1] == len(data)
+        assert all(previous[1] == following[0] for previous, following in zip(ranges, ranges[1:]))
+        assert all(data[end - 1:end] == b"\n" for _, end in ranges[:-1])
+        assert len(ranges) <= parts
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+@pytest.mark.parametrize("workers", [1, 2, 3, 8])
+def test_parallel_filter_celebrants_matches_serial(tmp_path: pathlib.Path, caplog: pytest.LogCaptureFixture,
+                                                   newline: str, workers: int) -> None:
+    """The parallel parsing finds the same people and logs and counts the same skips and fixes, in order."""
+    csv_path = write_csv(tmp_path, CSV_CONTENT, newline)
+    caplog.set_level(logging.WARNING)
+
+    serial_metrics = reset_metrics()
+    expected = filter_celebrants(iter_parsed_csv(csv_path), DATE, "02-28")
+    expected_logs = logged(caplog)
+    caplog.clear()
+
+    parallel_metrics = reset_metrics()
+    result = parallel_filter_celebrants(csv_path, DATE, workers, "02-28")
+
+    assert result == expected
+    assert result.birthdays == ["@user_1_id", "@user_2_id", "@user_6_id", "@user_8_id"]
+    assert result.namedays == ["@user_5_id", "@user_6_id", "@user_8_id"]
+    assert result.rows == 5
+    assert logged(caplog) == expected_logs
+    # one summary of the problems of the file
+    assert len(expected_logs) == 1
+    assert parallel_metrics.counters == serial_metrics.counters
+
+
+@pytest.mark.parametrize("workers", [1, 2, 3, 8])
+def test_parse_range_reports_merge_into_the_serial_report(tmp_path: pathlib.Path, workers: int) -> None:
+    """The problems of the ranges, merged in order, have the line numbers of the whole file."""
+    csv_path = write_csv(tmp_path, CSV_CONTENT)
+
+    expected = ValidationReport()
+    with open(csv_path) as csvfile:
+        list(iter_parsed_lines(csvfile, report=expected))
+
+    fieldnames, ranges = split_ranges(csv_path, workers)
+    report = ValidationReport()
+    report.lines = 1
+    for byte_range in ranges:
+        match = functools.partial(route_celebrants, date=DATE, feb29_fallback="02-28")
+        _, range_report, _, _ = parse_range(csv_path, fieldnames, byte_range, match)
+        report.merge(range_report, report.lines)
+
+    assert report.counts == expected.counts
+    assert report.samples == expected.samples
+    assert report.samples["missing_user_id"] == [(5, "", "user_4@email.com")]
+    assert report.rows == expected.rows == 8
+    assert report.lines == expected.lines == 10
+
+
+@pytest.mark.parametrize("workers", [1, 2, 3, 8])
+def test_parallel_group_celebrants_matches_serial(tmp_path: pathlib.Path, workers: int) -> None:
+    """The days of a window grouped by the workers are the ones of the serial pass, in the same order."""
+    csv_path = write_csv(tmp_path, CSV_CONTENT)
+    start = DATE - datetime.timedelta(days=1)
+
+    expected = group_celebrants(iter_parsed_csv(csv_path), start, 3, "02-28")
+    grouped, rows = parallel_group_celebrants(csv_path, start, 3, workers, "02-28")
+
+    assert grouped == expected
+    assert list(grouped) == [DATE, DATE + datetime.timedelta(days=1)]
+    assert rows == len(list(iter_parsed_csv(csv_path))) == 5
+
+
+class InlineExecutor(concurrent.futures.Executor):
+    """Parses the ranges one after the other in the test process, so what the workers send back can be looked at."""
+
+    def __init__(self, max_workers: int) -> None:
+        self.max_workers = max_workers
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> "concurrent.futures.Future[Any]":
+        future: concurrent.futures.Future[Any] = concurrent.futures.Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+@pytest.mark.parametrize("level, expected", [(logging.INFO, 0), (logging.DEBUG, 5)])
+def test_workers_log_at_the_level_of_the_parent(tmp_path: pathlib.Path, level: int, expected: int) -> None:
+    """The per-row debug records are not created in the workers when the parent would drop them."""
+    csv_path = write_csv(tmp_path, CSV_CONTENT)
+    sent_back: List[logging.LogRecord] = []
+
+    def parse_range_sent_back(*args: Any) -> Tuple:
+        result = parse_range(*args)
+        sent_back.extend(result[2])
+        return result
+
+    root = logging.getLogger()
+    previous = root.level
+    root.setLevel(level)
+    try:
+        with patch.object(parallel.concurrent.futures, "ProcessPoolExecutor", InlineExecutor), \
+                patch("parallel.parse_range", side_effect=parse_range_sent_back):
+            parallel_filter_celebrants(csv_path, DATE, 2, "02-28")
+    finally:
+        root.setLevel(previous)
+
+    assert len([record for record in sent_back if (record.levelno == logging.DEBUG)]) == expected
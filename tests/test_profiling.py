@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""Testing the profiling of the phases."""
+
+import datetime
+import importlib.util
+import pathlib
+import threading
+from typing import Iterable, Iterator, List
+from unittest.mock import patch
+
+import pytest
+
+import metrics
+from daemon import Daemon
+from env import Config
+from metrics import RunMetrics, get_profiler
+from profiling import PhaseProfiler, start_profiling, stop_profiling
+from test_daemon import FakeClock
+
+# the entry point, its module name clashes with the one of pytest
+MAIN_PATH = pathlib.Path(__file__).parent.parent / "src" / "zivijo" / "__main__.py"
+main_spec = importlib.util.spec_from_file_location("zivijo_main", MAIN_PATH)
+main = importlib.util.module_from_spec(main_spec)  # type: ignore
+main_spec.loader.exec_module(main)  # type: ignore
+
+TODAY = datetime.date.today()
+
+CSV_CONTENT = f"""email,user_id,iso-birth-date,iso-name-date
+user_1@email.com,@user_1_id,1990-{TODAY:%m-%d},
+user_2@email.com,@user_2_id,1990-01-01,
+"""
+
+
+@pytest.fixture
+def csv_path(tmp_path: pathlib.Path) -> pathlib.Path:
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_text(CSV_CONTENT)
+    return csv_path
+
+
+@pytest.fixture(autouse=True)
+def no_profiler() -> Iterator[None]:
+    yield
+    stop_profiling()
+
+
+def test_disabled_by_default() -> None:
+    """Without a profile path nothing is profiled and the items are passed through as they are."""
+    with patch("profiling.get_config", return_value=Config()):
+        assert start_profiling() is None
+
+    assert get_profiler() is None
+    assert list(RunMetrics().timed(iter([1, 2]), "parse")) == [1, 2]
+
+
+def test_invalid_mode(tmp_path: pathlib.Path) -> None:
+    with pytest.raises(ValueError):
+        PhaseProfiler(str(tmp_path / "profile.txt"), mode="disk")
+
+
+def test_nested_phases_are_profiled_apart(tmp_path: pathlib.Path) -> None:
+    """The time and the allocations of a nested phase are not counted in the one around it."""
+    path = tmp_path / "profile.txt"
+    profiler = PhaseProfiler(str(path), mode="all")
+    run_metrics = RunMetrics()
+
+    def parse_rows() -> Iterator[List]:
+        for number in range(3):
+            yield ["x" * 1000 for _ in range(100)] + [number]
+
+    def keep_last(rows: Iterable[List]) -> List:
+        return [row[-1] for row in rows]
+
+    metrics.set_profiler(profiler)
+    import tracemalloc
+    tracemalloc.start()
+    try:
+        with run_metrics.phase("filter", exclude="parse"):
+            numbers = keep_last(run_metrics.timed(parse_rows(), "parse"))
+
+        with run_metrics.phase("compose"):
+            greetings = [f"Happy birthday {number}!" * 100 for number in range(100)]
+    finally:
+        tracemalloc.stop()
+        metrics.set_profiler(None)
+
+    profiler.write()
+    report = path.read_text()
+
+    assert numbers == [0, 1, 2]
+    parse_cpu = report.split("=== parse: cpu ===")[1].split("===")[0]
+    filter_cpu = report.split("=== filter: cpu ===")[1].split("===")[0]
+    assert "parse_rows" in parse_cpu
+    assert "keep_last" in filter_cpu
+    assert "parse_rows" not in filter_cpu
+
+    compose_memory = report.split("=== compose: memory")[1]
+    assert "test_profiling.py" in compose_memory
+    assert len(greetings) == 100
+
+    # written and started over, nothing more to write
+    path.unlink()
+    profiler.write()
+    assert not path.exists()
+
+
+def test_run_is_profiled(tmp_path: pathlib.Path, csv_path: pathlib.Path) -> None:
+    """--profile writes the profile of the parse, filter, compose and post phases of the run."""
+    path = tmp_path / "profile.txt"
+    environ = {"ZIVIJO_BIRTHDAYS_CSV_PATH": str(csv_path), "ZIVIJO_PROFILE_MODE": "all"}
+
+    with patch.dict("os.environ", environ), \
+            patch("env._config", None), \
+            patch.object(main, "get_deliverer"), \
+            patch("webhook.send_payload", return_value=True) as send_payload:
+        assert main.run(["--profile", str(path), "run"])
+
+    send_payload.assert_called_once()
+    assert get_profiler() is None
+
+    report = path.read_text()
+    for phase in ("parse", "filter", "compose", "post"):
+        assert f"=== {phase}: cpu ===" in report
+
+    for phase in ("parse", "filter", "compose", "post"):
+        assert f"=== {phase}: memory" in report
+
+    # the streamed rows are parsed while they are filtered, what the parsing allocated is counted apart
+    parse_memory = report.split("=== parse: memory")[1].split("===")[1]
+    assert "csv.py" in parse_memory
+
+
+def test_daemon_writes_a_profile_every_day(tmp_path: pathlib.Path, csv_path: pathlib.Path) -> None:
+    """The long-running mode writes the profile of each day when the day is over."""
+    clock = FakeClock(datetime.datetime.combine(TODAY, datetime.time(8, 0)))
+    daemon = Daemon(str(csv_path), "09:00", now=clock.now, sleep=clock.sleep)
+    reports = []
+
+    with patch("profiling.get_config", return_value=Config(profile_path=str(tmp_path / "profile.txt"))):
+        profiler = start_profiling()
+
+    with patch("webhook.send_payload", return_value=True), \
+            patch.object(profiler, "write", side_effect=lambda: reports.append(profiler.format_report())):
+        daemon.run_forever(max_runs=2)
+
+    assert len(reports) == 2
+    assert "=== post: cpu ===" in reports[0]
+
+
+def test_phases_of_other_threads(tmp_path: pathlib.Path) -> None:
+    """The phases entered in several threads at once are profiled each in its thread."""
+    path = tmp_path / "profile.txt"
+    profiler = PhaseProfiler(str(path))
+    run_metrics = RunMetrics()
+    barrier = threading.Barrier(2, timeout=5)
+
+    def post() -> None:
+        with run_metrics.phase("post"):
+            barrier.wait()
+
+    metrics.set_profiler(profiler)
+    try:
+        threads = [threading.Thread(target=post) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        metrics.set_profiler(None)
+
+    assert [name for name, _ in profiler.profiles] == ["post", "post"]
+    profiler.write()
+    assert "=== post: cpu ===" in path.read_text()
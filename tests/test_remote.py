@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""Testing the rosters published over HTTP, against a local server."""
+
+import datetime
+import gzip
+import pathlib
+from typing import List, Tuple
+from unittest.mock import patch
+
+from env import Config
+from index import CelebrationIndex
+from remote import RemoteRoster
+from stub_server import ETAG, LAST_MODIFIED, StubServer
+from webhook import iter_parsed_csv, run, validate_csv
+
+
+def lookup(index: CelebrationIndex) -> Tuple[List[str], List[str]]:
+    return index.lookup(datetime.date(2030, 5, 17))
+
+
+def test_refresh_revalidates_the_cached_roster(roster_server: StubServer, tmp_path: pathlib.Path) -> None:
+    """The roster is downloaded once, then the server answers not modified and nothing is parsed again."""
+    cache_path = str(tmp_path / "roster.csv")
+
+    index = RemoteRoster(roster_server.roster_url, cache_path, "02-28").refresh()
+
+    assert lookup(index) == (["@ferko", "@žofka"], [])
+    assert pathlib.Path(cache_path).read_bytes() == roster_server.roster
+    assert "If-None-Match" not in roster_server.requests[0]
+
+    # a later run only revalidates, the parsed roster comes from the cache
+    with patch("remote.CelebrationIndex.from_rows") as from_rows:
+        index = RemoteRoster(roster_server.roster_url, cache_path, "02-28").refresh()
+
+    from_rows.assert_not_called()
+    assert lookup(index) == (["@ferko", "@žofka"], [])
+    assert roster_server.requests[1]["If-None-Match"] == ETAG
+    assert roster_server.requests[1]["If-Modified-Since"] == LAST_MODIFIED
+    assert roster_server.statuses == [200, 304]
+
+
+def test_refresh_downloads_a_changed_roster(roster_server: StubServer, tmp_path: pathlib.Path) -> None:
+    """A new version of the roster replaces the cached one."""
+    cache_path = str(tmp_path / "roster.csv")
+    roster = RemoteRoster(roster_server.roster_url, cache_path, "02-28")
+    first = roster.refresh()
+
+    roster_server.roster += b"janko@email.com,@janko,1991-05-17,\n"
+    roster_server.etag = '"v2"'
+    roster_server.gzip = True
+
+    index = roster.refresh()
+
+    assert index is not first
+    assert lookup(index) == (["@ferko", "@žofka", "@janko"], [])
+    assert pathlib.Path(cache_path).read_bytes() == roster_server.roster
+    assert roster.refresh() is index
+    assert roster_server.statuses == [200, 200, 304]
+
+
+def test_iter_parsed_csv_streams_the_url(roster_server: StubServer, tmp_path: pathlib.Path) -> None:
+    """The other readers of the roster accept the URL as well, reading the cached copy when not modified."""
+    cache_path = str(tmp_path / "roster.csv")
+
+    with patch("webhook.get_config", return_value=Config(remote_cache_path=cache_path)):
+        downloaded = list(iter_parsed_csv(roster_server.roster_url))
+        cached = list(iter_parsed_csv(roster_server.roster_url))
+
+    assert [row["user_id"] for row in downloaded] == ["@jozko", "@ferko", "@žofka"]
+    assert cached == downloaded
+    assert roster_server.statuses == [200, 304]
+
+
+def test_compressed_roster(roster_server: StubServer, tmp_path: pathlib.Path) -> None:
+    """A compressed roster is cached compressed and decompressed whenever it is parsed."""
+    cache_path = str(tmp_path / "roster.csv.gz")
+    roster_server.roster = gzip.compress(roster_server.roster)
+    url = f"{roster_server.roster_url}.gz"
+
+    downloaded = list(RemoteRoster(url, cache_path).iter_rows())
+    cached = list(RemoteRoster(url, cache_path).iter_rows())
+
+    assert [row["user_id"] for row in downloaded] == ["@jozko", "@ferko", "@žofka"]
+    assert cached == downloaded
+    assert pathlib.Path(cache_path).read_bytes() == roster_server.roster
+    assert roster_server.statuses == [200, 304]
+
+
+def test_validate_the_url(roster_server: StubServer) -> None:
+    """The roster at a URL is validated like a local file, nothing is cached."""
+    with patch("webhook.get_config", return_value=Config(remote_cache_path="/nonexistent/roster.csv")):
+        report = validate_csv(roster_server.roster_url)
+
+    assert report.rows == 3
+    assert report.counts == {"missing_at": 1}
+
+
+def test_refresh_falls_back_to_the_cached_roster(roster_server: StubServer, tmp_path: pathlib.Path) -> None:
+    """An unreachable server does not stop the greetings of a roster cached before."""
+    cache_path = str(tmp_path / "roster.csv")
+    RemoteRoster(roster_server.roster_url, cache_path, "02-28").refresh()
+    url = roster_server.roster_url
+
+    roster_server.shutdown()
+    roster_server.server_close()
+
+    assert lookup(RemoteRoster(url, cache_path, "02-28").refresh()) == (["@ferko", "@žofka"], [])
+
+
+def test_run_reads_the_url(roster_server: StubServer, tmp_path: pathlib.Path) -> None:
+    """The run looks the celebrants up in the downloaded roster."""
+    config = Config(birthdays_csv_path=roster_server.roster_url, remote_cache_path=str(tmp_path / "roster.csv"))
+
+    with patch("webhook.get_config", return_value=config), \
+            patch("index.get_config", return_value=config), \
+            patch("webhook.datetime") as mock_datetime, \
+            patch("webhook.post_message", return_value=True) as post_message:
+        mock_datetime.date.today.return_value = datetime.date(2030, 5, 17)
+
+        assert run()
+
+    post_message.assert_called_once_with(["@ferko", "@žofka"], [])
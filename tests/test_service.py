@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""Testing the query service."""
+
+import concurrent.futures
+import http.client
+import json
+import logging
+import os
+import pathlib
+import threading
+from typing import Dict, Iterator, Tuple
+from unittest.mock import patch
+
+import pytest
+
+from env import Config
+from metrics import reset_metrics
+from service import QueryServer, parse_listen, run_service, start_service
+
+CSV_CONTENT = """email,user_id,iso-birth-date,iso-name-date
+jozko@email.com,@jozko,1990-12-31,1990-01-01
+ferko@email.com,@ferko,1992-02-29,
+janko@email.com,@janko,1988-12-31,
+"""
+
+
+@pytest.fixture
+def server(tmp_path: pathlib.Path) -> Iterator[QueryServer]:
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_text(CSV_CONTENT)
+    config = Config(birthdays_csv_path=str(csv_path), feb29_fallback="02-28")
+
+    with patch("service.get_config", return_value=config), \
+            patch("index.get_config", return_value=config), \
+            patch("daemon.get_config", return_value=config):
+        server = start_service(listen="127.0.0.1:0", reload_seconds=3600)
+        thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+        thread.start()
+
+        yield server
+
+        server.shutdown()
+        server.service.stopped.set()
+        server.server_close()
+
+
+def get(server: QueryServer, path: str) -> Tuple[int, Dict]:
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=5)
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def test_lookup_by_date(server: QueryServer) -> None:
+    """The celebrants of one date, Feb 29 included in non-leap years."""
+    assert get(server, "/celebrants?date=2030-12-31") == (200, {
+        "date": "2030-12-31", "birthdays": ["@jozko", "@janko"], "namedays": [],
+    })
+    assert get(server, "/celebrants?date=2023-02-28")[1]["birthdays"] == ["@ferko"]
+
+
+def test_lookup_by_range(server: QueryServer) -> None:
+    """The days of the range somebody celebrates on, across the year end."""
+    status, body = get(server, "/celebrants?start=2030-12-30&end=2031-01-02")
+
+    assert status == 200
+    assert body == {"start": "2030-12-30", "end": "2031-01-02", "days": [
+        {"date": "2030-12-31", "birthdays": ["@jozko", "@janko"], "namedays": []},
+        {"date": "2031-01-01", "birthdays": [], "namedays": ["@jozko"]},
+    ]}
+
+
+@pytest.mark.parametrize("path, status", [
+    ("/celebrants?date=2030-13-01", 400),
+    ("/celebrants?start=2030-01-01", 400),
+    ("/celebrants?start=2030-01-02&end=2030-01-01", 400),
+    ("/celebrants?start=2030-01-01&end=2031-12-31", 400),
+    ("/birthdays", 404),
+])
+def test_bad_requests(server: QueryServer, path: str, status: int) -> None:
+    """Invalid queries are answered with an error, the service keeps running."""
+    assert get(server, path)[0] == status
+    assert get(server, "/health") == (200, {"rows": 3})
+
+
+def test_requests_leave_the_run_metrics_alone(server: QueryServer) -> None:
+    """The service runs for good and never exports the run metrics, the requests are not added to them."""
+    metrics = reset_metrics()
+
+    get(server, "/celebrants?date=2030-12-31")
+    get(server, "/celebrants?start=2030-12-30&end=2031-01-02")
+
+    assert metrics.phases == {}
+
+
+def test_run_service_logs_its_address(server: QueryServer, caplog: pytest.LogCaptureFixture) -> None:
+    """The address served is logged with the port the system picked."""
+    caplog.set_level(logging.INFO)
+
+    with patch.object(QueryServer, "serve_forever", side_effect=KeyboardInterrupt):
+        run_service(listen="127.0.0.1:0")
+
+    address = next(record.getMessage() for record in caplog.records if ("Serving" in record.getMessage()))
+    assert address.startswith("Serving who celebrates when on http://127.0.0.1:")
+    assert not address.endswith(":0/celebrants")
+
+
+def test_hot_reload(server: QueryServer) -> None:
+    """A changed csv is loaded again, the unchanged one is not."""
+    service = server.service
+    assert not service.reload()
+
+    csv_path = service.cache.csv_path
+    with open(csv_path, "a") as csvfile:
+        csvfile.write("hraska@email.com,@hraska,1991-12-31,\n")
+    # the same second on coarse file systems
+    os.utime(csv_path, ns=(0, 0))
+
+    assert service.reload()
+    assert get(server, "/celebrants?date=2030-12-31")[1]["birthdays"] == ["@jozko", "@janko", "@hraska"]
+
+
+def test_concurrent_requests(server: QueryServer) -> None:
+    """Many clients at once all get their answers over keep-alive connections."""
+    def client(_: int) -> int:
+        connection = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=5)
+        try:
+            for _ in range(20):
+                connection.request("GET", "/celebrants?date=2030-12-31")
+                response = connection.getresponse()
+                assert json.loads(response.read())["birthdays"] == ["@jozko", "@janko"]
+            return 20
+        finally:
+            connection.close()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        assert sum(executor.map(client, range(8))) == 160
+
+
+def test_parse_listen() -> None:
+    assert parse_listen("0.0.0.0:8080") == ("0.0.0.0", 8080)
+
+    with pytest.raises(ValueError):
+        parse_listen("localhost")
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Testing the compiled roster snapshot."""
+
+import datetime
+import logging
+import os
+import pathlib
+from typing import Tuple
+from unittest.mock import patch
+
+import pytest
+
+from env import Config
+from index import CelebrationIndex
+from snapshot import DAY_INDEX, Snapshot, compile_snapshot, load_snapshot, lookup_snapshot
+from webhook import iter_parsed_csv, run
+
+CSV_CONTENT = """email,user_id,iso-birth-date,iso-name-date
+jozko@email.com,@jozko,1990-01-01,1990-03-19
+ferko@email.com,ferko,1992-02-29,
+janko@email.com,@janko,1988-12-31,1988-01-01
+marienka@email.com,@marienka,1995-02-28,1996-02-29
+hraska@email.com,@hraška,1991-01-01,not-a-date
+"""
+
+
+@pytest.fixture
+def roster(tmp_path: pathlib.Path) -> Tuple[str, str]:
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_text(CSV_CONTENT)
+    return str(csv_path), str(tmp_path / "birthdays.snapshot")
+
+
+def test_day_index_covers_a_leap_year() -> None:
+    """Every (month, day) has its own bucket, in calendar order."""
+    assert len(DAY_INDEX) == 366
+    assert DAY_INDEX[(1, 1)] == 0
+    assert DAY_INDEX[(2, 29)] == 59
+    assert DAY_INDEX[(12, 31)] == 365
+
+
+@pytest.mark.parametrize("date", [
+    datetime.date(2023, 1, 1),
+    datetime.date(2023, 2, 28),
+    datetime.date(2024, 2, 29),
+    datetime.date(2023, 12, 31),
+    datetime.date(2023, 7, 7),
+])
+def test_snapshot_lookup_like_index(roster: Tuple[str, str], date: datetime.date) -> None:
+    """The snapshot answers like the in-memory index of the csv."""
+    csv_path, snapshot_path = roster
+
+    assert compile_snapshot(csv_path, snapshot_path) == 4
+
+    with Snapshot(snapshot_path) as snapshot:
+        assert snapshot.rows == 4
+        assert snapshot.is_fresh(csv_path)
+        assert snapshot.lookup(date, "02-28") == CelebrationIndex.from_rows(iter_parsed_csv(csv_path), "02-28") \
+            .lookup(date)
+
+
+def test_snapshot_survives_touch(roster: Tuple[str, str]) -> None:
+    """A changed mtime with the same content keeps the snapshot usable."""
+    csv_path, snapshot_path = roster
+    compile_snapshot(csv_path, snapshot_path)
+
+    stat = os.stat(csv_path)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    with Snapshot(snapshot_path) as snapshot:
+        assert snapshot.is_fresh(csv_path)
+
+
+def test_stale_snapshot(roster: Tuple[str, str], caplog: pytest.LogCaptureFixture) -> None:
+    """A changed csv makes the snapshot stale, it is not used."""
+    csv_path, snapshot_path = roster
+    compile_snapshot(csv_path, snapshot_path)
+
+    with open(csv_path, "a") as csvfile:
+        csvfile.write("new@email.com,@new,2000-01-01,\n")
+
+    assert load_snapshot(snapshot_path, csv_path) is None
+    assert "stale" in caplog.text
+
+
+def test_missing_or_invalid_snapshot(roster: Tuple[str, str], caplog: pytest.LogCaptureFixture) -> None:
+    """A missing or foreign snapshot is not used."""
+    csv_path, snapshot_path = roster
+
+    assert lookup_snapshot(snapshot_path, csv_path, datetime.date(2023, 1, 1)) is None
+
+    with open(snapshot_path, "wb") as snapshot:
+        snapshot.write(b"garbage" * 1000)
+
+    with caplog.at_level(logging.WARNING):
+        assert lookup_snapshot(snapshot_path, csv_path, datetime.date(2023, 1, 1)) is None
+    assert "is not a version 1 snapshot" in caplog.text
+
+
+@pytest.mark.parametrize("compiled", [True, False])
+def test_run_with_snapshot(roster: Tuple[str, str], compiled: bool) -> None:
+    """run() reads today's bucket of the snapshot, or parses the csv when there is none."""
+    csv_path, snapshot_path = roster
+    if (compiled):
+        compile_snapshot(csv_path, snapshot_path)
+
+    config = Config(birthdays_csv_path=csv_path, snapshot_path=snapshot_path, feb29_fallback="02-28")
+
+    with patch("webhook.get_config", return_value=config), \
+            patch("snapshot.get_config", return_value=config), \
+            patch("index.get_config", return_value=config), \
+            patch("webhook.datetime") as mocked_datetime, \
+            patch("webhook.iter_parsed_csv", wraps=iter_parsed_csv) as mocked_iter, \
+            patch("webhook.post_message", return_value=True) as mocked_post:
+        mocked_datetime.date.today.return_value = datetime.date(2023, 1, 1)
+
+        assert run() is True
+
+    assert mocked_iter.called is not compiled
+    mocked_post.assert_called_once_with(["@jozko"], ["@janko"])
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Testing the message templates."""
+
+import datetime
+import json
+import pathlib
+from unittest.mock import patch
+
+import pytest
+
+from env import Config
+from templates import DEFAULT_LOCALES, Template, compile_locale, emoji_pool, get_template_set, load_template_sets
+from webhook import compose_messages
+
+
+def test_default_locales() -> None:
+    """The built-in locales are valid."""
+    template_sets = load_template_sets()
+
+    assert set(template_sets) == {"en", "sk", "cs"}
+    assert template_sets["sk"].day(datetime.date(2024, 1, 1)) == "pondelok 2024-01-01"
+    assert template_sets["en"].wording(1) == "colleague"
+    assert template_sets["cs"].wording(2) == "našich milých kolegů"
+    assert isinstance(template_sets["en"].messages, tuple)
+
+
+@pytest.mark.parametrize("locale, greeting", [
+    ("en", "Today is the birthday of our beloved colleague @jozko."),
+    ("sk", "Dnes oslavujeme narodeniny nášho milého kolegu @jozko."),
+    ("cs", "Dnes slavíme svátek našich milých kolegů @ferko, @janko."),
+])
+def test_compose_messages_in_locale(locale: str, greeting: str) -> None:
+    """The messages are rendered in the configured language."""
+    config = Config(locale=locale, max_post_bytes=1000)
+
+    with patch("webhook.get_config", return_value=config), patch("templates.get_config", return_value=config):
+        messages = compose_messages(["@jozko"], ["@ferko", "@janko"])
+
+    assert len(messages) == 1
+    assert greeting in messages[0]
+    assert any(message in messages[0] for message in get_template_set(locale).messages)
+
+
+@pytest.mark.parametrize("source, error", [
+    ("Happy birthday {colleague_id_list} {name}", "Unknown fields ['name']"),
+    ("Happy birthday {colleague_wording}", "lacks the fields ['colleague_id_list']"),
+    ("Happy birthday {colleague_id_list", "Invalid birthday template"),
+])
+def test_invalid_template(source: str, error: str) -> None:
+    """Templates are checked when compiled, not when rendered."""
+    with pytest.raises(ValueError, match=error.replace("[", r"\[").replace("]", r"\]")):
+        Template("birthday", source)
+
+
+def test_invalid_locale() -> None:
+    """A locale must define everything, with 7 weekdays and some messages."""
+    with pytest.raises(ValueError, match="lacks"):
+        compile_locale("xx", {"birthday": "{colleague_id_list}"})
+
+    with pytest.raises(ValueError, match="7 weekdays"):
+        compile_locale("xx", dict(DEFAULT_LOCALES["en"], weekdays=["Monday"]))
+
+    with pytest.raises(ValueError, match="messages"):
+        compile_locale("xx", dict(DEFAULT_LOCALES["en"], messages=[]))
+
+    with pytest.raises(ValueError, match="Unknown keys"):
+        compile_locale("xx", dict(DEFAULT_LOCALES["en"], greeting="hi"))
+
+
+def test_templates_file(tmp_path: pathlib.Path) -> None:
+    """The file overrides the built-in locales key by key and can add new ones, based on English."""
+    templates_path = tmp_path / "templates.json"
+    templates_path.write_text(json.dumps({"locales": {
+        "sk": {"messages": ["Nech žije!"]},
+        "de": {"birthday": "Alles Gute, {colleague_wording} {colleague_id_list}!", "colleague": "Kollege",
+               "colleagues": "Kollegen"},
+    }}))
+
+    template_sets = load_template_sets(str(templates_path))
+
+    assert template_sets["sk"].messages == ("Nech žije!",)
+    assert template_sets["sk"]["birthday"].source == DEFAULT_LOCALES["sk"]["birthday"]
+    assert template_sets["de"]["birthday"].render(colleague_wording="Kollege", colleague_id_list="@jozko") == \
+        "Alles Gute, Kollege @jozko!"
+    assert template_sets["de"]["nameday"].source == DEFAULT_LOCALES["en"]["nameday"]
+
+
+def test_unsupported_locale() -> None:
+    """An unknown locale is refused."""
+    with patch("templates.get_config", return_value=Config(locale="xx")):
+        with pytest.raises(ValueError, match="Unsupported locale xx"):
+            get_template_set()
+
+
+def test_emoji_pool() -> None:
+    """The emoji list is split once."""
+    assert emoji_pool(":tada:,:gift:") == (":tada:", ":gift:")
+    assert emoji_pool(":tada:,:gift:") is emoji_pool(":tada:,:gift:")
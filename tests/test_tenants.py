@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Testing the multi-tenant runs."""
+
+import datetime
+import json
+import pathlib
+import pytest
+from unittest.mock import MagicMock, patch
+
+from metrics import reset_metrics
+from tenants import Tenant, load_manifest, run_tenants
+
+# constants for further testing
+TODAY = datetime.date(2030, 5, 17)
+
+CSV_CONTENT = """email,user_id,iso-birth-date,iso-name-date
+user_1@email.com,@user_1_id,1990-05-17,1990-05-17
+user_2@email.com,@user_2_id,1990-01-01,1990-01-02
+"""
+
+CSV_CONTENT_NOBODY = """email,user_id,iso-birth-date,iso-name-date
+user_3@email.com,@user_3_id,1990-01-01,1990-01-02
+"""
+
+
+def write_tenants(tmp_path: pathlib.Path) -> list:
+    """Two tenants with celebrants today and one without."""
+    (tmp_path / "a.csv").write_text(CSV_CONTENT)
+    (tmp_path / "b.csv").write_text(CSV_CONTENT)
+    (tmp_path / "c.csv").write_text(CSV_CONTENT_NOBODY)
+
+    return [
+        Tenant("a", str(tmp_path / "a.csv"), "https://a.example.com/hooks/a", channel="team-a"),
+        Tenant("b", str(tmp_path / "b.csv"), "https://b.example.com/hooks/b", channel="team-b"),
+        Tenant("c", str(tmp_path / "c.csv"), "https://c.example.com/hooks/c", channel="team-c"),
+    ]
+
+
+def test_load_manifest(tmp_path: pathlib.Path) -> None:
+    """Test reading the manifest, defaults included."""
+    manifest_path = tmp_path / "tenants.json"
+    manifest_path.write_text(json.dumps({"tenants": [
+        {"name": "a", "csv_path": "a.csv", "webhook_url": "https://a", "channel": "team-a", "icon_emoji_csv": ":tada:"},
+        {"name": "b", "csv_path": "b.csv", "webhook_url": "https://b"},
+    ]}))
+
+    result = load_manifest(str(manifest_path))
+
+    assert result[0] == Tenant("a", "a.csv", "https://a", "team-a", ":tada:")
+    assert result[1].channel == "town-square"
+
+
+def test_load_manifest_missing_fields(tmp_path: pathlib.Path) -> None:
+    """Tenants without a roster or webhook are refused."""
+    manifest_path = tmp_path / "tenants.json"
+    manifest_path.write_text(json.dumps({"tenants": [{"name": "a", "csv_path": "a.csv"}]}))
+
+    with pytest.raises(ValueError):
+        load_manifest(str(manifest_path))
+
+
+@pytest.mark.parametrize("parse_concurrency", [1, 2])
+def test_run_tenants(tmp_path: pathlib.Path, parse_concurrency: int) -> None:
+    """Every tenant is parsed, the ones with celebrants are posted to their own channel over one session."""
+    tenants = write_tenants(tmp_path)
+    session = MagicMock()
+    session.post.return_value.status_code = 200
+    metrics = reset_metrics()
+
+    with patch("tenants.create_session", return_value=session) as mock_create_session:
+        reports = run_tenants(tenants, TODAY, parse_concurrency=parse_concurrency, post_concurrency=3)
+
+    mock_create_session.assert_called_once_with(3)
+    assert session.post.call_count == 2
+    assert {c.kwargs["json"]["channel"] for c in session.post.call_args_list} == {"team-a", "team-b"}
+
+    assert [report.name for report in reports] == ["a", "b", "c"]
+    assert all(report.ok for report in reports)
+    assert reports[0].birthdays == ["@user_1_id"]
+    assert reports[0].posted is True
+    assert reports[2].rows == 1
+    assert reports[2].posted is False
+    # counted in the worker processes as well
+    assert metrics.get("rows_read") == 5
+
+
+def test_run_tenants_errors(tmp_path: pathlib.Path) -> None:
+    """A missing roster or a failed post is reported for that tenant only."""
+    tenants = write_tenants(tmp_path)
+    tenants[1] = Tenant("b", str(tmp_path / "missing.csv"), "https://b.example.com/hooks/b")
+    session = MagicMock()
+    session.post.return_value.status_code = 400
+
+    with patch("tenants.create_session", return_value=session):
+        reports = run_tenants(tenants, TODAY, parse_concurrency=1)
+
+    assert "Failed to post" in reports[0].error
+    assert "Failed to parse" in reports[1].error
+    assert reports[2].ok
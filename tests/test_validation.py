@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""Testing the validation report of the roster."""
+
+import logging
+import pathlib
+from unittest.mock import patch
+
+import pytest
+
+from env import Config
+from metrics import reset_metrics
+from test_profiling import main
+from validation import ValidationReport
+from webhook import iter_parsed_csv, validate_csv
+
+CSV_CONTENT = """email,user_id,iso-birth-date,iso-name-date
+jozko@email.com,@jozko,1990-01-01,1990-03-19
+ferko@email.com,ferko,1992-05-17,
+janko@email.com,janko,1988-02-30,
+marienka@email.com,,1995-02-28,
+hraska@email.com,hraska,1991-01-01,
+kubo@email.com,@kubo,1993-13-01,
+"""
+
+
+def write_csv(tmp_path: pathlib.Path) -> str:
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_text(CSV_CONTENT)
+    return str(csv_path)
+
+
+def test_report_keeps_counts_and_the_first_samples() -> None:
+    """Every problem is counted, only the first max_samples of a category are kept."""
+    report = ValidationReport(max_samples=2)
+
+    for line in range(2, 7):
+        report.add("missing_at", line, f"@user_{line}")
+    report.add("missing_user_id", 9, "", "user@email.com")
+
+    assert report.counts == {"missing_at": 5, "missing_user_id": 1}
+    assert report.samples["missing_at"] == [(2, "@user_2", ""), (3, "@user_3", "")]
+    assert report.count("rows_fixed") == 5
+    assert report.count("rows_skipped") == 1
+    assert not report.ok
+    assert report.summary() == "5 user id without @, @ added, 1 missing user id, row skipped"
+
+
+def test_merge_shifts_the_lines() -> None:
+    """The lines of a later part of the file follow the ones before, the samples stay bounded."""
+    first = ValidationReport(max_samples=2)
+    first.add("missing_at", 3, "@jozko")
+    first.rows = first.lines = 4
+
+    second = ValidationReport(max_samples=2)
+    second.add("missing_at", 1, "@ferko")
+    second.add("missing_at", 2, "@janko")
+    second.rows = second.lines = 3
+
+    first.merge(second, first.lines)
+
+    assert first.counts == {"missing_at": 3}
+    assert first.samples["missing_at"] == [(3, "@jozko", ""), (5, "@ferko", "")]
+    assert first.rows == 7
+    assert first.lines == 7
+
+
+def test_parsing_logs_one_summary(tmp_path: pathlib.Path, caplog: pytest.LogCaptureFixture) -> None:
+    """The problems are logged once for the whole file and counted in the metrics."""
+    csv_path = write_csv(tmp_path)
+    caplog.set_level(logging.INFO)
+    metrics = reset_metrics()
+
+    rows = list(iter_parsed_csv(csv_path))
+
+    assert [row["user_id"] for row in rows] == ["@jozko", "@ferko", "@hraska"]
+    assert [(record.levelno, record.getMessage()) for record in caplog.records] == [
+        (logging.ERROR, f"Problems in {csv_path}: 2 invalid birth date, row skipped, 2 user id without @, @ added, "
+                        "1 missing user id, row skipped. Run the validate command for details."),
+    ]
+    assert metrics.counters[("rows_skipped", (("reason", "invalid_birth_date"),))] == 2
+    assert metrics.counters[("rows_skipped", (("reason", "missing_user_id"),))] == 1
+    assert metrics.counters[("rows_fixed", (("reason", "missing_at"),))] == 2
+
+
+def test_validate_csv_reports_the_lines(tmp_path: pathlib.Path) -> None:
+    """The report lists the offending lines of each kind of problem."""
+    csv_path = write_csv(tmp_path)
+
+    with patch("webhook.get_config", return_value=Config(birthdays_csv_path=csv_path, validation_samples=1)):
+        report = validate_csv()
+
+    assert report.rows == 6
+    assert report.samples == {
+        "missing_at": [(3, "@ferko", "")],
+        "invalid_birth_date": [(4, "janko", "1988-02-30")],
+        "missing_user_id": [(5, "", "marienka@email.com")],
+    }
+    assert report.format_report(csv_path) == "\n".join([
+        f"{csv_path}: 6 rows, 3 skipped, 2 fixed",
+        "  invalid birth date, row skipped: 2",
+        "    line 4: janko 1988-02-30",
+        "    ... and 1 more",
+        "  user id without @, @ added: 2",
+        "    line 3: @ferko",
+        "    ... and 1 more",
+        "  missing user id, row skipped: 1",
+        "    line 5: marienka@email.com",
+    ])
+
+
+def test_validate_command_fails_on_problems(tmp_path: pathlib.Path) -> None:
+    """The validate command exits non-zero when the csv has problems, zero when it is clean."""
+    csv_path = write_csv(tmp_path)
+    clean_path = tmp_path / "clean.csv"
+    clean_path.write_text(CSV_CONTENT.splitlines()[0] + "\njozko@email.com,@jozko,1990-01-01,1990-03-19\n")
+
+    with patch("env._config", None), pytest.raises(SystemExit) as exit_info:
+        main.run(["validate", "--csv", csv_path])
+
+    assert exit_info.value.code == 1
+
+    with patch("env._config", None):
+        assert main.run(["validate", "--csv", str(clean_path)])
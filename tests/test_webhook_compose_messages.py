@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Testing main module."""
+
+import re
+import pytest
+from unittest.mock import patch
+
+from env import Config
+from webhook import compose_messages, post_message
+
+# constants for further testing
+PEOPLE_IDS = [f"@user_{i}_id" for i in range(1000)]
+
+
+def mentions(messages: list) -> list:
+    """All the mentions in the messages, in order."""
+    return [mention for message in messages for mention in re.findall(r"@\w+", message)]
+
+
+def test_compose_messages_only_birthdays() -> None:
+    """Only birthdays (or only namedays) today."""
+    assert len(compose_messages(["@user_1_id"], [])) == 1
+    assert "Happy Birthday" in compose_messages(["@user_1_id"], [])[0]
+    assert "Happy Nameday" in compose_messages([], ["@user_1_id"])[0]
+
+
+def test_compose_messages_single_post() -> None:
+    """A few people fit into one post."""
+    result = compose_messages(["@user_1_id"], ["@user_2_id", "@user_3_id"])
+
+    assert len(result) == 1
+    assert "beloved colleague @user_1_id." in result[0]
+    assert "dearest colleagues @user_2_id, @user_3_id." in result[0]
+
+
+def test_compose_messages_split() -> None:
+    """Long lists are split by the byte budget, no mention is split or lost and the order is kept."""
+    result = compose_messages(PEOPLE_IDS, ["@žofia_ďuríková"] + PEOPLE_IDS, max_bytes=1000)
+
+    assert len(result) > 1
+    assert all(len(message.encode()) <= 1000 for message in result)
+    assert mentions(result) == PEOPLE_IDS + ["@žofia_ďuríková"] + PEOPLE_IDS
+    assert "Happy Nameday" not in result[0]
+
+
+def test_compose_messages_nobody() -> None:
+    """Nobody celebrates."""
+    with pytest.raises(Exception):
+        compose_messages([], [])
+
+
+def test_post_message_split() -> None:
+    """Every part is posted, in order."""
+    with patch('webhook.get_config', return_value=Config(max_post_bytes=1000)):
+        with patch('webhook.send_payload') as mock_send:
+            assert post_message(PEOPLE_IDS, []) is True
+
+    payloads = [c.args[0] for c in mock_send.call_args_list]
+    assert len(payloads) > 1
+    assert mentions([payload["text"] for payload in payloads]) == PEOPLE_IDS
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""Testing main module."""
+
+import types
+from unittest.mock import patch, mock_open
+
+from webhook import iter_parsed_csv
+
+# constants for further testing
+CSV_CONTENT = """email,user_id,iso-birth-date,iso-name-date
+user_1@email.com,@user_1_id,2022-01-01,2022-01-02
+user_2@email.com,user_2_id,2022-02-01,2022-02-02
+user_3@email.com,@user_3_id,2022-02-31,2022-02-02
+"""
+
+
+def test_iter_parsed_csv_is_lazy() -> None:
+    """The rows are parsed one at a time, not materialised upfront."""
+    with patch('builtins.open', mock_open(read_data=CSV_CONTENT)) as mocked_open:
+        result = iter_parsed_csv("some.csv")
+
+        assert isinstance(result, types.GeneratorType)
+        assert not mocked_open.called
+
+        first = next(result)
+
+    assert first["user_id"] == "@user_1_id"
+    assert first["birth_date"].month == 1
+    assert first["birth_date"].day == 1
+
+
+def test_iter_parsed_csv() -> None:
+    """Invalid rows are skipped and user ids are fixed up like in read_and_parse_csv."""
+    with patch('builtins.open', mock_open(read_data=CSV_CONTENT)) as mocked_open:
+        result = list(iter_parsed_csv("some.csv"))
+
+    mocked_open.assert_called_once_with("some.csv")
+    assert [row["user_id"] for row in result] == ["@user_1_id", "@user_2_id"]
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Testing the posting to several channels."""
+
+import datetime
+import pathlib
+import threading
+from typing import List, Optional
+from unittest.mock import patch
+
+import pytest
+
+from daemon import Daemon
+from env import Config
+from index import Celebrants
+from webhook import post_channels, run
+
+CHANNELS = {
+    "backend": Celebrants(["@jozko"], [], 2),
+    None: Celebrants([], ["@ferko"], 1),
+    "design": Celebrants(["@zofka"], ["@janko"], 2),
+    "sales": Celebrants([], [], 4),
+}
+
+CSV_CONTENT = """email,user_id,iso-birth-date,iso-name-date,channel,team
+jozko@email.com,@jozko,1990-05-17,,backend,
+ferko@email.com,@ferko,1992-05-17,,,
+zofka@email.com,@zofka,1988-05-17,,,design
+janko@email.com,@janko,1988-01-01,,,design
+"""
+
+
+def test_post_channels_concurrently_over_one_session() -> None:
+    """Every channel with celebrants gets its post, all of them at once and over the same session."""
+    barrier = threading.Barrier(3, timeout=5)
+    calls = []
+
+    def post_message(birthdays: List[str], namedays: List[str], channel: Optional[str] = None,
+                     session: object = None) -> bool:
+        # fails unless the three posts are in flight together
+        barrier.wait()
+        calls.append((channel, birthdays, namedays, session))
+        return True
+
+    with patch("webhook.post_message", side_effect=post_message), \
+            patch("webhook.create_session") as create_session:
+        assert post_channels(CHANNELS, post_concurrency=8)
+
+    create_session.assert_called_once_with(3)
+    create_session.return_value.close.assert_called_once()
+    assert sorted(calls, key=lambda call: call[0] or "") == [
+        (None, [], ["@ferko"], create_session.return_value),
+        ("backend", ["@jozko"], [], create_session.return_value),
+        ("design", ["@zofka"], ["@janko"], create_session.return_value),
+    ]
+
+
+def test_post_channels_carries_on_after_a_failure() -> None:
+    """A channel failing to post does not stop the others."""
+    posted = []
+
+    def post_message(birthdays: List[str], namedays: List[str], channel: Optional[str] = None,
+                     session: object = None) -> bool:
+        if (channel == "backend"):
+            raise RuntimeError("channel not found")
+        posted.append(channel)
+        return True
+
+    with patch("webhook.post_message", side_effect=post_message), patch("webhook.create_session"):
+        assert not post_channels(CHANNELS, post_concurrency=1)
+
+    assert posted == [None, "design"]
+
+
+@pytest.mark.parametrize("parse_workers", [1, 2])
+def test_run_routes_by_channel_and_team(tmp_path: pathlib.Path, parse_workers: int) -> None:
+    """The rows of the csv are posted to their channel, their team's channel or the configured one."""
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_text(CSV_CONTENT)
+    config = Config(birthdays_csv_path=str(csv_path), team_channels="design=design-team",
+                    parse_workers=parse_workers)
+
+    with patch("webhook.get_config", return_value=config), \
+            patch("index.get_config", return_value=config), \
+            patch("parallel.get_config", return_value=config), \
+            patch("webhook.datetime") as mocked_datetime, \
+            patch("webhook.post_channels", return_value=True) as mocked_post:
+        mocked_datetime.date.today.return_value = datetime.date(2030, 5, 17)
+
+        assert run()
+
+    mocked_post.assert_called_once_with({
+        "backend": Celebrants(["@jozko"], [], 1),
+        None: Celebrants(["@ferko"], [], 1),
+        "design-team": Celebrants(["@zofka"], [], 2),
+    })
+
+
+def test_unrouted_readers_refuse_the_channels(tmp_path: pathlib.Path) -> None:
+    """The readers posting everything to the configured channel refuse a roster routing its rows elsewhere."""
+    csv_path = tmp_path / "birthdays.csv"
+    csv_path.write_text(CSV_CONTENT)
+    config = Config(birthdays_csv_path=str(csv_path), database_path=str(tmp_path / "birthdays.db"))
+
+    with pytest.raises(ValueError, match="channel and team column"):
+        Daemon(str(csv_path), "09:00")
+
+    with patch("webhook.get_config", return_value=config), \
+            patch("database.query_celebrants", return_value=Celebrants([], [], 4)), \
+            patch("webhook.post_message") as mocked_post, \
+            pytest.raises(ValueError, match="database"):
+        run()
+
+    mocked_post.assert_not_called()